@@ -11,6 +11,7 @@ document.addEventListener('DOMContentLoaded', () => {
     loadUsers();
     loadTasks();
     setupEventListeners();
+    connectChangeFeed();
     
     // Asegurar que las funciones están en el scope global
     window.openTaskDetails = openTaskDetails;
@@ -201,7 +202,7 @@ async function createUser() {
         
         if (response.ok) {
             document.getElementById('userForm').reset();
-            await loadUsers();
+            if (!changeFeedConnected()) await loadUsers();
             alert('Usuario creado exitosamente');
         }
     } catch (error) {
@@ -219,7 +220,7 @@ async function deleteUser(id) {
         });
         
         if (response.ok) {
-            await loadUsers();
+            if (!changeFeedConnected()) await loadUsers();
             alert('Usuario eliminado');
         }
     } catch (error) {
@@ -232,7 +233,7 @@ async function deleteUser(id) {
 
 async function loadTasks() {
     try {
-        const response = await fetch(`${API_URL}/tasks`);
+        const response = await fetch(`${API_URL}/tasks?include=totals`);
         tasks = await response.json();
         applyFiltersAndSort();
     } catch (error) {
@@ -379,6 +380,9 @@ function displayTasks(filteredTasks = tasks) {
                                     ${user ? `<span class="badge badge-user">👤 ${user.name}</span>` : ''}
                                     ${task.max_time_minutes > 0 ? `<span class="badge badge-time">⏱️ ${task.max_time_minutes} min</span>` : ''}
                                     ${task.max_date ? `<span class="badge badge-date">📅 ${formatDate(task.max_date)}</span>` : ''}
+                                    ${task.total_minutes > 0 ? `<span class="badge badge-time">⌛ ${task.total_minutes} min registrados</span>` : ''}
+                                    ${task.has_open_timer ? `<span class="badge badge-time">▶️ En curso</span>` : ''}
+                                    ${task.annotation_count > 0 ? `<span class="badge">📝 ${task.annotation_count}</span>` : ''}
                                 </div>
                             </div>
                             <div class="actions">
@@ -447,7 +451,7 @@ async function createTask() {
         
         if (response.ok) {
             closeModal('createTaskModal');
-            await loadTasks();
+            if (!changeFeedConnected()) await loadTasks();
             alert('Tarea creada exitosamente');
         }
     } catch (error) {
@@ -465,7 +469,7 @@ async function deleteTask(id) {
         });
         
         if (response.ok) {
-            await loadTasks();
+            if (!changeFeedConnected()) await loadTasks();
             alert('Tarea eliminada');
         }
     } catch (error) {
@@ -543,7 +547,7 @@ async function updateTask() {
         
         if (response.ok) {
             closeModal('editTaskModal');
-            await loadTasks();
+            if (!changeFeedConnected()) await loadTasks();
             alert('Tarea actualizada exitosamente');
         } else {
             alert('Error al actualizar tarea');
@@ -564,18 +568,86 @@ function calculateEditTotalMinutes() {
     document.getElementById('editTaskTotalMinutes').value = totalMinutes;
 }
 
+// ==================== CAMBIOS EN TIEMPO REAL ====================
+
+// Canal de cambios del servidor (SSE): mantiene la lista al día sin recargarla entera
+let changeFeed = null;
+let reloadTimer = null;
+
+function connectChangeFeed() {
+    if (!window.EventSource) return;
+    
+    // El navegador reconecta solo y reanuda desde el último evento (Last-Event-ID)
+    changeFeed = new EventSource(`${API_URL}/events`);
+    changeFeed.addEventListener('change', event => applyChange(JSON.parse(event.data)));
+    changeFeed.addEventListener('reset', () => scheduleTasksReload());
+}
+
+function changeFeedConnected() {
+    return changeFeed !== null && changeFeed.readyState === EventSource.OPEN;
+}
+
+function scheduleTasksReload() {
+    // Agrupar avisos seguidos (importaciones, lotes) en una sola recarga
+    clearTimeout(reloadTimer);
+    reloadTimer = setTimeout(loadTasks, 300);
+}
+
+async function refreshTask(taskId) {
+    try {
+        const response = await fetch(`${API_URL}/tasks/${taskId}?include=totals`);
+        if (response.status === 404) {
+            tasks = tasks.filter(task => task.id !== taskId);
+        } else if (response.ok) {
+            const task = await response.json();
+            const index = tasks.findIndex(t => t.id === task.id);
+            if (index >= 0) {
+                tasks[index] = task;
+            } else {
+                tasks.push(task);
+            }
+        }
+        applyFiltersAndSort();
+    } catch (error) {
+        console.error('Error actualizando tarea:', error);
+    }
+}
+
+function applyChange(change) {
+    const data = change.data || {};
+    
+    if (change.entity === 'user') {
+        loadUsers();
+    } else if (change.entity === 'task') {
+        const task = tasks.find(t => t.id === change.id);
+        if (change.action === 'delete') {
+            tasks = tasks.filter(t => t.id !== change.id);
+            applyFiltersAndSort();
+        } else if (change.action === 'update' && task) {
+            Object.assign(task, data);
+            const user = users.find(u => u.id === task.user_id);
+            task.user_name = user ? user.name : null;
+            applyFiltersAndSort();
+        } else {
+            refreshTask(change.id);
+        }
+    } else if (data.task_id) {
+        // Anotaciones y registros: cambian los totales de su tarea
+        refreshTask(data.task_id);
+    } else {
+        scheduleTasksReload();
+    }
+}
+
 // ==================== DETALLES DE TAREA ====================
 
 async function openTaskDetails(taskId) {
     currentTaskId = taskId;
-    const task = tasks.find(t => t.id === taskId);
-    const user = users.find(u => u.id === task.user_id);
     
-    // Cargar datos adicionales
-    const [annotations, timeEntries] = await Promise.all([
-        fetch(`${API_URL}/tasks/${taskId}/annotations`).then(r => r.json()),
-        fetch(`${API_URL}/tasks/${taskId}/times`).then(r => r.json())
-    ]);
+    // Tarea, anotaciones y registros en una sola petición
+    const task = await fetch(`${API_URL}/tasks/${taskId}?include=annotations,times`).then(r => r.json());
+    const annotations = task.annotations;
+    const timeEntries = task.times;
     
     const modalTitle = document.getElementById('modalTaskTitle');
     modalTitle.textContent = `Tarea #${task.task_number}: ${task.name}`;
@@ -586,7 +658,7 @@ async function openTaskDetails(taskId) {
             <div style="display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 15px; margin-bottom: 20px;">
                 <div>
                     <strong>Asignado a:</strong><br>
-                    <span class="badge badge-user">${user ? user.name : 'Sin asignar'}</span>
+                    <span class="badge badge-user">${task.user_name || 'Sin asignar'}</span>
                 </div>
                 ${task.max_time_minutes > 0 ? `
                 <div>
@@ -1702,7 +1774,7 @@ async function handleEditEntrySubmit() {
         if (response.ok) {
             alert('Registro actualizado exitosamente');
             document.getElementById('editEntryModal').style.display = 'none';
-            await loadTasks(); // Recargar tareas para mantener datos actualizados
+            if (!changeFeedConnected()) await loadTasks(); // Sin canal de cambios, recargar las tareas
             loadTimeEntries(); // Recargar listado de registros
         } else {
             const errorData = await response.json();
@@ -1729,7 +1801,7 @@ async function deleteTimeEntryFromList() {
         if (response.ok) {
             alert('Registro eliminado exitosamente');
             document.getElementById('editEntryModal').style.display = 'none';
-            await loadTasks(); // Recargar tareas para mantener datos actualizados
+            if (!changeFeedConnected()) await loadTasks(); // Sin canal de cambios, recargar las tareas
             loadTimeEntries(); // Recargar la lista
         } else {
             const errorData = await response.json();
@@ -0,0 +1,10 @@
+"""
+Pruebas de rendimiento de TaskFlow
+Generador de datos sintéticos reproducible, micro-benchmarks de endpoints e
+informes, generador de carga asíncrono y comparación con una línea base JSON.
+
+    python -m bench generate bench.db --scale medium
+    python -m bench micro bench.db -o micro.json
+    python -m bench load http://localhost:5000 --users 20 --duration 60 -o load.json
+    python -m bench compare baseline.json load.json
+"""
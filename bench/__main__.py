@@ -0,0 +1,84 @@
+"""
+Línea de comandos de las pruebas de rendimiento: python -m bench <orden>
+"""
+
+import argparse
+import json
+import sys
+
+from bench import datagen, results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bench', description='Pruebas de rendimiento de TaskFlow')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help='Generar una base de datos sintética')
+    generate.add_argument('database')
+    generate.add_argument('--scale', choices=datagen.SCALES, default='small')
+    generate.add_argument('--users', type=int, help='Sustituye al valor de la escala')
+    generate.add_argument('--tasks', type=int, help='Sustituye al valor de la escala')
+    generate.add_argument('--entries', type=int, help='Sustituye al valor de la escala')
+    generate.add_argument('--seed', type=int, default=42)
+
+    micro = commands.add_parser('micro', help='Micro-benchmarks de endpoints e informes')
+    micro.add_argument('database')
+    micro.add_argument('--repeat', type=int, default=20)
+    micro.add_argument('--reports-repeat', type=int, default=3)
+    micro.add_argument('--only', help='Solo las mediciones cuyo nombre contiene este texto')
+    micro.add_argument('-o', '--output', help='Fichero JSON de resultados')
+
+    load = commands.add_parser('load', help='Carga con usuarios virtuales contra un servidor')
+    load.add_argument('url', help='URL base del servidor, p. ej. http://localhost:5000')
+    load.add_argument('--users', type=int, default=10)
+    load.add_argument('--duration', type=float, default=60)
+    load.add_argument('--think', type=float, default=0.5, help='Pausa media entre pasos en segundos')
+    load.add_argument('--seed', type=int, default=42)
+    load.add_argument('-o', '--output', help='Fichero JSON de resultados')
+
+    compare = commands.add_parser('compare', help='Comparar resultados con una línea base')
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--latency', type=float, default=results.LATENCY_TOLERANCE)
+    compare.add_argument('--throughput', type=float, default=results.THROUGHPUT_TOLERANCE)
+    compare.add_argument('--memory', type=float, default=results.MEMORY_TOLERANCE)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        users, tasks, entries = datagen.SCALES[args.scale]
+        datagen.generate(args.database, args.users or users, args.tasks or tasks,
+                         args.entries or entries, seed=args.seed)
+        return 0
+
+    if args.command in ('micro', 'load'):
+        if args.command == 'micro':
+            from bench import micro
+            output = micro.run(args.database, repeat=args.repeat, reports_repeat=args.reports_repeat,
+                               only=args.only)
+        else:
+            from bench import load
+            output = load.run(args.url, users=args.users, duration=args.duration,
+                              think=args.think, seed=args.seed)
+        if args.output:
+            results.save(output, args.output)
+            print(f"💾 Resultados guardados en {args.output}")
+        else:
+            print(json.dumps(output, ensure_ascii=False, indent=2))
+        return 0
+
+    regressions = results.compare(results.load(args.baseline), results.load(args.current),
+                                  latency=args.latency, throughput=args.throughput, memory=args.memory)
+    for r in regressions:
+        if r['metric'] is None:
+            print(f"❌ {r['name']}: no está en los resultados actuales")
+        else:
+            change = f" ({r['change']:+.0%})" if r['change'] is not None else ''
+            print(f"❌ {r['name']} {r['metric']}: {r['baseline']} -> {r['current']}{change}")
+    if regressions:
+        print(f"{len(regressions)} regresiones respecto a {args.baseline}")
+        return 1
+    print("✅ Sin regresiones")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Generador de datos sintéticos con semilla
+La misma escala y semilla producen siempre los mismos usuarios, tareas,
+anotaciones y registros de tiempo.
+"""
+
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from database import connect
+from migrations import apply_migrations
+
+# (usuarios, tareas, registros de tiempo) por escala
+SCALES = {
+    'tiny': (5, 50, 2_000),
+    'small': (50, 5_000, 200_000),
+    'medium': (200, 25_000, 2_000_000),
+    'large': (500, 100_000, 10_000_000),
+}
+
+# Filas por executemany
+BATCH_SIZE = 50_000
+
+# Los registros se reparten en los dos años anteriores a esta fecha
+END_DATE = datetime(2026, 1, 1)
+DAYS = 730
+
+STATUSES = (('Pendiente', 25), ('En proceso', 35), ('Estancado', 10), ('Terminado', 30))
+TASK_WORDS = ('Web', 'Soporte', 'Instalación', 'Revisión', 'Informe', 'Migración', 'Kiosko',
+              'Pantallas', 'Red', 'Mantenimiento', 'Formación', 'Proyecto', 'Cliente', 'Auditoría')
+COMMENTS = (None, None, None, 'Llamada con el cliente', 'Revisión de incidencias',
+            'Reunión de seguimiento', 'Pruebas en local', 'Documentación', 'Desplazamiento')
+# Proporción de registros con el temporizador abierto (sin fin)
+OPEN_RATIO = 0.01
+
+def _users(count):
+    for n in range(1, count + 1):
+        yield (n, f'Usuario {n:04d}', f'usuario{n}@example.com', '2024-01-01 08:00:00')
+
+def _tasks(rng, count, users):
+    statuses, weights = zip(*STATUSES)
+    for n in range(1, count + 1):
+        name = f'{rng.choice(TASK_WORDS)} {rng.choice(TASK_WORDS).lower()} {n}'
+        created = END_DATE - timedelta(days=rng.randrange(DAYS))
+        max_date = (created + timedelta(days=rng.randint(7, 180))).strftime('%Y-%m-%d') if rng.random() < 0.7 else None
+        yield (n, n, name, f'Descripción de la tarea {n}', rng.randint(1, users),
+               rng.choice((0, 240, 480, 2880, 9600)), max_date,
+               created.strftime('%Y-%m-%d %H:%M:%S'), rng.choices(statuses, weights)[0])
+
+def _annotations(rng, tasks):
+    for task_id in range(1, tasks + 1):
+        for _ in range(rng.randint(0, 3)):
+            yield (task_id, f'Nota {rng.randint(1, 9999)} de la tarea {task_id}', '2025-06-01 12:00:00')
+
+def _time_entries(rng, count, tasks):
+    start_base = END_DATE - timedelta(days=DAYS)
+    for _ in range(count):
+        start = start_base + timedelta(minutes=rng.randrange(DAYS * 24 * 60))
+        if rng.random() < OPEN_RATIO:
+            end, duration = None, None
+        else:
+            duration = rng.randint(5, 480)
+            end = (start + timedelta(minutes=duration)).strftime('%Y-%m-%dT%H:%M')
+        yield (rng.randint(1, tasks), start.strftime('%Y-%m-%dT%H:%M'), end, duration,
+               start.strftime('%Y-%m-%d %H:%M:%S'), rng.choice(COMMENTS))
+
+def _insert(conn, sql, rows, label, total):
+    """Insertar en lotes de BATCH_SIZE mostrando el progreso"""
+    batch = []
+    done = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            conn.executemany(sql, batch)
+            conn.commit()
+            done += len(batch)
+            batch.clear()
+            print(f"   {label}: {done}/{total}")
+    if batch:
+        conn.executemany(sql, batch)
+        conn.commit()
+        done += len(batch)
+    return done
+
+def generate(path, users, tasks, entries, seed=42):
+    """Crear en `path` una base de datos nueva con los datos sintéticos"""
+    if os.path.exists(path):
+        raise FileExistsError(f'{path} ya existe')
+    rng = random.Random(seed)
+    start = time.perf_counter()
+
+    conn = connect(path)
+    try:
+        apply_migrations(conn)
+        # Generación de usar y tirar: sin esperar al disco en cada commit
+        conn.execute('PRAGMA synchronous = OFF')
+        print(f"🌱 Generando {users} usuarios, {tasks} tareas y {entries} registros (semilla {seed})")
+        _insert(conn, 'INSERT INTO users (id, name, email, created_at) VALUES (?, ?, ?, ?)',
+                _users(users), 'usuarios', users)
+        _insert(conn, '''INSERT INTO tasks (id, task_number, name, description, user_id, max_time_minutes,
+                                            max_date, created_at, status)
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                _tasks(rng, tasks, users), 'tareas', tasks)
+        annotations = _insert(conn, 'INSERT INTO annotations (task_id, text, created_at) VALUES (?, ?, ?)',
+                              _annotations(rng, tasks), 'anotaciones', tasks * 3 // 2)
+        _insert(conn, '''INSERT INTO time_entries (task_id, start_time, end_time, duration_minutes,
+                                                   created_at, comment)
+                         VALUES (?, ?, ?, ?, ?, ?)''',
+                _time_entries(rng, entries, tasks), 'registros', entries)
+        conn.execute('PRAGMA optimize')
+    finally:
+        conn.close()
+
+    print(f"✅ Base de datos {path} generada en {time.perf_counter() - start:.1f} s")
+    return {'users': users, 'tasks': tasks, 'annotations': annotations, 'time_entries': entries, 'seed': seed}
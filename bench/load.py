@@ -0,0 +1,150 @@
+"""
+Generador de carga asíncrono
+Usuarios virtuales que repiten los flujos de app.js y registros.js contra un
+servidor en marcha y miden latencia por paso, throughput, errores y memoria.
+"""
+
+import asyncio
+import random
+import re
+import time
+
+from bench.micro import WEEK
+from bench.results import latency_summary, new_results
+
+# Peso de cada flujo en la mezcla de la carga
+WORKFLOWS = {
+    'tareas': 6,
+    'registros': 3,
+    'informes': 1,
+}
+
+RSS_METRIC = re.compile(r'^taskflow_process_max_rss_bytes (\S+)$', re.MULTILINE)
+
+class VirtualUser:
+    """Un usuario que encadena flujos con pausas entre pasos"""
+
+    def __init__(self, client, rng, context, stats, think):
+        self.client = client
+        self.rng = rng
+        self.context = context
+        self.stats = stats
+        self.think = think
+
+    async def step(self, name, method, url, allow_empty=False, **kwargs):
+        """Ejecutar una petición; con allow_empty un 404 (informe sin datos) no es error"""
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            await response.aread()
+            ok = response.status_code < 400 or (allow_empty and response.status_code == 404)
+        except Exception:
+            response, ok = None, False
+        entry = self.stats.setdefault(name, {'times': [], 'errors': 0})
+        entry['times'].append(time.perf_counter() - start)
+        if not ok:
+            entry['errors'] += 1
+        if self.think:
+            await asyncio.sleep(self.rng.uniform(0, 2 * self.think))
+        return response if ok else None
+
+    async def tareas(self):
+        """app.js: lista de tareas, detalle, registrar tiempo, editarlo y refrescar la tarea"""
+        await self.step('usuarios', 'GET', '/api/users')
+        await self.step('tareas con totales', 'GET', '/api/tasks?include=totals')
+        task = self.rng.choice(self.context['tasks'])
+        await self.step('detalle de tarea', 'GET', f'/api/tasks/{task}?include=annotations,times')
+
+        day = f'2025-{self.rng.randint(1, 12):02d}-{self.rng.randint(1, 28):02d}'
+        hour = self.rng.randint(8, 17)
+        created = await self.step('crear registro', 'POST', f'/api/tasks/{task}/times', json={
+            'start_time': f'{day}T{hour:02d}:00', 'end_time': f'{day}T{hour:02d}:45', 'comment': 'Carga',
+        })
+        if created is not None:
+            await self.step('editar registro', 'PUT', f"/api/times/{created.json()['id']}", json={
+                'start_time': f'{day}T{hour:02d}:00', 'end_time': f'{day}T{hour + 1:02d}:15', 'comment': 'Carga',
+            })
+        await self.step('refrescar tarea', 'GET', f'/api/tasks/{task}?include=totals')
+
+    async def registros(self):
+        """registros.js: listado NDJSON de una semana por usuario y exportación a Excel"""
+        await self.step('usuarios', 'GET', '/api/users')
+        user = self.rng.choice(self.context['users'])
+        query = f'from_date={WEEK[0]}&to_date={WEEK[1]}&user_id={user}'
+        await self.step('listado de registros', 'GET', f'/api/timeentries/list?{query}',
+                        headers={'Accept': 'application/x-ndjson'})
+        if self.rng.random() < 0.3:
+            await self.step('exportar registros a Excel', 'GET', f'/api/timeentries/export/excel?{query}')
+
+    async def informes(self):
+        """app.js: informes de pendientes y por fechas"""
+        user = self.rng.choice(self.context['users'])
+        await self.step('informe de pendientes', 'GET', f'/api/reports/pending/excel?user_id={user}',
+                        allow_empty=True)
+        await self.step('informe por fechas', 'GET', f'/api/reports/date/pdf?from={WEEK[0]}&to={WEEK[1]}&user_id={user}',
+                        allow_empty=True)
+
+    async def run(self, deadline):
+        names, weights = zip(*WORKFLOWS.items())
+        while time.perf_counter() < deadline:
+            await getattr(self, self.rng.choices(names, weights)[0])()
+
+async def _server_rss(client):
+    """Memoria máxima del servidor según /metrics (None si no la publica)"""
+    try:
+        response = await client.get('/metrics')
+        match = RSS_METRIC.search(response.text)
+        return int(float(match.group(1))) if match else None
+    except Exception:
+        return None
+
+async def _context(client):
+    users = (await client.get('/api/users')).json()
+    tasks = (await client.get('/api/tasks?fields=id')).json()
+    if not users or not tasks:
+        raise RuntimeError('El servidor no tiene usuarios o tareas: genera datos con `python -m bench generate`')
+    return {'users': [u['id'] for u in users], 'tasks': [t['id'] for t in tasks]}
+
+async def run_load(base_url, users=10, duration=60.0, think=0.5, seed=42):
+    try:
+        import httpx
+    except ImportError:
+        raise RuntimeError('El generador de carga necesita httpx: pip install -r bench/requirements.txt')
+
+    stats = {}
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        context = await _context(client)
+        rss_before = await _server_rss(client)
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*(
+            VirtualUser(client, random.Random(seed + n), context, stats, think).run(deadline)
+            for n in range(users)
+        ))
+        elapsed = time.perf_counter() - start
+        rss_after = await _server_rss(client)
+
+    results = new_results('load', base_url=base_url, users=users, duration=duration, think=think, seed=seed)
+    requests = errors = 0
+    for name, entry in sorted(stats.items()):
+        result = latency_summary(entry['times'])
+        result['errors'] = entry['errors']
+        result['error_rate'] = round(entry['errors'] / len(entry['times']), 4)
+        results['results'][name] = result
+        requests += len(entry['times'])
+        errors += entry['errors']
+
+    results['results']['total'] = {
+        'requests': requests,
+        'errors': errors,
+        'error_rate': round(errors / requests, 4) if requests else 0.0,
+        'throughput_rps': round(requests / elapsed, 2),
+    }
+    if rss_after is not None:
+        results['results']['total']['max_rss_bytes'] = rss_after
+        results['meta']['max_rss_bytes_before'] = rss_before
+    return results
+
+def run(base_url, **options):
+    return asyncio.run(run_load(base_url, **options))
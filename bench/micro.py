@@ -0,0 +1,182 @@
+"""
+Micro-benchmarks de los endpoints de lectura y de los generadores de informes
+Se ejecutan en el mismo proceso contra una base de datos generada, sin la
+caché de respuestas, para medir el coste real de cada consulta.
+"""
+
+import os
+import statistics
+import time
+import tracemalloc
+
+from bench.results import latency_summary, new_results
+
+# Periodo de los datos sintéticos usado en los filtros por fecha
+WEEK = ('2025-06-02', '2025-06-08')
+MONTH = ('2025-06-01', '2025-06-30')
+
+ENDPOINTS = {
+    'GET /api/users': '/api/users',
+    'GET /api/tasks (página)': '/api/tasks?limit=100',
+    'GET /api/tasks?include=totals (página)': '/api/tasks?include=totals&limit=100',
+    'GET /api/tasks?status=': '/api/tasks?status=Pendiente&limit=100&sort=date',
+    'GET /api/tasks/{id}?include=annotations,times': '/api/tasks/{task}?include=annotations,times',
+    'GET /api/tasks/{id}/times': '/api/tasks/{task}/times',
+    'GET /api/timeentries/list (semana)': f'/api/timeentries/list?from_date={WEEK[0]}&to_date={WEEK[1]}',
+    'GET /api/timeentries/list (semana, usuario)': f'/api/timeentries/list?from_date={WEEK[0]}&to_date={WEEK[1]}&user_id={{user}}',
+    'GET /api/stats/summary (mes)': f'/api/stats/summary?period=week&from_date={MONTH[0]}&to_date={MONTH[1]}',
+    'GET /api/sync (primera página)': '/api/sync?since=0&limit=1000',
+}
+
+# El nombre del informe es la primera palabra de la clave
+REPORTS = {
+    'tasks_excel': {'from_task': 1, 'to_task': 50},
+    'tasks_excel (hoja única)': {'from_task': 1, 'to_task': 50, 'layout': 'flat'},
+    'tasks_pdf': {'from_task': 1, 'to_task': 50},
+    'tasks_pdf (serie)': {'from_task': 1, 'to_task': 300, 'pdf_mode': 'serial'},
+    # En paralelo solo con TASKFLOW_PDF_WORKERS > 1 (si no, igual que en serie)
+    'tasks_pdf (paralelo)': {'from_task': 1, 'to_task': 300, 'pdf_mode': 'parallel'},
+    'date_excel': {'from_date': WEEK[0], 'to_date': WEEK[1]},
+    'date_pdf': {'from_date': WEEK[0], 'to_date': WEEK[1]},
+    'pending_excel': {'user_id': 1},
+    'pending_pdf': {'user_id': 1},
+    'timeentries_excel': {'from_date': WEEK[0], 'to_date': WEEK[1]},
+    'timeentries_pdf': {'from_date': WEEK[0], 'to_date': WEEK[1]},
+    'export_excel': {'from_date': WEEK[0], 'to_date': WEEK[1]},
+    'export_pdf': {'from_date': WEEK[0], 'to_date': WEEK[1]},
+    'export_pdf (rápido)': {'from_date': WEEK[0], 'to_date': WEEK[1], 'pdf_mode': 'fast'},
+    'export_csv': {'from_date': WEEK[0], 'to_date': WEEK[1]},
+    'export_json': {'from_date': WEEK[0], 'to_date': WEEK[1]},
+}
+
+def _measure(func, repeat, warmup):
+    """Tiempos de `repeat` ejecuciones y memoria máxima de una más con tracemalloc"""
+    for _ in range(warmup):
+        func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    result = latency_summary(times)
+    result['peak_memory_bytes'] = peak
+    return result
+
+def _pool_report(name, params):
+    """En un proceso del pool de informes: generar el informe y contar los aciertos de la caché de fragmentos"""
+    import reports
+    from fragment_cache import fragment_cache
+
+    hits = fragment_cache.hits
+    report = reports.build_report(name, params)
+    reports.remove_file(report.path)
+    return fragment_cache.hits - hits
+
+def _fragment_cache_in_pool(repeat):
+    """tasks_pdf por el pool de informes, con la caché de fragmentos vacía y después llena
+
+    Cada repetición puede caer en otro proceso del pool o en uno nuevo: los
+    aciertos salen de la caché en disco que comparten.
+    """
+    import asyncio
+    import executor
+    from fragment_cache import fragment_cache
+
+    params = REPORTS['tasks_pdf (serie)']
+    fragment_cache.clear()
+
+    async def timed():
+        start = time.perf_counter()
+        hits = await executor.run_in_process(_pool_report, 'tasks_pdf', params)
+        return time.perf_counter() - start, hits
+
+    async def runs():
+        return [await timed() for _ in range(repeat + 1)]
+
+    try:
+        (cold, cold_hits), *warm = asyncio.run(runs())
+    finally:
+        executor.shutdown()
+    result = latency_summary([elapsed for elapsed, _ in warm])
+    result['cold_ms'] = round(cold * 1000, 3)
+    result['fragment_hits'] = [cold_hits] + [hits for _, hits in warm]
+    result['fragment_entries'] = fragment_cache.stats()['entries']
+    return result
+
+def run(database, repeat=20, warmup=2, reports_repeat=3, only=None):
+    """Medir los endpoints y los informes contra `database`
+
+    `only` limita las mediciones a los nombres que contienen ese texto.
+    """
+    # Antes de crear el pool y los procesos de informes
+    os.environ['TASKFLOW_DB'] = database
+    import database as db
+    db.DATABASE = database
+    db.close_pool()
+
+    from fastapi.testclient import TestClient
+
+    import reports
+    from app import app
+    from http_cache import response_cache
+
+    results = new_results('micro', database=database, repeat=repeat)
+    selected = lambda name: only is None or only in name
+
+    with TestClient(app) as client:
+        with db.get_pool().connection() as conn:
+            task = conn.execute('SELECT MIN(id) FROM tasks').fetchone()[0]
+            user = conn.execute('SELECT MIN(id) FROM users').fetchone()[0]
+
+        for name, url in ENDPOINTS.items():
+            if not selected(name):
+                continue
+            url = url.format(task=task, user=user)
+
+            def request():
+                response_cache.clear()
+                response = client.get(url)
+                response.raise_for_status()
+
+            print(f"⏱️  {name}")
+            results['results'][name] = _measure(request, repeat, warmup)
+
+        for name, params in REPORTS.items():
+            if not selected(name):
+                continue
+            phases = []
+
+            def build():
+                try:
+                    report = reports.build_report(name.split()[0], params)
+                except reports.EmptyReportError:
+                    return
+                phases.append(report.timings)
+                reports.remove_file(report.path)
+
+            print(f"⏱️  informe {name}")
+            result = _measure(build, reports_repeat, 1)
+            if not phases:
+                # Sin datos en el periodo a esta escala: solo se midió la consulta vacía
+                result['empty'] = True
+            for phase in ('query', 'render', 'save'):
+                values = [p[phase] for p in phases if p]
+                if values:
+                    result[f'{phase}_ms'] = round(statistics.median(values) * 1000, 3)
+            results['results'][f'report {name}'] = result
+
+    name = 'tasks_pdf (caché de bloques, pool)'
+    if selected(name):
+        print(f"⏱️  informe {name}")
+        results['results'][f'report {name}'] = _fragment_cache_in_pool(reports_repeat)
+
+    db.close_pool()
+    return results
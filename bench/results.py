@@ -0,0 +1,101 @@
+"""
+Formato de los resultados JSON y comparación con una línea base
+Cada resultado tiene latencias en ms y, según el caso, throughput y memoria.
+"""
+
+import json
+import platform
+import statistics
+import sys
+from datetime import datetime
+
+# Métricas que empeoran al subir y al bajar
+LOWER_IS_BETTER = ('p50_ms', 'p95_ms', 'p99_ms', 'error_rate', 'peak_memory_bytes', 'max_rss_bytes')
+HIGHER_IS_BETTER = ('throughput_rps',)
+
+# Tolerancias por defecto (proporción sobre la línea base)
+LATENCY_TOLERANCE = 0.20
+THROUGHPUT_TOLERANCE = 0.15
+MEMORY_TOLERANCE = 0.20
+# Diferencias de latencia por debajo de esto son ruido aunque superen la tolerancia
+MIN_LATENCY_DELTA_MS = 2.0
+
+def new_results(kind, **meta):
+    return {
+        'kind': kind,
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            **meta,
+        },
+        'results': {},
+    }
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+def latency_summary(seconds):
+    """Resumen de una lista de duraciones en segundos"""
+    values = sorted(s * 1000 for s in seconds)
+    return {
+        'count': len(values),
+        'min_ms': round(values[0], 3) if values else 0.0,
+        'mean_ms': round(statistics.fmean(values), 3) if values else 0.0,
+        'p50_ms': round(percentile(values, 0.50), 3),
+        'p95_ms': round(percentile(values, 0.95), 3),
+        'p99_ms': round(percentile(values, 0.99), 3),
+        'max_ms': round(values[-1], 3) if values else 0.0,
+    }
+
+def save(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def _tolerance(metric, latency, throughput, memory):
+    if metric in HIGHER_IS_BETTER:
+        return throughput
+    if metric.endswith('_bytes'):
+        return memory
+    return latency
+
+def compare(baseline, current, latency=LATENCY_TOLERANCE, throughput=THROUGHPUT_TOLERANCE,
+            memory=MEMORY_TOLERANCE, min_latency_delta_ms=MIN_LATENCY_DELTA_MS):
+    """Regresiones de `current` respecto a `baseline`
+
+    Devuelve una lista de {name, metric, baseline, current, change}; los
+    resultados que faltan en `current` también cuentan como regresión.
+    """
+    regressions = []
+    for name, base in baseline['results'].items():
+        result = current['results'].get(name)
+        if result is None:
+            regressions.append({'name': name, 'metric': None, 'baseline': None, 'current': None, 'change': None})
+            continue
+
+        for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            if metric not in base or metric not in result:
+                continue
+            old, new = base[metric], result[metric]
+            tolerance = _tolerance(metric, latency, throughput, memory)
+            if metric in HIGHER_IS_BETTER:
+                worse = new < old * (1 - tolerance)
+            elif metric == 'error_rate':
+                worse = new > old + tolerance / 100
+            else:
+                worse = new > old * (1 + tolerance)
+                if metric.endswith('_ms'):
+                    worse = worse and new - old >= min_latency_delta_ms
+            if worse:
+                regressions.append({
+                    'name': name, 'metric': metric, 'baseline': old, 'current': new,
+                    'change': round((new - old) / old, 3) if old else None,
+                })
+    return regressions
@@ -0,0 +1,181 @@
+"""
+Bus de cambios en memoria para /api/events (SSE) y /api/ws (WebSocket)
+Cada escritura confirmada publica un evento con un número de secuencia
+creciente; los clientes se reanudan desde la última secuencia recibida.
+Las escrituras de otros procesos (varios workers de uvicorn, importaciones)
+se detectan con el reloj de sincronización y llegan como un reset.
+"""
+
+import asyncio
+import itertools
+import os
+import threading
+import time
+from collections import deque
+
+# Eventos que se conservan para reanudar conexiones
+EVENTS_BUFFER = int(os.environ.get('TASKFLOW_EVENTS_BUFFER', '1000'))
+
+# Eventos por mensaje como máximo y segundos sin eventos antes de enviar un keepalive
+EVENTS_PER_MESSAGE = 100
+KEEPALIVE_SECONDS = 15.0
+
+# Segundos entre lecturas del reloj de sincronización para detectar escrituras
+# de otros procesos (0 no lo vigila: entonces solo vale con un único worker)
+EVENTS_POLL_SECONDS = float(os.environ.get('TASKFLOW_EVENTS_POLL', '1'))
+
+class ChangeBus:
+    """Búfer circular de eventos y suscriptores asíncronos
+
+    Los suscriptores no tienen cola propia: leen del búfer a su ritmo y solo
+    se les despierta cuando hay eventos nuevos. Quien se queda atrás más de
+    lo que guarda el búfer recibe {'type': 'reset'} y debe recargar.
+
+    Los eventos solo describen las escrituras de este proceso. Para las demás
+    se sigue el reloj de sincronización (sync_clock): el escritor informa del
+    valor antes y después de cada lote propio (wrote) y watch lo lee cada
+    EVENTS_POLL_SECONDS (observe). Si avanza por otra causa se publica un
+    {'type': 'reset'} en el búfer. Una lectura justo entre el COMMIT de un lote
+    propio y su aviso puede dar un reset de más, nunca uno de menos.
+    """
+
+    def __init__(self, size=EVENTS_BUFFER):
+        self._events = deque(maxlen=size)
+        # La secuencia parte de la hora de arranque en ms: sigue creciendo tras
+        # un reinicio y una secuencia anterior al arranque provoca un reset
+        self._seq = int(time.time() * 1000)
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._closed = False
+        # Último valor del reloj de sincronización explicado por este proceso
+        self._clock = None
+        self.published = 0
+        self.resets = 0
+        self.external = 0
+
+    @property
+    def seq(self):
+        with self._lock:
+            return self._seq
+
+    def publish(self, entity, action, id=None, data=None):
+        """Registrar un cambio ya confirmado y despertar a los suscriptores"""
+        event = {'type': 'change', 'entity': entity, 'action': action, 'id': id}
+        if data is not None:
+            event['data'] = data
+        return self._append(event)
+
+    def _append(self, event):
+        with self._lock:
+            self._seq += 1
+            event = {'type': event['type'], 'seq': self._seq, **event}
+            self._events.append(event)
+            self.published += 1
+            subscribers = list(self._subscribers)
+        self._wake(subscribers)
+        return event
+
+    def wrote(self, before, after):
+        """Lote confirmado por este proceso: el reloj estaba en `before` al empezar y en `after` al terminar"""
+        with self._lock:
+            external = self._clock is not None and before > self._clock
+            self._clock = max(after, self._clock or 0)
+        if external:
+            self._external()
+
+    def observe(self, clock):
+        """Valor actual del reloj: si ha avanzado sin escrituras de este proceso, reset"""
+        with self._lock:
+            external = self._clock is not None and clock > self._clock
+            self._clock = max(clock, self._clock or 0)
+        if external:
+            self._external()
+
+    def _external(self):
+        self.external += 1
+        self._append({'type': 'reset'})
+
+    async def watch(self, read_clock, interval=EVENTS_POLL_SECONDS):
+        """Leer el reloj con `read_clock()` (en un hilo) cada `interval` segundos hasta close()"""
+        while not self._closed:
+            try:
+                self.observe(await asyncio.to_thread(read_clock))
+            except Exception as e:
+                print(f"⚠️ No se pudo leer el reloj de sincronización: {e}")
+            await asyncio.sleep(interval)
+
+    def since(self, seq, limit=EVENTS_PER_MESSAGE):
+        """(eventos posteriores a seq, reset); reset si ya no están en el búfer"""
+        with self._lock:
+            first = self._events[0]['seq'] if self._events else self._seq + 1
+            if seq > self._seq or seq < first - 1:
+                return [], True
+            start = seq - first + 1
+            return list(itertools.islice(self._events, start, start + limit)), False
+
+    async def listen(self, since=None, keepalive=KEEPALIVE_SECONDS):
+        """Generador asíncrono de mensajes desde `since` (None: solo los nuevos)
+
+        Empieza con {'type': 'hello'} y envía {'type': 'keepalive'} si no hay
+        cambios en `keepalive` segundos.
+        """
+        wakeup = asyncio.Event()
+        subscriber = (asyncio.get_running_loop(), wakeup)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            cursor = self._seq if since is None else since
+        try:
+            yield [{'type': 'hello', 'seq': self.seq}]
+            while not self._closed:
+                wakeup.clear()
+                events, reset = self.since(cursor)
+                if reset:
+                    self.resets += 1
+                    cursor = self.seq
+                    yield [{'type': 'reset', 'seq': cursor}]
+                elif events:
+                    cursor = events[-1]['seq']
+                    yield events
+                else:
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), keepalive)
+                    except asyncio.TimeoutError:
+                        yield [{'type': 'keepalive', 'seq': cursor}]
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+
+    def close(self):
+        """Terminar las conexiones abiertas (al detener la aplicación)"""
+        with self._lock:
+            self._closed = True
+            subscribers = list(self._subscribers)
+        self._wake(subscribers)
+
+    def _wake(self, subscribers):
+        for loop, wakeup in subscribers:
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                # Bucle de eventos ya cerrado
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'seq': self._seq,
+                'buffered': len(self._events),
+                'subscribers': len(self._subscribers),
+                'published': self.published,
+                'resets': self.resets,
+                'external': self.external,
+            }
+
+change_bus = ChangeBus()
+
+def parse_since(value):
+    """Secuencia de reanudación (?since= o Last-Event-ID); None si no hay o no es válida"""
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
@@ -0,0 +1,363 @@
+"""
+Gestión de conexiones SQLite
+Pool de conexiones de lectura reutilizables + conexión de escritura dedicada
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from metrics import record_sql
+from slowlog import slow_queries
+
+DATABASE = os.environ.get('TASKFLOW_DB', 'Inmotica-tasks.db')
+
+# Tamaño del pool de lectura y tiempo máximo de espera por una conexión
+POOL_SIZE = int(os.environ.get('TASKFLOW_DB_POOL_SIZE', '8'))
+POOL_TIMEOUT = float(os.environ.get('TASKFLOW_DB_POOL_TIMEOUT', '10'))
+
+# Segundos de inactividad tras los que se verifica una conexión antes de entregarla
+HEALTH_CHECK_INTERVAL = 30.0
+
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -20000',       # ~20 MB de caché de páginas por conexión
+    'PRAGMA mmap_size = 268435456',     # 256 MB de E/S mapeada en memoria
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA busy_timeout = 5000',
+)
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor que mide cada consulta para las métricas y el registro de consultas lentas
+
+    Una consulta con filas termina al agotarlas, al ejecutar otra en el mismo
+    cursor o al cerrarlo o liberarlo; su duración incluye la lectura de filas.
+    """
+
+    _statement = None
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        finally:
+            seconds = time.perf_counter() - start
+            record_sql(seconds, 1)
+        self._started(sql, parameters, seconds)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            super().executemany(sql, seq_of_parameters)
+        finally:
+            seconds = time.perf_counter() - start
+            record_sql(seconds, 1)
+        self._started(sql, None, seconds)
+        return self
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(time.perf_counter() - start, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        start = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._fetched(time.perf_counter() - start, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(time.perf_counter() - start, len(rows), True)
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(time.perf_counter() - start, 0, True)
+            raise
+        self._fetched(time.perf_counter() - start, 1, False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+    def _started(self, sql, parameters, seconds):
+        if not slow_queries.enabled:
+            return
+        if self.description is None:
+            # Sin filas que leer (INSERT, UPDATE...): termina aquí
+            slow_queries.check(self.connection, sql, parameters, seconds, max(self.rowcount, 0))
+        else:
+            self._statement = [sql, parameters, seconds, 0]
+
+    def _fetched(self, seconds, rows, done):
+        record_sql(seconds)
+        statement = self._statement
+        if statement is not None:
+            statement[2] += seconds
+            statement[3] += rows
+            if done:
+                self._finish()
+
+    def _finish(self):
+        statement, self._statement = self._statement, None
+        if statement is not None:
+            slow_queries.check(self.connection, *statement)
+
+class TimedConnection(sqlite3.Connection):
+    """Conexión cuyos atajos execute/executemany usan TimedCursor"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+class PoolTimeout(Exception):
+    """No hay conexiones libres en el pool dentro del tiempo de espera"""
+
+def connect(database=None, read_only=False):
+    """Abrir una conexión configurada (WAL, caché, mmap)"""
+    conn = sqlite3.connect(database or DATABASE, check_same_thread=False, factory=TimedConnection)
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    if read_only:
+        conn.execute('PRAGMA query_only = ON')
+    return conn
+
+class ConnectionPool:
+    """Pool acotado de conexiones de lectura y una única conexión de escritura"""
+
+    def __init__(self, database=None, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.database = database or DATABASE
+        self.size = size
+        self.timeout = timeout
+        self.pid = os.getpid()
+
+        # LIFO: se reutiliza primero la conexión con la caché más caliente
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+        # Métricas de espera
+        self._acquired = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._replaced = 0
+
+    # ---------- Lectura ----------
+
+    def acquire(self):
+        """Obtener una conexión de lectura (espera si el pool está agotado)"""
+        start = time.perf_counter()
+        waited = False
+
+        try:
+            conn, last_used = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    create = True
+                else:
+                    create = False
+
+            if create:
+                try:
+                    conn = connect(self.database, read_only=True)
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+                last_used = time.monotonic()
+            else:
+                waited = True
+                try:
+                    conn, last_used = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise PoolTimeout(f'Sin conexiones libres tras {self.timeout}s')
+
+        if time.monotonic() - last_used > HEALTH_CHECK_INTERVAL:
+            conn = self._check(conn)
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._acquired += 1
+            self._wait_total += elapsed
+            self._wait_max = max(self._wait_max, elapsed)
+            if waited:
+                self._waits += 1
+
+        return conn
+
+    def release(self, conn):
+        """Devolver una conexión al pool"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn = self._replace(conn)
+        self._idle.put((conn, time.monotonic()))
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def _check(self, conn):
+        """Verificar una conexión inactiva; sustituirla si está rota"""
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return conn
+        except sqlite3.Error:
+            return self._replace(conn)
+
+    def _replace(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._replaced += 1
+        return connect(self.database, read_only=True)
+
+    # ---------- Escritura ----------
+
+    @contextmanager
+    def writer(self):
+        """Conexión de escritura exclusiva; deshace lo que no se haya confirmado"""
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = connect(self.database)
+            try:
+                yield self._writer
+            finally:
+                if self._writer.in_transaction:
+                    self._writer.rollback()
+
+    # ---------- Estado ----------
+
+    def health(self):
+        """Comprobar que lectura y escritura responden"""
+        result = {'read': False, 'write': False}
+        try:
+            with self.connection() as conn:
+                conn.execute('SELECT 1').fetchone()
+            result['read'] = True
+        except Exception as e:
+            result['read_error'] = str(e)
+        try:
+            with self.writer() as conn:
+                conn.execute('SELECT 1').fetchone()
+            result['write'] = True
+        except Exception as e:
+            result['write_error'] = str(e)
+        return result
+
+    def stats(self):
+        """Métricas del pool (tiempos en milisegundos)"""
+        with self._lock:
+            return {
+                'size': self.size,
+                'created': self._created,
+                'idle': self._idle.qsize(),
+                'in_use': self._created - self._idle.qsize(),
+                'acquired': self._acquired,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'replaced': self._replaced,
+                'wait_total_ms': round(self._wait_total * 1000, 3),
+                'wait_avg_ms': round(self._wait_total * 1000 / self._acquired, 3) if self._acquired else 0.0,
+                'wait_max_ms': round(self._wait_max * 1000, 3),
+            }
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Pool del proceso actual (se recrea tras un fork)"""
+    global _pool
+    if _pool is None or _pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid():
+                _pool = ConnectionPool()
+    return _pool
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool.pid == os.getpid():
+            _pool.close()
+        _pool = None
+
+# ==================== DEPENDENCIAS FASTAPI ====================
+
+def get_db():
+    """Conexión de lectura del pool para la duración de la petición"""
+    with get_pool().connection() as conn:
+        yield conn
+
+# ==================== FILTROS ====================
+
+def date_range(from_date, to_date):
+    """Límites [desde, hasta) de un rango de días YYYY-MM-DD
+
+    Permite filtrar columnas de fecha/hora con comparaciones directas
+    (`col >= ? AND col < ?`) que pueden usar índices, en lugar de DATE(col).
+    """
+    start = datetime.strptime(from_date, '%Y-%m-%d').date()
+    end = datetime.strptime(to_date, '%Y-%m-%d').date() + timedelta(days=1)
+    return start.isoformat(), end.isoformat()
+
+# ==================== VERSIONES DE DATOS ====================
+
+def data_versions(conn):
+    """Versión actual de cada tabla (la incrementan los triggers en cada escritura)"""
+    return {row[0]: row[1] for row in conn.execute('SELECT table_name, version FROM data_versions')}
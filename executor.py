@@ -0,0 +1,99 @@
+"""
+Capa de ejecución para trabajo pesado fuera del bucle de eventos
+Los informes se generan en un pool de procesos acotado
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Procesos trabajadores para informes y máximo de informes esperando turno
+REPORT_WORKERS = int(os.environ.get('TASKFLOW_REPORT_WORKERS', min(4, os.cpu_count() or 1)))
+REPORT_QUEUE_LIMIT = int(os.environ.get('TASKFLOW_REPORT_QUEUE', '16'))
+
+class ExecutorBusy(Exception):
+    """Demasiados informes en cola"""
+
+_executor = None
+_slots = None
+_waiting = 0
+
+def get_executor():
+    """Pool de procesos (spawn: los hijos no heredan conexiones ni hilos)"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=REPORT_WORKERS,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    return _executor
+
+def _get_slots():
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(REPORT_WORKERS)
+    return _slots
+
+async def run_in_process(func, *args, limit_queue=True, on_start=None):
+    """Ejecutar `func(*args)` en un proceso trabajador respetando el límite de concurrencia
+
+    Con `limit_queue=False` se espera turno aunque la cola esté llena (los
+    trabajos en segundo plano tienen su propio límite). `on_start` se llama
+    al conseguir un trabajador.
+    """
+    global _executor, _waiting
+
+    slots = _get_slots()
+    if limit_queue and slots.locked() and _waiting >= REPORT_QUEUE_LIMIT:
+        raise ExecutorBusy('Servidor ocupado generando informes, inténtalo más tarde')
+
+    _waiting += 1
+    try:
+        await slots.acquire()
+    finally:
+        _waiting -= 1
+
+    try:
+        if on_start is not None:
+            on_start()
+        future = get_executor().submit(func, *args)
+    except BaseException as e:
+        slots.release()
+        if isinstance(e, BrokenProcessPool):
+            _executor = None
+        raise
+
+    # El turno se libera cuando termina el proceso y no la petición: si el
+    # cliente se desconecta, el informe sigue ocupando su trabajador
+    loop = asyncio.get_running_loop()
+    future.add_done_callback(lambda _: _release(loop, slots))
+    try:
+        return await asyncio.wrap_future(future)
+    except BrokenProcessPool:
+        # Un trabajador murió: se descarta el pool para recrearlo en la siguiente petición
+        _executor = None
+        raise
+
+def _release(loop, slots):
+    try:
+        loop.call_soon_threadsafe(slots.release)
+    except RuntimeError:
+        # Bucle de eventos ya cerrado
+        pass
+
+def stats():
+    """Estado de la cola de informes"""
+    return {
+        'workers': REPORT_WORKERS,
+        'running': REPORT_WORKERS - (_slots._value if _slots else REPORT_WORKERS),
+        'waiting': _waiting,
+        'queue_limit': REPORT_QUEUE_LIMIT,
+    }
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,152 @@
+"""
+Caché de fragmentos de informes
+Bloques por tarea ya construidos (los flowables de su título, información y
+tabla en PDF) guardados en disco junto a la revisión de la tarea con la que se
+generaron, compartidos por todos los procesos de informes y de bloques
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+
+# Directorio de la caché y espacio máximo en disco (0 la desactiva)
+FRAGMENT_CACHE_DIR = os.environ.get('TASKFLOW_FRAGMENT_CACHE',
+                                    os.path.join(tempfile.gettempdir(), 'taskflow_fragments'))
+FRAGMENT_CACHE_BYTES = int(float(os.environ.get('TASKFLOW_FRAGMENT_CACHE_MB', '64')) * 1024 * 1024)
+
+class FragmentCache:
+    """Un fichero por clave (base de datos, tarea, formato) con su revisión delante del fragmento
+
+    Una revisión distinta cuenta como fallo (sin leer el fragmento) y el
+    siguiente put sustituye el fichero, así que escribir en la tarea o en sus
+    registros lo invalida en todos los procesos. Los ficheros se escriben
+    aparte y se renombran: un proceso nunca lee uno a medias. Los aciertos y
+    fallos se cuentan en cada proceso; entradas y bytes salen del directorio,
+    y se expulsan los de fecha de modificación más antigua.
+
+    El contenido es pickle: el directorio se crea privado y la caché se
+    desactiva si pertenece a otro usuario.
+    """
+
+    def __init__(self, directory=FRAGMENT_CACHE_DIR, max_bytes=FRAGMENT_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._written = 0
+        self._ready = None
+
+    def _usable(self):
+        if self._ready is None:
+            self._ready = False
+            if self.max_bytes > 0:
+                try:
+                    os.makedirs(self.directory, mode=0o700, exist_ok=True)
+                    owner = os.stat(self.directory).st_uid
+                except OSError as e:
+                    print(f"⚠️ Caché de fragmentos desactivada: {e}")
+                    return False
+                if hasattr(os, 'getuid') and owner != os.getuid():
+                    print(f"⚠️ Caché de fragmentos desactivada: {self.directory} es de otro usuario")
+                    return False
+                self._ready = True
+        return self._ready
+
+    def _path(self, key):
+        digest = hashlib.sha256(repr(key).encode()).hexdigest()[:32]
+        return os.path.join(self.directory, f'{digest}.pickle')
+
+    def get(self, key, revision):
+        if not self._usable():
+            self.misses += 1
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                if pickle.load(f) != revision:
+                    self.misses += 1
+                    return None
+                value = pickle.load(f)
+            # La fecha de modificación ordena la expulsión
+            os.utime(path)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key, revision, value):
+        if not self._usable():
+            return
+        data = pickle.dumps(revision) + pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return
+        temp = None
+        try:
+            fd, temp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp, self._path(key))
+        except OSError as e:
+            if temp is not None:
+                _remove(temp)
+            print(f"⚠️ No se pudo guardar el fragmento {key}: {e}")
+            return
+        # El directorio se recorre cada vez que se escribe un octavo del espacio
+        self._written += len(data)
+        if self._written > self.max_bytes // 8:
+            self._written = 0
+            self.prune()
+
+    def _entries(self):
+        try:
+            return [entry for entry in os.scandir(self.directory) if entry.name.endswith('.pickle')]
+        except OSError:
+            return []
+
+    def prune(self):
+        """Borrar los fragmentos menos usados hasta caber en max_bytes"""
+        entries = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            _remove(path)
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        for entry in self._entries():
+            _remove(entry.path)
+
+    def stats(self):
+        sizes = []
+        for entry in self._entries():
+            try:
+                sizes.append(entry.stat().st_size)
+            except OSError:
+                pass
+        return {
+            'entries': len(sizes),
+            'bytes': sum(sizes),
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+fragment_cache = FragmentCache()
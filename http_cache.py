@@ -0,0 +1,156 @@
+"""
+Caché HTTP de las lecturas de la API
+ETag derivado de la versión de las tablas de las que depende cada ruta,
+respuestas 304 Not Modified y caché en memoria de las respuestas JSON
+"""
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+from database import get_pool, data_versions
+
+# Respuestas guardadas como máximo y tamaño máximo de cada una
+RESPONSE_CACHE_SIZE = int(os.environ.get('TASKFLOW_RESPONSE_CACHE', '256'))
+RESPONSE_CACHE_MAX_BYTES = 1024 * 1024
+
+# Rutas GET cacheables y tablas de las que depende su respuesta
+CACHEABLE_ROUTES = [
+    (re.compile(r'^/api/users$'), ('users',)),
+    (re.compile(r'^/api/tasks(/\d+)?$'), ('tasks', 'users', 'annotations', 'time_entries')),
+    (re.compile(r'^/api/tasks/\d+/annotations$'), ('annotations',)),
+    (re.compile(r'^/api/tasks/\d+/times$'), ('time_entries',)),
+    (re.compile(r'^/api/timeentries/(list|\d+)$'), ('time_entries', 'tasks', 'users')),
+    (re.compile(r'^/api/stats/summary$'), ('time_entries', 'tasks', 'users')),
+    (re.compile(r'^/api/sync$'), ('users', 'tasks', 'annotations', 'time_entries')),
+]
+
+class ResponseCache:
+    """LRU acotado de respuestas: clave (ruta, query) -> (etag, cabeceras, cuerpo)"""
+
+    def __init__(self, size=RESPONSE_CACHE_SIZE):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key, etag):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] != etag:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item
+
+    def put(self, key, etag, headers, body):
+        with self._lock:
+            self._items[key] = (etag, headers, body)
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._items),
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+            }
+
+response_cache = ResponseCache()
+
+def route_tables(path):
+    for pattern, tables in CACHEABLE_ROUTES:
+        if pattern.match(path):
+            return tables
+    return None
+
+def _current_versions():
+    with get_pool().connection() as conn:
+        return data_versions(conn)
+
+def make_etag(path, query, tables, versions):
+    """ETag fuerte: misma ruta, parámetros y versión de datos => mismo cuerpo"""
+    state = ','.join(f'{table}:{versions.get(table, 0)}' for table in tables)
+    digest = hashlib.sha1(f'{path}?{query}|{state}'.encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+class ETagMiddleware:
+    """Middleware ASGI: 304 si el cliente ya tiene la versión actual y caché de respuestas"""
+
+    def __init__(self, app, cache=response_cache):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] != 'GET':
+            await self.app(scope, receive, send)
+            return
+
+        tables = route_tables(scope['path'])
+        request_headers = Headers(scope=scope)
+        # Las respuestas en streaming (NDJSON) no se guardan
+        if tables is None or 'application/x-ndjson' in request_headers.get('accept', ''):
+            await self.app(scope, receive, send)
+            return
+
+        query = scope.get('query_string', b'').decode()
+        versions = await run_in_threadpool(_current_versions)
+        etag = make_etag(scope['path'], query, tables, versions)
+        validators = [(b'etag', etag.encode()), (b'cache-control', b'no-cache')]
+
+        if etag_matches(request_headers.get('if-none-match'), etag):
+            self.cache.not_modified += 1
+            await send({'type': 'http.response.start', 'status': 304, 'headers': validators})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        key = (scope['path'], query)
+        cached = self.cache.get(key, etag)
+        if cached is not None:
+            _, headers, body = cached
+            await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+            await send({'type': 'http.response.body', 'body': body})
+            return
+
+        state = {'headers': None, 'body': [], 'size': 0}
+
+        async def send_with_etag(message):
+            if message['type'] == 'http.response.start':
+                if message['status'] == 200:
+                    headers = MutableHeaders(scope=message)
+                    headers['ETag'] = etag
+                    headers['Cache-Control'] = 'no-cache'
+                    state['headers'] = list(message['headers'])
+            elif message['type'] == 'http.response.body' and state['headers'] is not None:
+                state['body'].append(message.get('body', b''))
+                state['size'] += len(message.get('body', b''))
+                if state['size'] > RESPONSE_CACHE_MAX_BYTES:
+                    # Demasiado grande para guardarla: se envía sin copiar
+                    state['headers'] = None
+                    state['body'] = []
+                elif not message.get('more_body'):
+                    self.cache.put(key, etag, state['headers'], b''.join(state['body']))
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
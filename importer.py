@@ -0,0 +1,334 @@
+"""
+Importación de registros de tiempo desde hojas de cálculo (XLSX) y CSV
+El fichero se lee fila a fila y se escribe por bloques, cada uno como una
+operación de la cola de escrituras: la memoria usada no depende del tamaño
+del fichero.
+
+Uso: python importer.py registros.xlsx [--dry-run] [--chunk-size 500] [--rejected rechazados.csv]
+"""
+
+import argparse
+import csv
+import io
+import itertools
+import json
+import re
+import sys
+from datetime import datetime
+
+from pydantic import ValidationError
+
+from database import get_pool
+from migrations import apply_migrations
+from models import TaskCreate, TimeEntryCreate
+from writequeue import write_queue
+import operations
+
+# Filas por transacción
+IMPORT_CHUNK_SIZE = 500
+
+# Filas que se examinan buscando la cabecera (los informes llevan título y periodo antes)
+HEADER_SEARCH_ROWS = 20
+
+# Cabeceras reconocidas (en minúsculas) -> campo
+COLUMNS = {
+    'fecha/hora inicio': 'start_time',
+    'inicio': 'start_time',
+    'start_time': 'start_time',
+    'fecha/hora fin': 'end_time',
+    'fin': 'end_time',
+    'end_time': 'end_time',
+    'tarea': 'task',
+    'task': 'task',
+    'task_number': 'task',
+    'usuario': 'user',
+    'user': 'user',
+    'comentario': 'comment',
+    'comment': 'comment',
+}
+
+# Tarea tal como aparece en los informes exportados: '#12: Nombre de la tarea'
+TASK_LABEL = re.compile(r'^#(\d+):\s*(.*)$')
+
+# Marca de los fines estimados de registros abiertos en los informes
+OPEN_END_MARK = ' *'
+
+class ImportFileError(Exception):
+    """El fichero no se puede importar (formato o cabecera no reconocidos)"""
+
+# ==================== LECTURA ====================
+
+def read_rows(source, filename):
+    """Filas del fichero como tuplas, sin cargarlo entero en memoria"""
+    if filename.lower().endswith('.csv'):
+        yield from _read_csv(source)
+    elif filename.lower().endswith(('.xlsx', '.xlsm')):
+        from openpyxl import load_workbook
+
+        wb = load_workbook(source, read_only=True, data_only=True)
+        try:
+            yield from wb.worksheets[0].iter_rows(values_only=True)
+        finally:
+            wb.close()
+    else:
+        raise ImportFileError('Formato no soportado: se admiten ficheros .xlsx y .csv')
+
+def _read_csv(source):
+    text = io.TextIOWrapper(source, encoding='utf-8-sig', newline='')
+    try:
+        # Separador deducido de la cabecera (',' o ';' según el programa que lo exportó)
+        first = text.readline()
+        try:
+            dialect = csv.Sniffer().sniff(first, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.reader(itertools.chain([first], text), dialect)
+    finally:
+        text.detach()
+
+def _header_columns(row):
+    columns = {}
+    for index, value in enumerate(row):
+        field = COLUMNS.get(str(value).strip().lower()) if value is not None else None
+        if field and field not in columns:
+            columns[field] = index
+    return columns
+
+def _cell(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat(timespec='minutes')
+    value = str(value).strip()
+    return value or None
+
+def parse_rows(rows):
+    """(número de fila, datos o None, error) por cada fila con datos
+
+    Se salta lo anterior a la cabecera y las filas vacías o de totales.
+    """
+    rows = iter(rows)
+    columns = None
+    for number, row in enumerate(itertools.islice(rows, HEADER_SEARCH_ROWS), 1):
+        found = _header_columns(row)
+        if 'start_time' in found and 'task' in found:
+            columns = found
+            break
+    if columns is None:
+        raise ImportFileError('No se encuentra la cabecera (se necesitan las columnas Inicio y Tarea)')
+
+    for number, row in enumerate(rows, number + 1):
+        values = {field: _cell(row[index]) if index < len(row) else None for field, index in columns.items()}
+        if values['start_time'] is None and values['task'] is None:
+            continue
+        try:
+            yield number, _parse_values(values), None
+        except ValueError as e:
+            yield number, None, str(e)
+
+def _parse_values(values):
+    if values['task'] is None:
+        raise ValueError('Falta la tarea')
+
+    end_time = values.get('end_time')
+    if end_time and end_time.endswith(OPEN_END_MARK):
+        end_time = None
+    comment = values.get('comment')
+    if comment == '-':
+        comment = None
+
+    try:
+        entry = TimeEntryCreate(start_time=values['start_time'], end_time=end_time, comment=comment)
+    except ValidationError as e:
+        raise ValueError('; '.join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+    for value in (entry.start_time, entry.end_time):
+        if value:
+            try:
+                datetime.fromisoformat(value.replace('Z', '+00:00'))
+            except ValueError:
+                raise ValueError(f'Fecha no válida: {value}')
+
+    return {'task': values['task'], 'user': values.get('user'), 'entry': entry}
+
+# ==================== ESCRITURA ====================
+
+class _Resolver:
+    """Ids de tareas y usuarios por nombre, con caché dentro de un bloque
+
+    `planned` son los nombres (en minúsculas) de las tareas ya creadas en
+    bloques anteriores: en una simulación esos bloques se deshicieron y la
+    tarea se vuelve a crear, pero solo cuenta una vez en `created`.
+    """
+
+    def __init__(self, conn, planned=None):
+        self.conn = conn
+        self.planned = planned if planned is not None else set()
+        self.tasks = {}
+        self.users = {}
+        self.created = []
+
+    def task_id(self, label, user):
+        if label not in self.tasks:
+            self.tasks[label] = self._find_task(label) or self._create_task(label, user)
+        return self.tasks[label]
+
+    def _find_task(self, label):
+        if label.isdigit():
+            row = self.conn.execute('SELECT id FROM tasks WHERE task_number = ?', (int(label),)).fetchone()
+            if row is None:
+                raise ValueError(f'No existe la tarea #{label}')
+            return row[0]
+
+        match = TASK_LABEL.match(label)
+        number, name = (int(match.group(1)), match.group(2)) if match else (None, label)
+        # Si hay varias con el mismo nombre se prefiere la del mismo número
+        row = self.conn.execute(
+            'SELECT id FROM tasks WHERE name = ? COLLATE NOCASE ORDER BY task_number = ? DESC, task_number LIMIT 1',
+            (name, number)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _create_task(self, label, user):
+        match = TASK_LABEL.match(label)
+        name = match.group(2) if match else label
+        if not user:
+            raise ValueError(f'La tarea "{name}" no existe y la fila no indica usuario')
+        if user not in self.users:
+            row = self.conn.execute('SELECT id FROM users WHERE name = ? COLLATE NOCASE', (user,)).fetchone()
+            self.users[user] = row[0] if row else None
+        if self.users[user] is None:
+            raise ValueError(f'No existe el usuario {user}')
+
+        task = TaskCreate(name=name, user_id=self.users[user])
+        result = operations.create_task(self.conn, task)
+        if name.lower() not in self.planned:
+            self.planned.add(name.lower())
+            self.created.append({'id': result['id'], **task.model_dump(), 'task_number': result['task_number']})
+        return result['id']
+
+def _write_chunk(conn, chunk, resolver):
+    """Insertar un bloque de filas válidas; devuelve ([(fila, error)], filas insertadas)"""
+    rejected = []
+    resolved = []
+    for number, values in chunk:
+        try:
+            resolved.append((number, resolver.task_id(values['task'], values['user']), values['entry']))
+        except ValueError as e:
+            rejected.append((number, str(e)))
+
+    durations = [operations.calculate_duration(entry.start_time, entry.end_time) for _, _, entry in resolved]
+    params = []
+    for (number, task_id, entry), duration in zip(resolved, durations):
+        if duration is not None and duration < 0:
+            rejected.append((number, 'La fecha de fin debe ser posterior a la de inicio'))
+            continue
+        params.append((task_id, entry.start_time, entry.end_time, duration, entry.comment))
+
+    conn.executemany(operations.INSERT_TIME_ENTRIES, params)
+    return sorted(rejected), len(params)
+
+def _import_chunk(conn, chunk, planned, dry_run):
+    """Operación de la cola de escrituras: un bloque; con dry_run se deshace dentro de ella"""
+    resolver = _Resolver(conn, planned)
+    if dry_run:
+        conn.execute('SAVEPOINT dry_run')
+    try:
+        rejected, imported = _write_chunk(conn, chunk, resolver)
+    finally:
+        if dry_run:
+            conn.execute('ROLLBACK TO dry_run')
+            conn.execute('RELEASE dry_run')
+    return rejected, imported, resolver.created
+
+def import_time_entries(rows, queue=None, chunk_size=IMPORT_CHUNK_SIZE, dry_run=False):
+    """Importar registros de tiempo; genera eventos de progreso
+
+    Eventos: {'event': 'rejected', 'row', 'error'} por cada fila rechazada,
+    {'event': 'task_created', 'id', ...} por cada tarea creada (no en las
+    simulaciones), {'event': 'progress', ...} tras cada bloque y
+    {'event': 'done', ...} al final.
+    Cada bloque va por la cola de escrituras (`queue`, por defecto la del
+    proceso) como el resto de escrituras: misma transacción IMMEDIATE y el bus
+    de cambios lo cuenta como escritura propia. Con dry_run se valida y se
+    escribe igual, pero cada bloque se deshace.
+    """
+    queue = queue or write_queue
+    counters = {'rows': 0, 'imported': 0, 'rejected': 0, 'tasks_created': 0}
+    planned = set()
+    parsed = parse_rows(rows)
+
+    while True:
+        block = list(itertools.islice(parsed, chunk_size))
+        if not block:
+            break
+
+        chunk = []
+        for number, values, error in block:
+            if error:
+                counters['rejected'] += 1
+                yield {'event': 'rejected', 'row': number, 'error': error}
+            else:
+                chunk.append((number, values))
+        counters['rows'] += len(block)
+
+        rejected, imported, created = queue.submit(_import_chunk, chunk, planned, dry_run).result()
+
+        for number, error in rejected:
+            yield {'event': 'rejected', 'row': number, 'error': error}
+        counters['rejected'] += len(rejected)
+        counters['imported'] += imported
+        if not dry_run:
+            for task in created:
+                yield {'event': 'task_created', **task}
+        counters['tasks_created'] += len(created)
+        yield {'event': 'progress', **counters}
+
+    yield {'event': 'done', 'dry_run': dry_run, **counters}
+
+def import_file(source, filename, **options):
+    return import_time_entries(read_rows(source, filename), **options)
+
+# ==================== LÍNEA DE COMANDOS ====================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Importar registros de tiempo desde XLSX o CSV')
+    parser.add_argument('file', help='fichero .xlsx o .csv con columnas Inicio, Fin, Tarea, Usuario, Comentario')
+    parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, help='filas por transacción')
+    parser.add_argument('--dry-run', action='store_true', help='validar sin guardar nada')
+    parser.add_argument('--rejected', help='guardar las filas rechazadas en este CSV')
+    args = parser.parse_args(argv)
+
+    with get_pool().writer() as conn:
+        apply_migrations(conn)
+
+    rejected_file = open(args.rejected, 'w', newline='', encoding='utf-8') if args.rejected else None
+    rejected_writer = csv.writer(rejected_file) if rejected_file else None
+    if rejected_writer:
+        rejected_writer.writerow(['fila', 'error'])
+
+    try:
+        with open(args.file, 'rb') as source:
+            for event in import_file(source, args.file, chunk_size=args.chunk_size, dry_run=args.dry_run):
+                if event['event'] == 'rejected':
+                    if rejected_writer:
+                        rejected_writer.writerow([event['row'], event['error']])
+                    else:
+                        print(f"⚠️  Fila {event['row']}: {event['error']}", file=sys.stderr)
+                elif event['event'] == 'task_created':
+                    print(f"🆕 Tarea #{event['task_number']} creada: {event['name']}")
+                elif event['event'] == 'progress':
+                    print(f"⏳ {event['rows']} filas leídas, {event['imported']} importadas, "
+                          f"{event['rejected']} rechazadas")
+                else:
+                    print(f"✅ Importación {'simulada' if args.dry_run else 'terminada'}: "
+                          f"{json.dumps({k: v for k, v in event.items() if k != 'event'})}")
+    except ImportFileError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    finally:
+        if rejected_file:
+            rejected_file.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""
+Trabajos de informes en segundo plano
+Cola con consulta de estado y caché de resultados por contenido (informe,
+parámetros normalizados y versión de los datos)
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from starlette.concurrency import run_in_threadpool
+
+import executor
+import metrics
+import reports
+from database import get_pool, data_versions
+
+# Directorio de informes generados y número máximo de ficheros en caché
+REPORTS_CACHE_DIR = os.environ.get('TASKFLOW_REPORTS_CACHE', os.path.join(tempfile.gettempdir(), 'taskflow_reports'))
+CACHE_MAX_FILES = int(os.environ.get('TASKFLOW_REPORTS_CACHE_FILES', '200'))
+
+# Trabajos pendientes admitidos y segundos que se conserva un trabajo terminado
+JOBS_LIMIT = int(os.environ.get('TASKFLOW_REPORT_JOBS', '100'))
+JOB_TTL = 3600
+
+# Tipo de los parámetros numéricos de los informes (el resto son texto)
+PARAM_TYPES = {'from_task': int, 'to_task': int, 'user_id': int}
+
+class JobsFull(Exception):
+    """Demasiados trabajos de informes pendientes"""
+
+@dataclass
+class CachedReport:
+    path: str
+    filename: str
+    media_type: str
+
+@dataclass
+class Job:
+    id: str
+    report: str
+    params: dict
+    key: str
+    status: str = 'queued'      # queued, running, done, error
+    cached: bool = False
+    error: str = None
+    result: CachedReport = None
+    created_at: float = field(default_factory=time.time)
+    started_at: float = None
+    finished_at: float = None
+    finished: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def to_dict(self):
+        def timestamp(value):
+            return datetime.fromtimestamp(value).isoformat(timespec='seconds') if value else None
+
+        return {
+            'id': self.id,
+            'report': self.report,
+            'params': self.params,
+            'status': self.status,
+            'cached': self.cached,
+            'error': self.error,
+            'filename': self.result.filename if self.result else None,
+            'download_url': f'/api/reports/jobs/{self.id}/download' if self.status == 'done' else None,
+            'created_at': timestamp(self.created_at),
+            'started_at': timestamp(self.started_at),
+            'finished_at': timestamp(self.finished_at),
+        }
+
+_jobs = {}
+_tasks = set()
+_cache = OrderedDict()
+
+# ==================== PARÁMETROS ====================
+
+def normalize_params(report, params):
+    """Validar los parámetros contra el generador del informe y normalizarlos
+
+    Se descartan los vacíos y se convierten los tipos, de modo que peticiones
+    equivalentes producen la misma clave de caché.
+    """
+    try:
+        accepted = reports.report_params(report)
+    except ValueError:
+        raise ValueError(f"Informe no válido: {report}")
+
+    unknown = sorted(set(params) - set(accepted))
+    if unknown:
+        raise ValueError(f"Parámetros no válidos: {', '.join(unknown)}")
+
+    normalized = {}
+    for name, required in accepted.items():
+        value = params.get(name)
+        if value is None or value == '':
+            if required:
+                raise ValueError(f'Falta el parámetro {name}')
+            continue
+        try:
+            normalized[name] = PARAM_TYPES.get(name, str)(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'Parámetro {name} no válido: {value}')
+    # Opciones de formato y fechas: el error llega al crear el trabajo y no al ejecutarlo
+    reports.validate_filters(*reports.parse_name(report), normalized)
+    return normalized
+
+def cache_key(report, params, versions):
+    payload = json.dumps([report, params, versions], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def _current_versions():
+    with get_pool().connection() as conn:
+        return data_versions(conn)
+
+# ==================== COLA ====================
+
+async def submit(report, params):
+    """Encolar un informe; reutiliza el fichero en caché o el trabajo en curso equivalente"""
+    params = normalize_params(report, params)
+    key = cache_key(report, params, await run_in_threadpool(_current_versions))
+    _prune_jobs()
+
+    cached = _cache.get(key)
+    if cached is not None and os.path.exists(cached.path):
+        _cache.move_to_end(key)
+        job = Job(uuid.uuid4().hex, report, params, key, status='done', cached=True, result=cached)
+        job.finished_at = job.created_at
+        job.finished.set()
+        _jobs[job.id] = job
+        return job
+
+    for job in _jobs.values():
+        if job.key == key and job.status in ('queued', 'running'):
+            return job
+
+    if sum(1 for job in _jobs.values() if job.status in ('queued', 'running')) >= JOBS_LIMIT:
+        raise JobsFull('Demasiados informes pendientes, inténtalo más tarde')
+
+    job = Job(uuid.uuid4().hex, report, params, key)
+    _jobs[job.id] = job
+    task = asyncio.create_task(_run(job))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return job
+
+async def _run(job):
+    def started():
+        job.status = 'running'
+        job.started_at = time.time()
+
+    try:
+        report = await executor.run_in_process(
+            reports.build_report, job.report, job.params, limit_queue=False, on_start=started
+        )
+        metrics.observe_report(job.report, report.timings)
+        job.result = _store(job.key, report)
+        job.status = 'done'
+    except asyncio.CancelledError:
+        job.status = 'error'
+        job.error = 'Cancelado'
+        raise
+    except reports.EmptyReportError as e:
+        job.status = 'error'
+        job.error = str(e)
+    except Exception as e:
+        print(f"Error generando informe {job.report}: {e}")
+        job.status = 'error'
+        job.error = str(e)
+    finally:
+        job.finished_at = time.time()
+        job.finished.set()
+
+def _store(key, report):
+    """Mover el fichero generado a la caché, expulsando los más antiguos"""
+    os.makedirs(REPORTS_CACHE_DIR, exist_ok=True)
+    path = os.path.join(REPORTS_CACHE_DIR, key + os.path.splitext(report.filename)[1])
+    shutil.move(report.path, path)
+
+    cached = CachedReport(path, report.filename, report.media_type)
+    _cache[key] = cached
+    _cache.move_to_end(key)
+    while len(_cache) > CACHE_MAX_FILES:
+        _, old = _cache.popitem(last=False)
+        reports.remove_file(old.path)
+    return cached
+
+def _prune_jobs():
+    limit = time.time() - JOB_TTL
+    for job_id in [job.id for job in _jobs.values() if job.finished_at and job.finished_at < limit]:
+        del _jobs[job_id]
+
+def get_job(job_id):
+    return _jobs.get(job_id)
+
+async def wait_for(job, timeout):
+    """Esperar como mucho `timeout` segundos a que termine el trabajo"""
+    try:
+        await asyncio.wait_for(job.finished.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+
+def stats():
+    counts = {'queued': 0, 'running': 0, 'done': 0, 'error': 0}
+    for job in _jobs.values():
+        counts[job.status] += 1
+    return {**counts, 'cached_files': len(_cache)}
+
+def shutdown():
+    """Cancelar los trabajos pendientes y borrar los ficheros en caché"""
+    for task in list(_tasks):
+        task.cancel()
+    for cached in _cache.values():
+        reports.remove_file(cached.path)
+    _cache.clear()
+    _jobs.clear()
@@ -0,0 +1,368 @@
+"""
+Consultas de los listados de la API
+Paginación por cursor (keyset), proyección de campos, filtros y orden en servidor
+"""
+
+import base64
+import json
+
+from database import date_range
+
+# Tamaño máximo de página
+MAX_LIMIT = 1000
+
+# ==================== CURSORES ====================
+
+def encode_cursor(kind, values):
+    """Cursor opaco con los valores de la clave de orden de la última fila"""
+    payload = json.dumps([kind, list(values)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, kind):
+    """Valores de la clave de orden guardados en el cursor
+
+    El cursor solo es válido para el mismo tipo de listado y orden.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_kind, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ValueError('Cursor no válido')
+    if cursor_kind != kind or not isinstance(values, list):
+        raise ValueError('El cursor no corresponde a este listado u orden')
+    return values
+
+def keyset_condition(keys, values):
+    """Condición "después de la fila del cursor" para una clave de orden compuesta
+
+    `keys` es una lista de (expresión, descendente). Se usa IS para la
+    igualdad, de modo que las columnas con NULL también desempatan.
+    """
+    if len(values) != len(keys):
+        raise ValueError('Cursor no válido')
+
+    # Misma dirección y sin NULL: comparación de row values, que SQLite
+    # resuelve como un rango sobre el índice
+    directions = {descending for _, descending in keys}
+    if len(directions) == 1 and None not in values:
+        columns = ', '.join(f'({expr})' for expr, _ in keys)
+        placeholders = ', '.join('?' * len(keys))
+        return f"(({columns}) {'<' if directions.pop() else '>'} ({placeholders}))", list(values)
+
+    clauses = []
+    params = []
+    for i, (expr, descending) in enumerate(keys):
+        parts = [f'({prev}) IS ?' for prev, _ in keys[:i]]
+        parts.append(f"({expr}) {'<' if descending else '>'} ?")
+        clauses.append('(' + ' AND '.join(parts) + ')')
+        params.extend(values[:i + 1])
+    return '(' + ' OR '.join(clauses) + ')', params
+
+def check_limit(limit):
+    if limit is not None and not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f'limit debe estar entre 1 y {MAX_LIMIT}')
+
+def project_fields(fields, allowed):
+    """Campos pedidos con `fields=a,b,c` (todos si no se indica)"""
+    if not fields:
+        return list(allowed)
+    names = [name.strip() for name in fields.split(',') if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValueError(f"Campos no válidos: {', '.join(unknown)}")
+    return list(dict.fromkeys(names))
+
+def fetch_page(conn, select, keys, query, params, kind, limit):
+    """Ejecutar una consulta paginada y devolver (filas, siguiente cursor)
+
+    Las expresiones de la clave de orden se añaden al SELECT como `_k0`,
+    `_k1`... para construir el cursor y se eliminan de las filas devueltas.
+    """
+    key_select = ', '.join(f'{expr} AS _k{i}' for i, (expr, _) in enumerate(keys))
+    sql = query.format(select=f'{select}, {key_select}')
+    if limit is not None:
+        sql += ' LIMIT ?'
+        params = list(params) + [limit + 1]
+
+    rows = conn.execute(sql, params).fetchall()
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(kind, [last[f'_k{i}'] for i in range(len(keys))])
+
+    items = []
+    for row in rows:
+        item = dict(row)
+        for i in range(len(keys)):
+            del item[f'_k{i}']
+        items.append(item)
+    return items, next_cursor
+
+# ==================== TAREAS ====================
+
+TASK_FIELDS = {
+    'id': 't.id',
+    'task_number': 't.task_number',
+    'name': 't.name',
+    'description': 't.description',
+    'user_id': 't.user_id',
+    'max_time_minutes': 't.max_time_minutes',
+    'max_date': 't.max_date',
+    'status': 't.status',
+    'created_at': 't.created_at',
+    'updated_at': 't.updated_at',
+    'user_name': 'u.name',
+}
+
+# Totales por tarea (include=totals): subconsultas correlacionadas que usan
+# la clave primaria del resumen diario y los índices por tarea
+TASK_TOTALS = {
+    'total_minutes': '(SELECT COALESCE(SUM(r.minutes), 0) FROM time_rollup_daily r WHERE r.task_id = t.id)',
+    'time_entry_count': '(SELECT COALESCE(SUM(r.entries), 0) FROM time_rollup_daily r WHERE r.task_id = t.id)',
+    'has_open_timer': 'EXISTS (SELECT 1 FROM time_entries te WHERE te.task_id = t.id AND te.end_time IS NULL)',
+    'annotation_count': '(SELECT COUNT(*) FROM annotations a WHERE a.task_id = t.id)',
+}
+
+# Clave de orden de cada criterio: (expresión, dirección fija o None = la pedida)
+# Todas terminan en una columna única para que el cursor no pierda filas.
+TASK_SORTS = {
+    'number': [('t.task_number', None)],
+    'name': [('t.name COLLATE NOCASE', None), ('t.id', None)],
+    # Fecha límite: las tareas sin fecha siempre al final
+    'date': [('t.max_date IS NULL', 'asc'), ('t.max_date', None), ('t.id', None)],
+    'created': [('t.created_at', None), ('t.id', None)],
+}
+
+def tasks_filters(user_id=None, status=None, max_date_from=None, max_date_to=None):
+    """Condiciones WHERE comunes al listado y al total"""
+    conditions = []
+    params = []
+    if user_id:
+        conditions.append('t.user_id = ?')
+        params.append(user_id)
+    if status:
+        conditions.append(f"t.status IN ({', '.join('?' * len(status))})")
+        params.extend(status)
+    if max_date_from:
+        conditions.append('t.max_date >= ?')
+        params.append(max_date_from)
+    if max_date_to:
+        conditions.append('t.max_date <= ?')
+        params.append(max_date_to)
+    return conditions, params
+
+def parse_include(include, allowed):
+    """Expansiones pedidas con `include=a,b`"""
+    names = {name.strip() for name in (include or '').split(',') if name.strip()}
+    unknown = sorted(names - set(allowed))
+    if unknown:
+        raise ValueError(f"include no válido: {', '.join(unknown)} (opciones: {', '.join(allowed)})")
+    return names
+
+def task_select(names, include_totals):
+    columns = [f'{TASK_FIELDS[name]} AS {name}' for name in names]
+    if include_totals:
+        columns += [f'{expr} AS {name}' for name, expr in TASK_TOTALS.items()]
+    return ', '.join(columns)
+
+def _with_flags(task):
+    if 'has_open_timer' in task:
+        task['has_open_timer'] = bool(task['has_open_timer'])
+    return task
+
+def list_tasks(conn, fields=None, sort='number', order='asc', limit=None, cursor=None,
+               user_id=None, status=None, max_date_from=None, max_date_to=None, include=None):
+    """Página del listado de tareas: (tareas, siguiente cursor, total)
+
+    Sin `limit` se devuelven todas las tareas, como antes de paginar.
+    Con `include=totals` cada tarea lleva sus totales de tiempo y anotaciones.
+    """
+    if sort not in TASK_SORTS:
+        raise ValueError(f"Orden no válido: {sort} (opciones: {', '.join(TASK_SORTS)})")
+    if order not in ('asc', 'desc'):
+        raise ValueError("order debe ser 'asc' o 'desc'")
+    check_limit(limit)
+
+    names = project_fields(fields, TASK_FIELDS)
+    include_totals = 'totals' in parse_include(include, ('totals',))
+    keys = [(expr, (direction or order) == 'desc') for expr, direction in TASK_SORTS[sort]]
+    conditions, params = tasks_filters(user_id, status, max_date_from, max_date_to)
+
+    # Solo hace falta el JOIN con usuarios si se pide el nombre
+    join = 'LEFT JOIN users u ON t.user_id = u.id' if 'user_name' in names else ''
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    total = conn.execute(f'SELECT COUNT(*) FROM tasks t {where}', params).fetchone()[0]
+
+    if cursor:
+        condition, cursor_params = keyset_condition(keys, decode_cursor(cursor, f'tasks:{sort}:{order}'))
+        conditions = conditions + [condition]
+        params = params + cursor_params
+        where = f"WHERE {' AND '.join(conditions)}"
+
+    order_by = ', '.join(f"{expr} {'DESC' if descending else 'ASC'}" for expr, descending in keys)
+    query = f'SELECT {{select}} FROM tasks t {join} {where} ORDER BY {order_by}'
+    select = task_select(names, include_totals)
+
+    items, next_cursor = fetch_page(conn, select, keys, query, params, f'tasks:{sort}:{order}', limit)
+    return [_with_flags(item) for item in items], next_cursor, total
+
+def task_detail(conn, task_id, include=None):
+    """Tarea con sus anotaciones, registros y totales según `include`
+
+    Como mucho tres consultas, sea cual sea el número de anotaciones y
+    registros. None si la tarea no existe.
+    """
+    expand = parse_include(include, ('annotations', 'times', 'totals'))
+    row = conn.execute(f'''
+        SELECT {task_select(TASK_FIELDS, 'totals' in expand)}
+        FROM tasks t
+        LEFT JOIN users u ON t.user_id = u.id
+        WHERE t.id = ?
+    ''', (task_id,)).fetchone()
+    if row is None:
+        return None
+
+    task = _with_flags(dict(row))
+    if 'annotations' in expand:
+        task['annotations'] = [dict(a) for a in conn.execute(
+            'SELECT * FROM annotations WHERE task_id = ? ORDER BY created_at DESC', (task_id,)
+        )]
+    if 'times' in expand:
+        task['times'] = [dict(te) for te in conn.execute(
+            'SELECT * FROM time_entries WHERE task_id = ? ORDER BY start_time DESC', (task_id,)
+        )]
+    return task
+
+# ==================== REGISTROS DE TIEMPO ====================
+
+# Clave de orden de los registros de tiempo
+TIME_ENTRY_KEY = ('te.start_time', 'te.id')
+
+def time_entries_query(from_date, to_date, user_id=None, has_end=None, status=None, order='DESC', after=None):
+    """Consulta de registros de tiempo por rango de fechas de inicio con filtros opcionales
+
+    El orden es (start_time, id); `after` son los valores de esa clave de la
+    última fila ya leída, para continuar por cursor (keyset).
+    """
+    range_start, range_end = date_range(from_date, to_date)
+
+    query = '''
+        SELECT 
+            te.id,
+            te.task_id,
+            te.start_time,
+            te.end_time,
+            te.duration_minutes,
+            te.comment,
+            t.name as task_name,
+            t.task_number,
+            t.status as task_status,
+            u.name as user_name,
+            t.user_id
+        FROM time_entries te
+        JOIN tasks t ON te.task_id = t.id
+        LEFT JOIN users u ON t.user_id = u.id
+        WHERE te.start_time >= ? AND te.start_time < ?
+    '''
+    params = [range_start, range_end]
+
+    # Filtro por usuario
+    if user_id:
+        query += ' AND t.user_id = ?'
+        params.append(int(user_id))
+
+    # Filtro por si tiene fin o no ('all' no añade filtro)
+    if has_end == 'yes':
+        query += ' AND te.end_time IS NOT NULL'
+    elif has_end == 'no':
+        query += ' AND te.end_time IS NULL'
+
+    # Filtro por estado de tarea
+    if status:
+        query += ' AND t.status = ?'
+        params.append(status)
+
+    direction = 'ASC' if order == 'ASC' else 'DESC'
+    if after is not None:
+        keys = [(column, direction == 'DESC') for column in TIME_ENTRY_KEY]
+        condition, after_params = keyset_condition(keys, after)
+        query += f' AND {condition}'
+        params.extend(after_params)
+
+    query += f' ORDER BY te.start_time {direction}, te.id {direction}'
+
+    return query, params
+
+def time_entries_cursor(entry):
+    """Cursor para continuar el listado de registros tras `entry`"""
+    return encode_cursor('timeentries', [entry['start_time'], entry['id']])
+
+def time_entries_rows(conn, from_date, to_date, user_id=None, has_end=None, status=None,
+                      limit=None, cursor=None):
+    """Cursor SQLite con los registros del listado, sin leerlos todavía
+
+    Los filtros y el cursor se validan aquí (ValueError), antes de empezar
+    a enviar la respuesta.
+    """
+    after = decode_cursor(cursor, 'timeentries') if cursor else None
+    query, params = time_entries_query(from_date, to_date, user_id, has_end, status, after=after)
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(limit)
+    return conn.execute(query, params)
+
+def list_time_entries(conn, from_date, to_date, user_id=None, has_end=None, status=None,
+                      limit=None, cursor=None):
+    """Página del listado de registros: (registros, siguiente cursor)"""
+    check_limit(limit)
+    fetch = limit + 1 if limit is not None else None
+    rows = time_entries_rows(conn, from_date, to_date, user_id, has_end, status, fetch, cursor)
+    entries = [dict(row) for row in rows]
+    if limit is not None and len(entries) > limit:
+        entries = entries[:limit]
+        return entries, time_entries_cursor(entries[-1])
+    return entries, None
+
+def ndjson_pages(connection, from_date, to_date, user_id=None, has_end=None, status=None,
+                 limit=None, cursor=None, page_size=500):
+    """Registros como NDJSON (una línea por registro), leídos por páginas keyset
+
+    `connection()` presta una conexión para cada página, que se lee entera y
+    se devuelve antes de enviarla: un cliente lento nunca retiene conexiones
+    del pool. Cada página es una lectura aparte, como al paginar con cursor.
+    Con `limit`, si quedan más registros la última línea es
+    `{"next_cursor": ...}` para continuar el listado. Los filtros, el límite y
+    el cursor se validan (ValueError) al leer la primera página, antes de
+    empezar a enviar la respuesta.
+    """
+    check_limit(limit)
+
+    def read_page(after, remaining):
+        # Una fila de más tras el límite indica si hay siguiente página
+        size = page_size if remaining is None else min(page_size, remaining + 1)
+        query, params = time_entries_query(from_date, to_date, user_id, has_end, status, after=after)
+        with connection() as conn:
+            return [dict(row) for row in conn.execute(query + ' LIMIT ?', params + [size])], size
+
+    def generate(page, size):
+        sent = 0
+        last = None
+        while page:
+            more = limit is not None and sent + len(page) > limit
+            if more:
+                page = page[:limit - sent]
+            lines = [json.dumps(entry, ensure_ascii=False) for entry in page]
+            if page:
+                sent += len(page)
+                last = page[-1]
+            if more:
+                lines.append(json.dumps({'next_cursor': time_entries_cursor(last)}))
+
+            yield ('\n'.join(lines) + '\n').encode()
+            if more or len(page) < size:
+                return
+            page, size = read_page([last['start_time'], last['id']], None if limit is None else limit - sent)
+
+    after = decode_cursor(cursor, 'timeentries') if cursor else None
+    return generate(*read_page(after, limit))
@@ -0,0 +1,252 @@
+"""
+Métricas de rendimiento en formato de texto de Prometheus
+Latencia, tamaño de respuesta y SQL por ruta, y fases de los informes.
+No depende de la aplicación: los procesos de informes también lo importan.
+"""
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from starlette.datastructures import MutableHeaders
+
+# Cabecera Server-Timing en las respuestas (para ver los tiempos desde el navegador)
+SERVER_TIMING = os.environ.get('TASKFLOW_SERVER_TIMING', '').lower() in ('1', 'true', 'yes')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+REPORT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# ==================== TIPOS ====================
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}')
+        return lines
+
+class Histogram:
+    def __init__(self, name, help, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        names = self.labels + ('le',)
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{self.name}_bucket{_format_labels(names, labels + (_format_value(float(bound)),))} {cumulative}')
+                lines.append(f'{self.name}_sum{_format_labels(self.labels, labels)} {_format_value(total)}')
+                lines.append(f'{self.name}_count{_format_labels(self.labels, labels)} {count}')
+        return lines
+
+class Gauges:
+    """Valores leídos en el momento de la consulta: `read()` -> {nombre: valor}"""
+
+    def __init__(self, prefix, help, read):
+        self.prefix = prefix
+        self.help = help
+        self.read = read
+
+    def render(self):
+        lines = []
+        try:
+            values = self.read()
+        except Exception as e:
+            print(f"⚠️  Métricas {self.prefix}: {e}")
+            return lines
+        for key, value in sorted(values.items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f'{self.prefix}_{key}'
+            lines += [f'# HELP {name} {self.help}: {key}', f'# TYPE {name} gauge', f'{name} {_format_value(value)}']
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+REQUEST_DURATION = registry.register(Histogram(
+    'taskflow_http_request_duration_seconds', 'Duración de las peticiones HTTP',
+    LATENCY_BUCKETS, ('method', 'route', 'status')))
+RESPONSE_SIZE = registry.register(Histogram(
+    'taskflow_http_response_size_bytes', 'Tamaño del cuerpo de las respuestas',
+    SIZE_BUCKETS, ('method', 'route')))
+REQUEST_QUERIES = registry.register(Histogram(
+    'taskflow_http_request_sql_queries', 'Consultas SQL por petición',
+    QUERY_COUNT_BUCKETS, ('method', 'route')))
+REQUEST_SQL_SECONDS = registry.register(Histogram(
+    'taskflow_http_request_sql_seconds', 'Tiempo en SQL por petición (ejecución y lectura de filas)',
+    LATENCY_BUCKETS, ('method', 'route')))
+SQL_QUERIES = registry.register(Counter(
+    'taskflow_sql_queries_total', 'Consultas SQL ejecutadas durante peticiones HTTP'))
+REPORT_PHASES = registry.register(Histogram(
+    'taskflow_report_phase_seconds', 'Duración de cada fase de la generación de informes',
+    REPORT_BUCKETS, ('report', 'phase')))
+
+def process_stats():
+    """Memoria máxima del proceso (solo donde existe el módulo resource)"""
+    try:
+        import resource
+    except ImportError:
+        return {}
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KiB y macOS en bytes
+    return {'max_rss_bytes': max_rss if sys.platform == 'darwin' else max_rss * 1024}
+
+# ==================== MEDICIÓN ====================
+
+class Timings:
+    """Tiempos acumulados en el contexto actual (una petición o un informe)"""
+
+    __slots__ = ('queries', 'sql_seconds', 'phases')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.phases = {}
+
+_current = ContextVar('taskflow_timings', default=None)
+
+def record_sql(seconds, queries=0):
+    """Sumar tiempo de SQL (y consultas nuevas) al contexto actual, si lo hay"""
+    timings = _current.get()
+    if timings is not None:
+        timings.sql_seconds += seconds
+        timings.queries += queries
+
+@contextmanager
+def track():
+    """Acumular en un Timings nuevo lo que se mida dentro del bloque"""
+    timings = Timings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+@contextmanager
+def phase(name):
+    """Medir una fase con nombre dentro del contexto actual"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = _current.get()
+        if timings is not None:
+            timings.phases[name] = timings.phases.get(name, 0.0) + time.perf_counter() - start
+
+def observe_report(name, timings):
+    """Registrar las fases (query, render, save) de un informe generado"""
+    for phase_name, seconds in (timings or {}).items():
+        REPORT_PHASES.observe(seconds, name, phase_name)
+
+# ==================== MIDDLEWARE ====================
+
+def route_label(scope):
+    """Plantilla de la ruta (/api/tasks/{task_id}) para no crear una serie por id"""
+    route = scope.get('route')
+    return getattr(route, 'path', None) or 'unmatched'
+
+def server_timing(timings, total):
+    return (f'app;dur={total * 1000:.1f}, '
+            f'sql;dur={timings.sql_seconds * 1000:.1f};desc="{timings.queries} consultas"')
+
+class MetricsMiddleware:
+    """Middleware ASGI: latencia, tamaño y SQL de cada petición"""
+
+    def __init__(self, app, server_timing_header=None):
+        self.app = app
+        self.server_timing_header = SERVER_TIMING if server_timing_header is None else server_timing_header
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        state = {'status': 500, 'size': 0}
+
+        async def send_with_metrics(message):
+            if message['type'] == 'http.response.start':
+                state['status'] = message['status']
+                if self.server_timing_header:
+                    headers = MutableHeaders(scope=message)
+                    headers.append('Server-Timing', server_timing(timings, time.perf_counter() - start))
+                    headers['Timing-Allow-Origin'] = '*'
+            elif message['type'] == 'http.response.body':
+                state['size'] += len(message.get('body', b''))
+            await send(message)
+
+        with track() as timings:
+            try:
+                await self.app(scope, receive, send_with_metrics)
+            finally:
+                route = route_label(scope)
+                method = scope['method']
+                REQUEST_DURATION.observe(time.perf_counter() - start, method, route, str(state['status']))
+                RESPONSE_SIZE.observe(state['size'], method, route)
+                REQUEST_QUERIES.observe(timings.queries, method, route)
+                REQUEST_SQL_SECONDS.observe(timings.sql_seconds, method, route)
+                SQL_QUERIES.inc(amount=timings.queries)
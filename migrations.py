@@ -0,0 +1,289 @@
+"""
+Migraciones versionadas del esquema
+La versión aplicada se guarda en PRAGMA user_version
+"""
+
+MIGRATIONS = []
+
+def migration(version, description):
+    """Registrar una función como migración `version`"""
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return register
+
+def column_names(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+def apply_migrations(conn):
+    """Aplicar en orden las migraciones pendientes, cada una en su transacción"""
+    version = current_version(conn)
+    applied = []
+
+    for number, description, func in MIGRATIONS:
+        if number <= version:
+            continue
+
+        print(f"🔄 Migración {number}: {description}...")
+        conn.execute('BEGIN')
+        try:
+            func(conn)
+            conn.execute(f'PRAGMA user_version = {int(number)}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"✅ Migración {number} aplicada")
+        applied.append(number)
+
+    return applied
+
+# ==================== MIGRACIONES ====================
+
+@migration(1, 'Esquema inicial')
+def _initial_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            email TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_number INTEGER UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            description TEXT,
+            user_id INTEGER NOT NULL,
+            max_time_minutes INTEGER DEFAULT 0,
+            max_date DATE,
+            status TEXT DEFAULT 'Pendiente',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS annotations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (task_id) REFERENCES tasks(id) ON DELETE CASCADE
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS time_entries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER NOT NULL,
+            start_time TIMESTAMP NOT NULL,
+            end_time TIMESTAMP,
+            duration_minutes INTEGER,
+            comment TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (task_id) REFERENCES tasks(id) ON DELETE CASCADE
+        )
+    ''')
+
+@migration(2, "Campo 'status' en tasks")
+def _task_status(conn):
+    if 'status' not in column_names(conn, 'tasks'):
+        conn.execute("ALTER TABLE tasks ADD COLUMN status TEXT DEFAULT 'Pendiente'")
+        conn.execute("UPDATE tasks SET status = 'Pendiente' WHERE status IS NULL")
+
+@migration(3, "Campo 'comment' en time_entries")
+def _time_entry_comment(conn):
+    if 'comment' not in column_names(conn, 'time_entries'):
+        conn.execute('ALTER TABLE time_entries ADD COLUMN comment TEXT')
+
+@migration(4, 'Índices secundarios para informes y listados')
+def _secondary_indexes(conn):
+    # Registros de una tarea ordenados por inicio (detalle de tarea e informes por tarea)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_time_entries_task_start ON time_entries(task_id, start_time)')
+    # Filtros por rango de fechas de inicio
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_time_entries_start ON time_entries(start_time)')
+    # Registros abiertos (sin fin): índice parcial, solo contiene los temporizadores en marcha
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_time_entries_open ON time_entries(task_id) WHERE end_time IS NULL')
+    # Filtros de informes por usuario y estado
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_user_status ON tasks(user_id, status)')
+    # Informes por fecha de creación
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks(created_at)')
+    # Anotaciones de una tarea ordenadas por fecha
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_annotations_task ON annotations(task_id, created_at)')
+    conn.execute('ANALYZE')
+
+@migration(5, 'Índices para ordenar el listado de tareas')
+def _task_sort_indexes(conn):
+    # Orden por nombre sin distinguir mayúsculas (el id de fila desempata)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_name ON tasks(name COLLATE NOCASE)')
+    # Orden por fecha límite con las tareas sin fecha al final
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_due ON tasks(max_date IS NULL, max_date)')
+    conn.execute('ANALYZE')
+
+@migration(6, 'Resumen diario de tiempos por tarea')
+def _time_rollup(conn):
+    # Minutos, registros y registros abiertos por tarea y día de inicio.
+    # Lo mantienen los triggers de time_entries, así que todas las rutas de
+    # escritura (altas, ediciones y borrados) lo actualizan sin código extra.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS time_rollup_daily (
+            task_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            minutes INTEGER NOT NULL DEFAULT 0,
+            entries INTEGER NOT NULL DEFAULT 0,
+            open_entries INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (task_id, day)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_time_rollup_day ON time_rollup_daily(day)')
+
+    add_new = '''
+        INSERT INTO time_rollup_daily (task_id, day, minutes, entries, open_entries)
+        VALUES (NEW.task_id, substr(NEW.start_time, 1, 10), COALESCE(NEW.duration_minutes, 0), 1,
+                NEW.end_time IS NULL)
+        ON CONFLICT (task_id, day) DO UPDATE SET
+            minutes = minutes + excluded.minutes,
+            entries = entries + 1,
+            open_entries = open_entries + excluded.open_entries;
+    '''
+    remove_old = '''
+        UPDATE time_rollup_daily SET
+            minutes = minutes - COALESCE(OLD.duration_minutes, 0),
+            entries = entries - 1,
+            open_entries = open_entries - (OLD.end_time IS NULL)
+        WHERE task_id = OLD.task_id AND day = substr(OLD.start_time, 1, 10);
+        DELETE FROM time_rollup_daily
+        WHERE task_id = OLD.task_id AND day = substr(OLD.start_time, 1, 10) AND entries <= 0;
+    '''
+    conn.execute(f'CREATE TRIGGER IF NOT EXISTS trg_time_rollup_insert AFTER INSERT ON time_entries BEGIN {add_new} END')
+    conn.execute(f'CREATE TRIGGER IF NOT EXISTS trg_time_rollup_delete AFTER DELETE ON time_entries BEGIN {remove_old} END')
+    conn.execute(
+        'CREATE TRIGGER IF NOT EXISTS trg_time_rollup_update '
+        'AFTER UPDATE OF task_id, start_time, end_time, duration_minutes ON time_entries '
+        f'BEGIN {remove_old} {add_new} END'
+    )
+
+    # Carga inicial con los registros existentes
+    conn.execute('DELETE FROM time_rollup_daily')
+    conn.execute('''
+        INSERT INTO time_rollup_daily (task_id, day, minutes, entries, open_entries)
+        SELECT task_id, substr(start_time, 1, 10), COALESCE(SUM(duration_minutes), 0), COUNT(*),
+               SUM(end_time IS NULL)
+        FROM time_entries
+        GROUP BY task_id, substr(start_time, 1, 10)
+    ''')
+
+# Tablas con contador de versión (data_versions)
+VERSIONED_TABLES = ('users', 'tasks', 'annotations', 'time_entries')
+
+@migration(7, 'Versión de datos por tabla')
+def _data_versions(conn):
+    # Cada escritura en una tabla incrementa su versión: sirve para saber si
+    # un resultado calculado antes (informe en caché, respuesta) sigue siendo válido
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    for table in VERSIONED_TABLES:
+        conn.execute('INSERT OR IGNORE INTO data_versions (table_name, version) VALUES (?, 0)', (table,))
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{event.lower()}
+                AFTER {event} ON {table} BEGIN
+                    UPDATE data_versions SET version = version + 1 WHERE table_name = '{table}';
+                END
+            ''')
+
+@migration(8, 'Seguimiento de cambios para sincronización')
+def _sync_tracking(conn):
+    # Reloj global de cambios: cada alta, modificación o borrado lo incrementa
+    # y la fila guarda el valor (sync_version); los borrados dejan una lápida
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sync_clock (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('INSERT OR IGNORE INTO sync_clock (id, version) VALUES (1, 0)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tombstones (
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            sync_version INTEGER NOT NULL,
+            deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (table_name, row_id)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tombstones_sync ON tombstones(sync_version)')
+
+    tick = 'UPDATE sync_clock SET version = version + 1 WHERE id = 1;'
+    for table in VERSIONED_TABLES:
+        columns = column_names(conn, table)
+        if 'updated_at' not in columns:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN updated_at TIMESTAMP')
+        if 'sync_version' not in columns:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN sync_version INTEGER NOT NULL DEFAULT 0')
+        # Las filas existentes entran en la primera sincronización (since=0), cada
+        # una con su propia versión para que la paginación pueda cortar en cualquiera
+        conn.execute(f'''
+            UPDATE {table} SET updated_at = COALESCE(updated_at, created_at),
+                sync_version = id + (SELECT version FROM sync_clock WHERE id = 1)
+        ''')
+        conn.execute(f'UPDATE sync_clock SET version = version + (SELECT COALESCE(MAX(id), 0) FROM {table})')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_sync ON {table}(sync_version)')
+
+        # La versión de datos (migración 7) no debe contar dos veces cada escritura
+        conn.execute(f'DROP TRIGGER IF EXISTS trg_{table}_version_update')
+        conn.execute(f'''
+            CREATE TRIGGER trg_{table}_version_update AFTER UPDATE ON {table}
+            WHEN NEW.sync_version = OLD.sync_version BEGIN
+                UPDATE data_versions SET version = version + 1 WHERE table_name = '{table}';
+            END
+        ''')
+
+        stamp = f'''
+            UPDATE {table} SET updated_at = CURRENT_TIMESTAMP,
+                sync_version = (SELECT version FROM sync_clock WHERE id = 1)
+            WHERE id = NEW.id;
+        '''
+        conn.execute(f'CREATE TRIGGER IF NOT EXISTS trg_{table}_sync_insert AFTER INSERT ON {table} BEGIN {tick} {stamp} END')
+        # La condición evita reaccionar a la propia actualización de sync_version
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_sync_update AFTER UPDATE ON {table}
+            WHEN NEW.sync_version = OLD.sync_version BEGIN {tick} {stamp} END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_sync_delete AFTER DELETE ON {table} BEGIN
+                {tick}
+                INSERT OR REPLACE INTO tombstones (table_name, row_id, sync_version)
+                VALUES ('{table}', OLD.id, (SELECT version FROM sync_clock WHERE id = 1));
+            END
+        ''')
+
+@migration(9, 'Secuencia de números de tarea')
+def _task_sequence(conn):
+    # Siguiente número de tarea: se reserva con un único UPDATE ... RETURNING
+    # dentro de la transacción de escritura (ver operations.reserve_task_numbers)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS task_sequence (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            next_number INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        INSERT OR IGNORE INTO task_sequence (id, next_number)
+        SELECT 1, COALESCE(MAX(task_number), 0) + 1 FROM tasks
+    ''')
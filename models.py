@@ -0,0 +1,58 @@
+"""
+Modelos pydantic de las peticiones de la API
+"""
+
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+class UserCreate(BaseModel):
+    name: str
+    email: Optional[str] = None
+
+class TaskCreate(BaseModel):
+    name: str
+    description: Optional[str] = None
+    user_id: int
+    max_time_minutes: Optional[int] = 0
+    max_date: Optional[str] = None
+    status: Optional[str] = "Pendiente"
+
+class TaskUpdate(BaseModel):
+    name: str
+    description: Optional[str] = None
+    user_id: int
+    max_time_minutes: Optional[int] = 0
+    max_date: Optional[str] = None
+    status: Optional[str] = "Pendiente"
+
+class AnnotationCreate(BaseModel):
+    text: str
+
+class AnnotationUpdate(BaseModel):
+    text: str
+
+class TimeEntryCreate(BaseModel):
+    start_time: str
+    end_time: Optional[str] = None
+    comment: Optional[str] = None
+
+class TimeEntryUpdate(BaseModel):
+    start_time: str
+    end_time: Optional[str] = None
+    comment: Optional[str] = None
+
+class BatchOperation(BaseModel):
+    op: str                     # create, update, delete
+    entity: str                 # user, task, annotation, time_entry
+    id: Optional[int] = None    # obligatorio en update y delete
+    task_id: Optional[int] = None   # obligatorio al crear anotaciones y registros
+    data: dict = {}
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+
+class ReportJobCreate(BaseModel):
+    report: str                 # tasks, date, pending, timeentries, export
+    format: str = 'excel'       # excel, pdf, csv, json
+    params: dict = {}
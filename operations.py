@@ -0,0 +1,286 @@
+"""
+Operaciones de escritura compartidas por los endpoints y la API por lotes
+No confirman la transacción: lo hace quien las llama
+"""
+
+import itertools
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime
+
+def calculate_duration(start_time, end_time):
+    """Calcular duración en minutos entre dos fechas"""
+    if not end_time:
+        return None
+
+    start = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
+    end = datetime.fromisoformat(end_time.replace('Z', '+00:00'))
+    duration = (end - start).total_seconds() / 60
+    return int(duration)
+
+# ==================== SQL ====================
+
+INSERT_USER = 'INSERT INTO users (name, email) VALUES (?, ?) RETURNING id'
+DELETE_USER = 'DELETE FROM users WHERE id = ?'
+
+# Reserva atómica de `?` números consecutivos; devuelve el primero. Nunca baja
+# del máximo existente, por si se insertaron tareas con número explícito.
+RESERVE_TASK_NUMBERS = '''
+    UPDATE task_sequence
+    SET next_number = MAX(next_number, (SELECT COALESCE(MAX(task_number), 0) + 1 FROM tasks)) + ?
+    WHERE id = 1
+    RETURNING next_number - ?
+'''
+INSERT_TASK = '''
+    INSERT INTO tasks (task_number, name, description, user_id, max_time_minutes, max_date, status)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    RETURNING id
+'''
+UPDATE_TASK = '''
+    UPDATE tasks
+    SET name = ?, description = ?, user_id = ?, max_time_minutes = ?, max_date = ?, status = ?
+    WHERE id = ?
+'''
+DELETE_TASK = 'DELETE FROM tasks WHERE id = ?'
+
+INSERT_ANNOTATION = 'INSERT INTO annotations (task_id, text) VALUES (?, ?) RETURNING id'
+UPDATE_ANNOTATION = 'UPDATE annotations SET text = ? WHERE id = ?'
+DELETE_ANNOTATION = 'DELETE FROM annotations WHERE id = ?'
+
+INSERT_TIME_ENTRIES = '''
+    INSERT INTO time_entries (task_id, start_time, end_time, duration_minutes, comment)
+    VALUES (?, ?, ?, ?, ?)
+'''
+INSERT_TIME_ENTRY = INSERT_TIME_ENTRIES + 'RETURNING id'
+UPDATE_TIME_ENTRY = 'UPDATE time_entries SET start_time = ?, end_time = ?, duration_minutes = ?, comment = ? WHERE id = ?'
+DELETE_TIME_ENTRY = 'DELETE FROM time_entries WHERE id = ?'
+
+TABLES = {'user': 'users', 'task': 'tasks', 'annotation': 'annotations', 'time_entry': 'time_entries'}
+
+PARENT_TASK = {
+    'annotation': 'SELECT task_id FROM annotations WHERE id = ?',
+    'time_entry': 'SELECT task_id FROM time_entries WHERE id = ?',
+}
+
+def parent_task_id(conn, entity, entity_id):
+    """Tarea de una anotación o registro (None si no existe)"""
+    row = conn.execute(PARENT_TASK[entity], (entity_id,)).fetchone()
+    return row[0] if row else None
+
+def _insert(conn, sql, params):
+    """INSERT ... RETURNING: se leen todas las filas para cerrar la sentencia"""
+    return conn.execute(sql, params).fetchall()[0]
+
+def _execute(conn, statement):
+    sql, params, result = statement
+    conn.execute(sql, params)
+    return result
+
+# Las actualizaciones y borrados se describen como (sql, parámetros, resultado)
+# para poder agruparlos con executemany en la API por lotes
+
+# ==================== USUARIOS ====================
+
+def create_user(conn, user):
+    user_id = _insert(conn, INSERT_USER, (user.name, user.email))[0]
+    return {'id': user_id, 'message': 'Usuario creado'}
+
+def delete_user_statement(user_id, _=None):
+    return DELETE_USER, (user_id,), {'message': 'Usuario eliminado'}
+
+def delete_user(conn, user_id):
+    return _execute(conn, delete_user_statement(user_id))
+
+# ==================== TAREAS ====================
+
+def task_params(task):
+    return (task.name, task.description, task.user_id, task.max_time_minutes, task.max_date, task.status)
+
+def reserve_task_numbers(conn, count=1):
+    """Reservar `count` números de tarea consecutivos y devolver el primero
+
+    La fila de la secuencia queda bloqueada hasta el commit de la transacción
+    de escritura, así que dos altas concurrentes nunca reciben el mismo número;
+    si la transacción se deshace, los números vuelven a quedar libres.
+    """
+    return conn.execute(RESERVE_TASK_NUMBERS, (count, count)).fetchone()[0]
+
+def create_task(conn, task, task_number=None):
+    """Crear la tarea con `task_number` (ya reservado) o con el siguiente libre"""
+    if task_number is None:
+        task_number = reserve_task_numbers(conn)
+    task_id = _insert(conn, INSERT_TASK, (task_number,) + task_params(task))[0]
+    return {'id': task_id, 'task_number': task_number, 'message': 'Tarea creada'}
+
+def update_task_statement(task_id, task):
+    return UPDATE_TASK, task_params(task) + (task_id,), {'id': task_id, 'message': 'Tarea actualizada'}
+
+def update_task(conn, task_id, task):
+    return _execute(conn, update_task_statement(task_id, task))
+
+def delete_task_statement(task_id, _=None):
+    return DELETE_TASK, (task_id,), {'message': 'Tarea eliminada'}
+
+def delete_task(conn, task_id):
+    return _execute(conn, delete_task_statement(task_id))
+
+# ==================== ANOTACIONES ====================
+
+def create_annotation(conn, task_id, annotation):
+    annotation_id = _insert(conn, INSERT_ANNOTATION, (task_id, annotation.text))[0]
+    return {'id': annotation_id, 'message': 'Anotación creada'}
+
+def update_annotation_statement(annotation_id, annotation):
+    return UPDATE_ANNOTATION, (annotation.text, annotation_id), {'id': annotation_id, 'message': 'Anotación actualizada'}
+
+def update_annotation(conn, annotation_id, annotation):
+    return _execute(conn, update_annotation_statement(annotation_id, annotation))
+
+def delete_annotation_statement(annotation_id, _=None):
+    return DELETE_ANNOTATION, (annotation_id,), {'message': 'Anotación eliminada'}
+
+def delete_annotation(conn, annotation_id):
+    return _execute(conn, delete_annotation_statement(annotation_id))
+
+# ==================== REGISTROS DE TIEMPO ====================
+
+def create_time_entry(conn, task_id, time_entry):
+    duration = calculate_duration(time_entry.start_time, time_entry.end_time)
+    entry_id = _insert(
+        conn, INSERT_TIME_ENTRY,
+        (task_id, time_entry.start_time, time_entry.end_time, duration, time_entry.comment)
+    )[0]
+    return {'id': entry_id, 'message': 'Registro creado', 'duration_minutes': duration}
+
+def update_time_entry_statement(time_id, time_entry):
+    """ValueError si el fin es anterior al inicio"""
+    duration = calculate_duration(time_entry.start_time, time_entry.end_time)
+    if duration is not None and duration < 0:
+        raise ValueError('La fecha de fin debe ser posterior a la de inicio')
+    return (
+        UPDATE_TIME_ENTRY,
+        (time_entry.start_time, time_entry.end_time, duration, time_entry.comment, time_id),
+        {'id': time_id, 'message': 'Registro actualizado', 'duration_minutes': duration}
+    )
+
+def update_time_entry(conn, time_id, time_entry):
+    return _execute(conn, update_time_entry_statement(time_id, time_entry))
+
+def delete_time_entry_statement(time_id, _=None):
+    return DELETE_TIME_ENTRY, (time_id,), {'message': 'Registro eliminado'}
+
+def delete_time_entry(conn, time_id):
+    return _execute(conn, delete_time_entry_statement(time_id))
+
+# ==================== LOTES ====================
+
+# Operaciones por lote como máximo
+MAX_BATCH_OPERATIONS = 1000
+
+class BatchError(Exception):
+    """Operación del lote que ha fallado; el lote entero se deshace"""
+
+    def __init__(self, index, message):
+        super().__init__(message)
+        self.index = index
+
+@dataclass
+class BatchItem:
+    entity: str         # user, task, annotation, time_entry
+    action: str         # create, update, delete
+    target: int = None  # id a modificar o, al crear anotaciones y registros, id de la tarea
+    data: object = None # modelo pydantic ya validado
+    changed: bool = True  # False si la actualización o el borrado no encontró su fila
+
+CREATORS = {
+    'user': lambda conn, item: create_user(conn, item.data),
+    'annotation': lambda conn, item: create_annotation(conn, item.target, item.data),
+    'time_entry': lambda conn, item: create_time_entry(conn, item.target, item.data),
+}
+
+STATEMENTS = {
+    ('user', 'delete'): delete_user_statement,
+    ('task', 'update'): update_task_statement,
+    ('task', 'delete'): delete_task_statement,
+    ('annotation', 'update'): update_annotation_statement,
+    ('annotation', 'delete'): delete_annotation_statement,
+    ('time_entry', 'update'): update_time_entry_statement,
+    ('time_entry', 'delete'): delete_time_entry_statement,
+}
+
+def _mark_missing(conn, key, group):
+    """changed = False en las operaciones cuya fila no existe (o ya borró el mismo grupo)"""
+    entity, action = key
+    targets = [item.target for item in group]
+    existing = {row[0] for row in conn.execute(
+        f"SELECT id FROM {TABLES[entity]} WHERE id IN ({', '.join('?' * len(targets))})", targets
+    )}
+    for item in group:
+        item.changed = item.target in existing
+        if action == 'delete':
+            existing.discard(item.target)
+
+def _execute_group(conn, sql, rows, index):
+    """executemany de un grupo; si falla, lo repite fila a fila para saber cuál"""
+    # Fuera de una transacción RELEASE confirmaría el grupo
+    if not conn.in_transaction:
+        conn.execute('BEGIN')
+    conn.execute('SAVEPOINT batch_group')
+    try:
+        conn.executemany(sql, rows)
+    except sqlite3.Error as e:
+        conn.execute('ROLLBACK TO batch_group')
+        error = BatchError(index, str(e))
+        for offset, params in enumerate(rows):
+            try:
+                conn.execute(sql, params)
+            except sqlite3.Error as e:
+                error = BatchError(index + offset, str(e))
+                break
+        conn.execute('ROLLBACK TO batch_group')
+        raise error
+    finally:
+        conn.execute('RELEASE batch_group')
+
+def run_batch(conn, items):
+    """Ejecutar las operaciones en orden dentro de la transacción actual
+
+    Las actualizaciones y borrados consecutivos del mismo tipo se envían con
+    un único executemany; antes se anota en cada una si su fila existe
+    (changed), para no publicar cambios que no han ocurrido. Devuelve un
+    resultado por operación; ante el primer error lanza BatchError y no
+    confirma nada (lo deshace quien llama).
+    """
+    results = []
+    index = 0
+    for key, group in itertools.groupby(items, key=lambda item: (item.entity, item.action)):
+        group = list(group)
+        try:
+            if key in STATEMENTS:
+                statements = []
+                for offset, item in enumerate(group):
+                    try:
+                        statements.append(STATEMENTS[key](item.target, item.data))
+                    except ValueError as e:
+                        raise BatchError(index + offset, str(e))
+                _mark_missing(conn, key, group)
+                _execute_group(conn, statements[0][0], [params for _, params, _ in statements], index)
+                results.extend(result for _, _, result in statements)
+            elif key == ('task', 'create'):
+                # Un solo bloque de números para las altas de tareas consecutivas
+                first = reserve_task_numbers(conn, len(group))
+                for offset, item in enumerate(group):
+                    try:
+                        results.append(create_task(conn, item.data, first + offset))
+                    except (ValueError, sqlite3.Error) as e:
+                        raise BatchError(index + offset, str(e))
+            else:
+                for offset, item in enumerate(group):
+                    try:
+                        results.append(CREATORS[item.entity](conn, item))
+                    except (ValueError, sqlite3.Error) as e:
+                        raise BatchError(index + offset, str(e))
+        except sqlite3.Error as e:
+            raise BatchError(index, str(e))
+        index += len(group)
+    return results
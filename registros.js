@@ -71,17 +71,43 @@ async function loadTimeEntries() {
         if (hasEnd !== 'all') url += `&has_end=${hasEnd}`;
         if (status) url += `&status=${encodeURIComponent(status)}`;
         
-        const response = await fetch(url);
+        // NDJSON: las tarjetas se pintan según llegan los registros
+        const response = await fetch(url, { headers: { 'Accept': 'application/x-ndjson' } });
         
         if (!response.ok) {
             throw new Error('Error al cargar registros');
         }
         
-        const entries = await response.json();
+        let count = 0;
+        let totalMinutes = 0;
+        const countLabel = document.getElementById('entriesCount');
         
-        document.getElementById('entriesCount').textContent = `${entries.length} registro${entries.length !== 1 ? 's' : ''}`;
+        await readNdjson(response, entry => {
+            const entryCard = createEntryCard(entry);
+            container.appendChild(entryCard);
+            count++;
+            
+            // Calcular duración
+            let duration = entry.duration_minutes;
+            if (!duration && entry.start_time) {
+                const startDt = new Date(entry.start_time);
+                const endOfDay = new Date(startDt);
+                endOfDay.setHours(20, 0, 0, 0);
+                duration = Math.floor((endOfDay - startDt) / 60000);
+            }
+            if (duration) {
+                totalMinutes += duration;
+            }
+            
+            if (count === 1) {
+                loading.style.display = 'none';
+            }
+            countLabel.textContent = `${count} registro${count !== 1 ? 's' : ''}`;
+        });
         
-        if (entries.length === 0) {
+        countLabel.textContent = `${count} registro${count !== 1 ? 's' : ''}`;
+        
+        if (count === 0) {
             container.innerHTML = `
                 <div class="empty-state">
                     <div class="empty-state-icon">📭</div>
@@ -90,25 +116,6 @@ async function loadTimeEntries() {
                 </div>
             `;
         } else {
-            let totalMinutes = 0;
-            
-            entries.forEach(entry => {
-                const entryCard = createEntryCard(entry);
-                container.appendChild(entryCard);
-                
-                // Calcular duración
-                let duration = entry.duration_minutes;
-                if (!duration && entry.start_time) {
-                    const startDt = new Date(entry.start_time);
-                    const endOfDay = new Date(startDt);
-                    endOfDay.setHours(20, 0, 0, 0);
-                    duration = Math.floor((endOfDay - startDt) / 60000);
-                }
-                if (duration) {
-                    totalMinutes += duration;
-                }
-            });
-            
             // Mostrar totales
             document.getElementById('totalMinutes').textContent = totalMinutes;
             document.getElementById('totalHours').textContent = (totalMinutes / 60).toFixed(2);
@@ -129,6 +136,30 @@ async function loadTimeEntries() {
     }
 }
 
+// Leer una respuesta NDJSON línea a línea, llamando a onEntry con cada registro
+async function readNdjson(response, onEntry) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    const handleLine = line => {
+        if (!line.trim()) return;
+        const item = JSON.parse(line);
+        // La línea de cursor solo aparece en listados paginados
+        if (!('next_cursor' in item)) onEntry(item);
+    };
+    
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.forEach(handleLine);
+    }
+    handleLine(buffer + decoder.decode());
+}
+
 // ==================== CREAR TARJETA DE REGISTRO ====================
 
 function createEntryCard(entry) {
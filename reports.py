@@ -0,0 +1,1451 @@
+"""
+Generación de informes
+Cada informe se construye en tres pasos: la especificación declara filtros,
+consulta y presentación; el dataset carga las filas (agrupadas por tarea o en
+streaming) y el renderizador escribe el fichero en Excel, PDF, CSV o JSON.
+Se ejecuta en procesos trabajadores: no debe importar la aplicación FastAPI
+"""
+
+import csv
+import functools
+import itertools
+import json
+import os
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field as dataclass_field
+from datetime import datetime
+from typing import Callable, Optional
+
+import metrics
+from database import get_pool, date_range
+from executor import REPORT_WORKERS
+from fragment_cache import fragment_cache
+from listings import time_entries_query
+
+XLSX_MEDIA_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+PDF_MEDIA_TYPE = 'application/pdf'
+CSV_MEDIA_TYPE = 'text/csv'
+JSON_MEDIA_TYPE = 'application/json'
+
+# Tareas por consulta `task_id IN (...)` (por debajo del límite de 999 parámetros de SQLite)
+IN_BATCH_SIZE = 500
+
+class EmptyReportError(Exception):
+    """No hay datos que cumplan los filtros del informe"""
+
+class ReportParamsError(ValueError):
+    """Informe, formato o parámetros no válidos (error del cliente)"""
+
+@dataclass
+class ReportFile:
+    """Fichero generado listo para enviarse al cliente"""
+    path: str
+    filename: str
+    media_type: str
+    # Segundos por fase (query, render, save), para las métricas del proceso principal
+    timings: dict = None
+
+def build_report(name, params):
+    """Punto de entrada para los procesos trabajadores: genera el informe `name`
+
+    El tiempo en SQL cuenta como `query`, el guardado del fichero como `save`
+    y el resto como `render`.
+    """
+    start = time.perf_counter()
+    with metrics.track() as timings:
+        with get_pool().connection() as conn:
+            report = run_report(conn, name, **params)
+    total = time.perf_counter() - start
+    save = timings.phases.get('save', 0.0)
+    report.timings = {
+        'query': timings.sql_seconds,
+        'render': max(total - timings.sql_seconds - save, 0.0),
+        'save': save,
+    }
+    return report
+
+# ==================== CONSULTAS ====================
+
+def tasks_query(condition, params, user_id=None, status=None, order_by='t.task_number'):
+    """Consulta de tareas con su usuario, filtro base `condition` y filtros opcionales"""
+    query = f'''
+        SELECT t.*, u.name as user_name
+        FROM tasks t
+        LEFT JOIN users u ON t.user_id = u.id
+        WHERE {condition}
+    '''
+    params = list(params)
+
+    if user_id:
+        query += ' AND t.user_id = ?'
+        params.append(int(user_id))
+
+    if status:
+        query += ' AND t.status = ?'
+        params.append(status)
+
+    query += f' ORDER BY {order_by}'
+
+    return query, params
+
+def load_task_entries(conn, task_ids):
+    """Registros de tiempo de varias tareas agrupados por tarea
+
+    Una consulta por lote de IN_BATCH_SIZE tareas en lugar de una por tarea.
+    """
+    entries = {task_id: [] for task_id in task_ids}
+    for i in range(0, len(task_ids), IN_BATCH_SIZE):
+        batch = task_ids[i:i + IN_BATCH_SIZE]
+        placeholders = ','.join('?' * len(batch))
+        rows = conn.execute(f'''
+            SELECT * FROM time_entries
+            WHERE task_id IN ({placeholders})
+            ORDER BY task_id, start_time
+        ''', batch)
+        for row in rows:
+            entries[row['task_id']].append(dict(row))
+    return entries
+
+def iter_tasks_with_entries(conn, query, params):
+    """Tareas de la consulta junto a sus registros, en streaming
+
+    Las tareas se leen del cursor de IN_BATCH_SIZE en IN_BATCH_SIZE y cada
+    lote trae sus registros con una sola consulta: en memoria solo hay un lote.
+    """
+    cursor = conn.execute(query, params)
+    while True:
+        tasks = [dict(task) for task in cursor.fetchmany(IN_BATCH_SIZE)]
+        if not tasks:
+            return
+        entries = load_task_entries(conn, [task['id'] for task in tasks])
+        for task in tasks:
+            yield task, entries[task['id']]
+
+def iter_task_totals(conn, query, params):
+    """Registros y minutos de cada tarea de la consulta, en el mismo orden
+
+    Los totales salen del resumen diario (time_rollup_daily) sin leer los
+    registros.
+    """
+    return conn.execute(f'''
+        SELECT q.task_number, q.name, q.user_name, q.status, q.max_time_minutes,
+               (SELECT COALESCE(SUM(r.entries), 0) FROM time_rollup_daily r WHERE r.task_id = q.id) AS entries,
+               (SELECT COALESCE(SUM(r.minutes), 0) FROM time_rollup_daily r WHERE r.task_id = q.id) AS minutes
+        FROM ({query}) q
+    ''', params)
+
+def load_tasks_with_entries(conn, query, params):
+    """Tareas de la consulta junto a sus registros: lista de (tarea, registros)"""
+    return list(iter_tasks_with_entries(conn, query, params))
+
+# ==================== ESPECIFICACIONES ====================
+
+# Campos de la tarea que pueden mostrarse bajo su título: (etiqueta, formato, obligatorio)
+TASK_INFO = {
+    'user_name': ('Asignado a', '{}', True),
+    'status': ('Estado', '{}', True),
+    'created_at': ('Creada', '{}', True),
+    'max_time_minutes': ('Tiempo máximo', '{} minutos', True),
+    'max_date': ('Fecha límite', '{}', False),
+    'description': ('Descripción', '{}', False),
+}
+
+@dataclass(frozen=True)
+class Column:
+    """Columna de un listado de registros
+
+    `value` da el valor de la celda en Excel y CSV y `pdf_value` el texto
+    (recortado) en PDF; ambas reciben una `EntryRow`. La columna con
+    `total_format` es la que se suma en la fila de total.
+    """
+    header: str
+    width: float
+    value: Callable
+    pdf_header: str
+    pdf_width: float
+    pdf_value: Callable
+    open_end: bool = False
+    total_format: Optional[str] = None
+
+@dataclass(frozen=True)
+class EntryLayout:
+    """Presentación de un listado de registros en Excel y PDF"""
+    sheet: str
+    columns: tuple
+    total_styles: tuple
+    pdf_font_sizes: tuple        # cabecera, filas, total (None: como las filas)
+    pdf_open_bold: bool
+    note: str
+    note_size: int
+
+@dataclass(frozen=True)
+class ReportSpec:
+    """Declaración de un informe: filtros, consulta y presentación
+
+    Los informes de tareas (`info`) agrupan los registros por tarea; los de
+    registros (`layout`) son un listado plano. `query`, `filename` y
+    `subtitle` reciben el dict de filtros; `subtitle` además la primera fila.
+    """
+    title: str
+    required: tuple
+    optional: tuple
+    query: Callable
+    empty_message: str
+    filename: Callable
+    subtitle: Optional[Callable] = None
+    info: tuple = ()
+    no_entries: str = 'No hay registros de tiempo.'
+    layout: Optional[EntryLayout] = None
+
+    @property
+    def shape(self):
+        return 'entries' if self.layout else 'tasks'
+
+def filter_suffix(filters):
+    """Sufijo del nombre de fichero con los filtros opcionales aplicados"""
+    suffix = f"_usuario{filters['user_id']}" if filters.get('user_id') else ''
+    if filters.get('has_end') == 'yes':
+        suffix += '_finalizados'
+    elif filters.get('has_end') == 'no':
+        suffix += '_sinFinalizar'
+    if filters.get('status'):
+        suffix += f"_estado{filters['status'].replace(' ', '')}"
+    return suffix
+
+def export_filter_info(filters, first):
+    """Filtros aplicados en la cabecera de la exportación de registros"""
+    info = f"Periodo: {filters['from_date']} a {filters['to_date']}"
+    if filters.get('user_id'):
+        info += f" | Usuario: {first.entry['user_name']}"
+    if filters.get('has_end') == 'yes':
+        info += " | Con fecha fin"
+    elif filters.get('has_end') == 'no':
+        info += " | Sin fecha fin"
+    if filters.get('status'):
+        info += f" | Estado: {filters['status']}"
+    return info
+
+def _task_label(row, length=None):
+    return f"#{row.entry['task_number']}: {row.entry['task_name'][:length]}"
+
+def _text(value, length):
+    return value[:length] if value else '-'
+
+TIMEENTRIES_LAYOUT = EntryLayout(
+    sheet='Registros de Tiempo',
+    columns=(
+        Column('Fecha/Hora Inicio', 20, lambda r: r.entry['start_time'],
+               'Inicio', 1.3, lambda r: r.entry['start_time']),
+        Column('Fecha/Hora Fin', 22, lambda r: r.end,
+               'Fin', 1.4, lambda r: r.end, open_end=True),
+        Column('Duración (min)', 15, lambda r: r.duration or 0,
+               'Duración', 0.8, lambda r: f'{r.duration} min' if r.duration else '-', total_format='{} min'),
+        Column('Tarea', 35, _task_label,
+               'Tarea', 2, lambda r: _task_label(r, 30)),
+        Column('Usuario', 20, lambda r: r.entry['user_name'],
+               'Usuario', 1.2, lambda r: _text(r.entry['user_name'], 15)),
+        Column('Comentario', 40, lambda r: r.entry['comment'] or '-',
+               'Comentario', 2, lambda r: _text(r.entry['comment'], 35)),
+    ),
+    total_styles=('total_label', 'total_value'),
+    pdf_font_sizes=(10, 8, 11),
+    pdf_open_bold=True,
+    note='* Registros sin hora de fin: se calcula duración hasta las 20:00 del mismo día',
+    note_size=9,
+)
+
+EXPORT_LAYOUT = EntryLayout(
+    sheet='Registros',
+    columns=(
+        Column('ID', 8, lambda r: r.entry['id'],
+               'ID', 0.4, lambda r: str(r.entry['id'])),
+        Column('Inicio', 20, lambda r: r.entry['start_time'],
+               'Inicio', 1.3, lambda r: r.entry['start_time']),
+        Column('Fin', 22, lambda r: r.end,
+               'Fin', 1.4, lambda r: r.end, open_end=True),
+        Column('Duración', 12, lambda r: r.duration or 0,
+               'Dur', 0.6, lambda r: f'{r.duration}m' if r.duration else '-', total_format='{}m'),
+        Column('Tarea', 35, _task_label,
+               'Tarea', 2, lambda r: _task_label(r, 25)),
+        Column('Estado', 15, lambda r: r.entry['task_status'],
+               'Estado', 0.9, lambda r: r.entry['task_status'][:10]),
+        Column('Usuario', 20, lambda r: r.entry['user_name'],
+               'Usuario', 1, lambda r: _text(r.entry['user_name'], 12)),
+        Column('Comentario', 40, lambda r: r.entry['comment'] or '-',
+               'Comentario', 1.8, lambda r: _text(r.entry['comment'], 30)),
+    ),
+    total_styles=('bold', 'total_highlight'),
+    pdf_font_sizes=(9, 7, None),
+    pdf_open_bold=False,
+    note='* Registros sin hora de fin: duración calculada hasta 20:00',
+    note_size=8,
+)
+
+SPECS = {
+    'tasks': ReportSpec(
+        title='INFORME DE TAREAS',
+        required=('from_task', 'to_task'),
+        optional=('user_id', 'status'),
+        query=lambda f: tasks_query('t.task_number BETWEEN ? AND ?', [f['from_task'], f['to_task']],
+                                    f.get('user_id'), f.get('status')),
+        empty_message='No se encontraron tareas en ese rango',
+        filename=lambda f: f"informe_tareas_{f['from_task']}-{f['to_task']}{filter_suffix(f)}",
+        subtitle=lambda f, first: f"Tareas #{f['from_task']} a #{f['to_task']}",
+        info=('user_name', 'status', 'max_time_minutes', 'max_date', 'description'),
+        no_entries='No hay registros de tiempo para esta tarea.',
+    ),
+    'date': ReportSpec(
+        title='INFORME DE TAREAS POR FECHAS',
+        required=('from_date', 'to_date'),
+        optional=('user_id', 'status'),
+        query=lambda f: tasks_query('t.created_at >= ? AND t.created_at < ?',
+                                    list(date_range(f['from_date'], f['to_date'])),
+                                    f.get('user_id'), f.get('status'), order_by='t.created_at'),
+        empty_message='No se encontraron tareas en ese rango de fechas',
+        filename=lambda f: f"informe_fechas_{f['from_date']}_a_{f['to_date']}{filter_suffix(f)}",
+        subtitle=lambda f, first: f"Desde {f['from_date']} hasta {f['to_date']}",
+        info=('user_name', 'status', 'created_at', 'max_time_minutes', 'max_date'),
+    ),
+    'pending': ReportSpec(
+        title='INFORME DE TAREAS PENDIENTES',
+        required=(),
+        optional=('user_id', 'status'),
+        query=lambda f: tasks_query("t.status != 'Terminado'", [], f.get('user_id'), f.get('status')),
+        empty_message='No se encontraron tareas pendientes',
+        filename=lambda f: f'informe_pendientes{filter_suffix(f)}',
+        info=('user_name', 'status', 'max_time_minutes', 'max_date'),
+    ),
+    'timeentries': ReportSpec(
+        title='INFORME DE REGISTROS DE TIEMPO',
+        required=('from_date', 'to_date'),
+        optional=('user_id',),
+        query=lambda f: time_entries_query(f['from_date'], f['to_date'], f.get('user_id'), order='ASC'),
+        empty_message='No se encontraron registros en ese rango de fechas',
+        filename=lambda f: f"informe_registros_{f['from_date']}_a_{f['to_date']}{filter_suffix(f)}",
+        subtitle=lambda f, first: f"Periodo: {f['from_date']} a {f['to_date']}",
+        layout=TIMEENTRIES_LAYOUT,
+    ),
+    'export': ReportSpec(
+        title='LISTADO DE REGISTROS DE TIEMPO',
+        required=('from_date', 'to_date'),
+        optional=('user_id', 'has_end', 'status'),
+        # Misma query que el listado
+        query=lambda f: time_entries_query(f['from_date'], f['to_date'], f.get('user_id'),
+                                           f.get('has_end'), f.get('status')),
+        empty_message='No se encontraron registros con esos filtros',
+        filename=lambda f: f"registros_{f['from_date']}_a_{f['to_date']}{filter_suffix(f)}",
+        subtitle=export_filter_info,
+        layout=EXPORT_LAYOUT,
+    ),
+}
+
+# ==================== DATASETS ====================
+
+# Registro con el fin y la duración que se muestran (ver entry_end_and_duration)
+EntryRow = namedtuple('EntryRow', 'entry end duration open')
+
+@dataclass
+class Dataset:
+    """Filas de un informe listas para un renderizador
+
+    `groups` son pares (tarea, registros) y `rows` filas EntryRow, según la
+    forma del informe; ambos son iteradores que se consumen una sola vez.
+    En los informes de tareas `totals()` consulta los totales por tarea.
+    `database` es el fichero de la base de datos, parte de la clave de la
+    caché de fragmentos.
+    """
+    report: str
+    spec: ReportSpec
+    filters: dict
+    filename: str
+    subtitle: Optional[str]
+    groups: object = None
+    rows: object = None
+    totals: Optional[Callable] = None
+    database: Optional[str] = None
+
+    @property
+    def shape(self):
+        return self.spec.shape
+
+def entry_end_and_duration(entry):
+    """Fin mostrado, duración y si el registro está abierto
+
+    Los registros sin fin se calculan hasta las 20:00 del día de inicio.
+    """
+    end_time = entry['end_time']
+    duration = entry['duration_minutes']
+    if end_time and duration:
+        return end_time, duration, False
+
+    start_dt = datetime.fromisoformat(entry['start_time'].replace('Z', '+00:00'))
+    end_of_day = start_dt.replace(hour=20, minute=0, second=0, microsecond=0)
+    if not duration:
+        duration = int((end_of_day - start_dt).total_seconds() / 60)
+    if end_time:
+        return end_time, duration, False
+    return end_of_day.strftime('%Y-%m-%d %H:%M:%S') + ' *', duration, True
+
+def iter_rows(conn, query, params):
+    """Filas del cursor como generador de dicts; None si la consulta no devuelve nada"""
+    cursor = conn.execute(query, params)
+    first = cursor.fetchone()
+    if first is None:
+        return None
+    return (dict(row) for row in itertools.chain([first], cursor))
+
+def task_info(task, fields):
+    """(etiqueta, texto) de cada campo; None en los opcionales vacíos"""
+    info = []
+    for field in fields:
+        label, fmt, required = TASK_INFO[field]
+        info.append((label, fmt.format(task[field])) if required or task[field] else None)
+    return info
+
+def report_options(report, format):
+    """Opciones propias del formato para la forma del informe: {parámetro: valores}"""
+    return RENDERERS[format].options.get(SPECS[report].shape, {})
+
+def validate_filters(report, format, filters):
+    """Comprobar los filtros del informe en ese formato antes de consultar nada
+
+    Los parámetros vacíos cuentan como no indicados. Las opciones de formato
+    (`pdf_mode`, `layout`) solo se admiten en los formatos que las usan.
+    """
+    spec = SPECS[report]
+    options = report_options(report, format)
+    given = {param for param, value in filters.items() if value not in (None, '')}
+    unknown = sorted(given - set(spec.required) - set(spec.optional) - set(options))
+    if unknown:
+        raise ReportParamsError(f"Parámetros no válidos para {report}_{format}: {', '.join(unknown)}")
+    for param in spec.required:
+        if param not in given:
+            raise ReportParamsError(f'Falta el parámetro {param}')
+    for param, values in options.items():
+        if param in given and filters[param] not in values:
+            raise ReportParamsError(f"{param} no válido: {filters[param]} (valores: {', '.join(values)})")
+    for param in ('from_date', 'to_date'):
+        if param in given:
+            try:
+                datetime.strptime(filters[param], '%Y-%m-%d')
+            except (TypeError, ValueError):
+                raise ReportParamsError(f'Fecha no válida en {param}: {filters[param]} (formato YYYY-MM-DD)')
+    return spec
+
+def load_dataset(conn, report, filters):
+    """Ejecutar la consulta del informe `report`; EmptyReportError si no hay filas"""
+    spec = SPECS[report]
+    query, params = spec.query(filters)
+
+    if spec.shape == 'tasks':
+        groups = iter_tasks_with_entries(conn, query, params)
+        first = next(groups, None)
+        if first is None:
+            raise EmptyReportError(spec.empty_message)
+        groups = itertools.chain([first], groups)
+        rows = None
+        totals = functools.partial(iter_task_totals, conn, query, params)
+    else:
+        entries = iter_rows(conn, query, params)
+        if entries is None:
+            raise EmptyReportError(spec.empty_message)
+        rows = (EntryRow(entry, *entry_end_and_duration(entry)) for entry in entries)
+        first = next(rows)
+        rows = itertools.chain([first], rows)
+        groups = totals = None
+
+    subtitle = spec.subtitle(filters, first) if spec.subtitle else None
+    database = conn.execute('PRAGMA database_list').fetchone()[2]
+    return Dataset(report, spec, filters, spec.filename(filters), subtitle, groups, rows, totals, database)
+
+# ==================== SALIDA ====================
+
+def temp_path(suffix):
+    """Fichero temporal único: peticiones simultáneas nunca comparten fichero"""
+    fd, path = tempfile.mkstemp(prefix='taskflow_', suffix=suffix)
+    os.close(fd)
+    return path
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+# ==================== EXCEL ====================
+
+def _named_styles():
+    """Estilos con nombre compartidos por todos los informes Excel"""
+    from openpyxl.styles import NamedStyle, Font, PatternFill, Alignment
+
+    def fill(color):
+        return PatternFill(start_color=color, end_color=color, fill_type='solid')
+
+    center = Alignment(horizontal='center')
+    return [
+        NamedStyle('task_title', font=Font(size=14, bold=True, color='EF8354')),
+        NamedStyle('task_header', font=Font(bold=True), fill=fill('4F5D75'), alignment=center),
+        NamedStyle('report_title', font=Font(size=16, bold=True, color='EF8354'), alignment=center),
+        NamedStyle('table_header', font=Font(bold=True, color='FFFFFF'), fill=fill('4F5D75'), alignment=center),
+        NamedStyle('centered', font=Font(name='Calibri', size=11), alignment=center),
+        NamedStyle('bold', font=Font(bold=True)),
+        NamedStyle('open_end', font=Font(color='FFFFFF', bold=True), fill=fill('FF0000')),
+        NamedStyle('total_label', font=Font(bold=True, size=12), alignment=Alignment(horizontal='right')),
+        NamedStyle('total_value', font=Font(bold=True, size=12), fill=fill('FFD166')),
+        NamedStyle('total_highlight', font=Font(bold=True), fill=fill('FFD166')),
+    ]
+
+def new_workbook():
+    """Libro en modo write-only con los estilos compartidos registrados"""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    for style in _named_styles():
+        wb.add_named_style(style)
+    return wb
+
+def styled_cell(ws, value, style):
+    from openpyxl.cell import WriteOnlyCell
+
+    cell = WriteOnlyCell(ws, value=value)
+    cell.style = style
+    return cell
+
+def set_column_widths(ws, widths):
+    from openpyxl.utils import get_column_letter
+
+    for index, width in enumerate(widths, start=1):
+        ws.column_dimensions[get_column_letter(index)].width = width
+
+def save_workbook(wb, path):
+    """Guardar el libro en `path` contando el tiempo como fase `save`"""
+    with metrics.phase('save'):
+        wb.save(path)
+
+# Caracteres que Excel no admite en el nombre de una hoja
+SHEET_TITLE_INVALID = str.maketrans({char: ' ' for char in '[]:*?/\\'})
+
+def sheet_title(title):
+    return title.translate(SHEET_TITLE_INVALID)
+
+def write_task_sheet(wb, task, times, info_lines):
+    """Hoja de una tarea: título, información, registros de tiempo y total
+
+    Cada elemento de `info_lines` ocupa una fila tras el título (None deja la
+    fila vacía); la tabla de registros empieza a continuación.
+    """
+    ws = wb.create_sheet(sheet_title(f"{task['task_number']} - {task['name'][:25]}"))
+    set_column_widths(ws, [20, 20, 20, 40])
+
+    ws.append([styled_cell(ws, f"Tarea #{task['task_number']}: {task['name']}", 'task_title')])
+    ws.merged_cells.add('A1:E1')
+
+    for line in info_lines:
+        ws.append([line] if line else [])
+
+    headers = ['Fecha/Hora Inicio', 'Fecha/Hora Fin', 'Duración (minutos)', 'Comentario']
+    ws.append([styled_cell(ws, header, 'task_header') for header in headers])
+
+    total_minutes = 0
+    for time_dict in times:
+        if time_dict['duration_minutes']:
+            total_minutes += time_dict['duration_minutes']
+
+        ws.append([
+            time_dict['start_time'],
+            time_dict['end_time'] if time_dict['end_time'] else 'En progreso',
+            time_dict['duration_minutes'] if time_dict['duration_minutes'] else '-',
+            time_dict['comment'] if time_dict['comment'] else '-'
+        ])
+
+    ws.append([])
+    ws.append([styled_cell(ws, 'TOTAL', 'bold'), None, styled_cell(ws, total_minutes, 'bold')])
+
+    return ws
+
+def tasks_excel(dataset, path):
+    """Una hoja por tarea o, con `layout=flat`, todas en una (ver tasks_flat_excel)"""
+    if dataset.filters.get('layout') == 'flat':
+        return tasks_flat_excel(dataset, path)
+
+    wb = new_workbook()
+    for task, times in dataset.groups:
+        info = [f'{line[0]}: {line[1]}' if line else None for line in task_info(task, dataset.spec.info)]
+        write_task_sheet(wb, task, times, info + [None])
+    save_workbook(wb, path)
+
+# Columnas de la hoja única: las cuatro primeras se repiten en cada registro para poder filtrar
+FLAT_COLUMNS = (('Tarea', 10), ('Nombre', 35), ('Asignado a', 20), ('Estado', 14), ('Total tarea (min)', 17),
+                ('Fecha/Hora Inicio', 20), ('Fecha/Hora Fin', 20), ('Duración (minutos)', 18), ('Comentario', 40))
+SUMMARY_COLUMNS = (('Tarea', 10), ('Nombre', 35), ('Asignado a', 20), ('Estado', 14), ('Registros', 12),
+                   ('Minutos', 12), ('Tiempo máximo (min)', 20))
+
+def start_table_sheet(wb, title, columns, outline=False):
+    """Hoja con cabecera fija en la primera fila; el autofiltro se pone al cerrarla
+
+    Con `outline` las filas de detalle se agrupan bajo la fila anterior a ellas.
+    """
+    from openpyxl.worksheet.properties import Outline
+
+    ws = wb.create_sheet(title)
+    set_column_widths(ws, [width for _, width in columns])
+    # Lo que va antes de las filas en el XML debe fijarse antes del primer append
+    ws.freeze_panes = 'A2'
+    if outline:
+        ws.sheet_properties.outlinePr = Outline(summaryBelow=False)
+        ws.sheet_format.outlineLevelRow = 1
+    ws.append([styled_cell(ws, header, 'table_header') for header, _ in columns])
+    return ws
+
+def set_auto_filter(ws, columns, rows):
+    from openpyxl.utils import get_column_letter
+
+    ws.auto_filter.ref = f'A1:{get_column_letter(len(columns))}{rows}'
+
+def tasks_flat_excel(dataset, path):
+    """Todas las tareas en una hoja y una hoja de resumen, escritas en streaming
+
+    Cada tarea ocupa una fila con su total seguida de sus registros agrupados
+    en el esquema (se pliegan por tarea). El resumen de registros y minutos
+    por tarea sale de una consulta, sin recorrer los registros.
+    """
+    wb = new_workbook()
+
+    ws = start_table_sheet(wb, 'Resumen', SUMMARY_COLUMNS)
+    rows = 1
+    entries = minutes = 0
+    for total in dataset.totals():
+        ws.append([f"#{total['task_number']}", total['name'], total['user_name'], total['status'],
+                   total['entries'], total['minutes'], total['max_time_minutes']])
+        rows += 1
+        entries += total['entries']
+        minutes += total['minutes']
+    set_auto_filter(ws, SUMMARY_COLUMNS, rows)
+    ws.append([])
+    ws.append([styled_cell(ws, 'TOTAL', 'bold'), None, None, None,
+               styled_cell(ws, entries, 'bold'), styled_cell(ws, minutes, 'total_highlight')])
+
+    ws = start_table_sheet(wb, 'Tareas', FLAT_COLUMNS, outline=True)
+    rows = 1
+    for task, times in dataset.groups:
+        task_cells = [f"#{task['task_number']}", task['name'], task['user_name'], task['status']]
+        total_minutes = sum(time_dict['duration_minutes'] or 0 for time_dict in times)
+        ws.append([styled_cell(ws, value, 'bold') for value in task_cells] +
+                  [styled_cell(ws, total_minutes, 'total_highlight')])
+        rows += 1
+
+        for time_dict in times:
+            rows += 1
+            # La fila se escribe al añadirla: su dimensión ya no hace falta después
+            ws.row_dimensions[rows].outlineLevel = 1
+            ws.append(task_cells + [
+                None,
+                time_dict['start_time'],
+                time_dict['end_time'] if time_dict['end_time'] else 'En progreso',
+                time_dict['duration_minutes'],
+                time_dict['comment'],
+            ])
+            del ws.row_dimensions[rows]
+    set_auto_filter(ws, FLAT_COLUMNS, rows)
+
+    save_workbook(wb, path)
+
+def entries_excel(dataset, path):
+    """Una hoja con el listado de registros, escrita en streaming"""
+    from openpyxl.utils import get_column_letter
+
+    layout = dataset.spec.layout
+    columns = layout.columns
+    last = get_column_letter(len(columns))
+
+    wb = new_workbook()
+    ws = wb.create_sheet(layout.sheet)
+    set_column_widths(ws, [column.width for column in columns])
+
+    ws.append([styled_cell(ws, dataset.spec.title, 'report_title')])
+    ws.merged_cells.add(f'A1:{last}1')
+    ws.append([styled_cell(ws, dataset.subtitle, 'centered')])
+    ws.merged_cells.add(f'A2:{last}2')
+    ws.append([])
+
+    ws.append([styled_cell(ws, column.header, 'table_header') for column in columns])
+
+    total_minutes = 0
+    for row in dataset.rows:
+        if row.duration:
+            total_minutes += row.duration
+        ws.append([
+            styled_cell(ws, column.value(row), 'open_end') if column.open_end and row.open else column.value(row)
+            for column in columns
+        ])
+
+    # Etiqueta en la columna anterior a la del total
+    label_style, value_style = layout.total_styles
+    total_index = next(i for i, column in enumerate(columns) if column.total_format)
+    ws.append([])
+    ws.append([None] * (total_index - 1) + [
+        styled_cell(ws, 'TOTAL:', label_style),
+        styled_cell(ws, total_minutes, value_style),
+    ])
+
+    save_workbook(wb, path)
+
+# ==================== PDF ====================
+
+@functools.lru_cache(maxsize=None)
+def _pdf_styles():
+    """Estilos de párrafo y de tabla compartidos, creados una vez por proceso"""
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.platypus import TableStyle
+
+    styles = getSampleStyleSheet()
+    return {
+        'normal': styles['Normal'],
+        'title': ParagraphStyle('CustomTitle', parent=styles['Heading1'], fontSize=16,
+                                textColor=colors.HexColor('#EF8354'), spaceAfter=12, alignment=TA_CENTER),
+        'list_title': ParagraphStyle('CustomTitle', parent=styles['Heading1'], fontSize=18,
+                                     textColor=colors.HexColor('#EF8354'), spaceAfter=12, alignment=TA_CENTER),
+        'heading': ParagraphStyle('CustomHeading', parent=styles['Heading2'], fontSize=14,
+                                  textColor=colors.HexColor('#4F5D75'), spaceAfter=10),
+        'task_table': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4F5D75')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -2), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+            ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#FFD166')),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ]),
+    }
+
+def task_story(task, times, spec):
+    """Bloque de una tarea: título, información y tabla de registros con su total"""
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Table, Paragraph, Spacer
+
+    styles = _pdf_styles()
+    heading = Paragraph(f"Tarea #{task['task_number']}: {task['name']}", styles['heading'])
+    # Marca para localizar la página de cada tarea al generar por bloques
+    heading.task_number = task['task_number']
+    story = [heading]
+
+    info_text = ''.join(f'<b>{line[0]}:</b> {line[1]}<br/>' for line in task_info(task, spec.info) if line)
+    story.append(Paragraph(info_text, styles['normal']))
+    story.append(Spacer(1, 0.2*inch))
+
+    if times:
+        data = [['Inicio', 'Fin', 'Duración', 'Comentario']]
+        total_minutes = 0
+        for time_dict in times:
+            data.append([
+                time_dict['start_time'],
+                time_dict['end_time'] if time_dict['end_time'] else 'En progreso',
+                str(time_dict['duration_minutes']) if time_dict['duration_minutes'] else '-',
+                time_dict['comment'] if time_dict['comment'] else '-'
+            ])
+            if time_dict['duration_minutes']:
+                total_minutes += time_dict['duration_minutes']
+
+        if total_minutes > 0:
+            data.append(['', '', str(total_minutes), 'TOTAL'])
+
+        table = Table(data, colWidths=[1.5*inch, 1.5*inch, 1*inch, 3*inch])
+        table.setStyle(styles['task_table'])
+        story.append(table)
+    else:
+        story.append(Paragraph(spec.no_entries, styles['normal']))
+
+    story.append(Spacer(1, 0.4*inch))
+    return story
+
+def task_revision(task, times):
+    """Revisión de una tarea y sus registros: cambia con cualquier escritura en ellos
+
+    sync_version sale de un reloj global creciente: un alta o una edición sube
+    el máximo de los registros y un borrado reduce su número. El nombre del
+    usuario va aparte porque renombrarlo no toca la tarea.
+    """
+    return (task['sync_version'], task['user_name'], len(times),
+            max((time_dict['sync_version'] for time_dict in times), default=0))
+
+def cached_task_story(report, database, task, times):
+    """task_story de la caché de fragmentos si la tarea no ha cambiado
+
+    Se guardan en disco los flowables sin maquetar, así que los aprovecha
+    cualquier proceso de informes o de bloques. La maquetación se repite en
+    cada informe: depende de dónde caiga el bloque en la página. Las bases de
+    datos en memoria (sin fichero) no usan la caché.
+    """
+    if not database:
+        return task_story(task, times, SPECS[report])
+    key = (database, task['id'], f'{report}_pdf')
+    revision = task_revision(task, times)
+    story = fragment_cache.get(key, revision)
+    if story is None:
+        story = task_story(task, times, SPECS[report])
+        fragment_cache.put(key, revision, story)
+    return story
+
+def tasks_pdf(dataset, path):
+    """Informe por tareas en PDF
+
+    Con PDF_WORKERS configurado y más de PDF_CHUNK_TASKS tareas, los bloques
+    se generan en paralelo (ver tasks_parallel_pdf) salvo con `pdf_mode=serial`
+    o sin pypdf para unir las partes.
+    """
+    if dataset.filters.get('pdf_mode') != 'serial' and PDF_WORKERS > 1:
+        chunks = task_chunks(dataset.groups, PDF_CHUNK_TASKS)
+        read = [next(chunks)]
+        second = next(chunks, None)
+        if second is not None:
+            read.append(second)
+            pypdf = _import_pypdf()
+            if pypdf is not None:
+                return tasks_parallel_pdf(dataset, path, itertools.chain(read, chunks), pypdf)
+            print("⚠️ pypdf no está instalado: el PDF se genera en un solo proceso")
+        dataset.groups = itertools.chain.from_iterable(itertools.chain(read, chunks))
+
+    tasks_serial_pdf(dataset, path)
+
+def tasks_serial_pdf(dataset, path):
+    """Título del informe y un bloque por tarea"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+
+    styles = _pdf_styles()
+    story = [Paragraph(dataset.spec.title, styles['title'])]
+    if dataset.subtitle:
+        story.append(Paragraph(dataset.subtitle, styles['normal']))
+    story.append(Spacer(1, 0.3*inch))
+
+    for task, times in dataset.groups:
+        story.extend(cached_task_story(dataset.report, dataset.database, task, times))
+
+    SimpleDocTemplate(path, pagesize=letter).build(story)
+
+def entries_pdf(dataset, path):
+    """Listado de registros en PDF
+
+    Con `pdf_mode=fast`, o sin modo cuando hay más de PDF_FAST_ROWS filas, las
+    filas se dibujan directamente en el canvas; con `pdf_mode=table`, o por
+    debajo del umbral, se usa la tabla de platypus.
+    """
+    mode = dataset.filters.get('pdf_mode')
+    if not mode:
+        # Se leen como mucho PDF_FAST_ROWS + 1 filas para decidir sin cargar el resto
+        head = list(itertools.islice(dataset.rows, PDF_FAST_ROWS + 1))
+        mode = 'fast' if len(head) > PDF_FAST_ROWS else 'table'
+        dataset.rows = itertools.chain(head, dataset.rows)
+
+    if mode == 'fast':
+        entries_canvas_pdf(dataset, path)
+    else:
+        entries_table_pdf(dataset, path)
+
+def entries_table_pdf(dataset, path):
+    """Listado de registros en horizontal con fila de total y nota al pie"""
+    from reportlab.lib.pagesizes import letter, landscape
+    from reportlab.lib import colors
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import ParagraphStyle
+
+    layout = dataset.spec.layout
+    columns = layout.columns
+    header_size, body_size, total_size = layout.pdf_font_sizes
+    styles = _pdf_styles()
+
+    story = [
+        Paragraph(dataset.spec.title, styles['list_title']),
+        Paragraph(dataset.subtitle, styles['normal']),
+        Spacer(1, 0.3*inch),
+    ]
+
+    data = [[column.pdf_header for column in columns]]
+    open_rows = []
+    total_minutes = 0
+    for row in dataset.rows:
+        if row.duration:
+            total_minutes += row.duration
+        if row.open:
+            open_rows.append(len(data))
+        data.append([column.pdf_value(row) for column in columns])
+
+    total_index = next(i for i, column in enumerate(columns) if column.total_format)
+    total_row = [''] * len(columns)
+    total_row[total_index - 1] = 'TOTAL:'
+    total_row[total_index] = columns[total_index].total_format.format(total_minutes)
+    data.append(total_row)
+
+    table_style = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4F5D75')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), header_size),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -2), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+        ('FONTSIZE', (0, 1), (-1, -1), body_size),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#FFD166')),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ]
+    if total_size:
+        table_style.append(('FONTSIZE', (0, -1), (-1, -1), total_size))
+
+    # Fondo rojo en el fin de los registros sin hora de fin
+    end_index = next(i for i, column in enumerate(columns) if column.open_end)
+    for row_idx in open_rows:
+        cell = (end_index, row_idx)
+        table_style.append(('BACKGROUND', cell, cell, colors.red))
+        table_style.append(('TEXTCOLOR', cell, cell, colors.white))
+        if layout.pdf_open_bold:
+            table_style.append(('FONTNAME', cell, cell, 'Helvetica-Bold'))
+
+    table = Table(data, colWidths=[column.pdf_width*inch for column in columns])
+    table.setStyle(TableStyle(table_style))
+    story.append(table)
+
+    story.append(Spacer(1, 0.2*inch))
+    note_style = ParagraphStyle('Note', parent=styles['normal'], fontSize=layout.note_size, textColor=colors.grey)
+    story.append(Paragraph(layout.note, note_style))
+
+    SimpleDocTemplate(path, pagesize=landscape(letter)).build(story)
+
+# ==================== PDF POR BLOQUES ====================
+
+# Procesos que generan a la vez los bloques de un informe por tareas (0 o 1: sin paralelismo).
+# Cada proceso de informes tiene su pool: se limita al reparto de CPUs entre ellos
+PDF_WORKERS = min(int(os.environ.get('TASKFLOW_PDF_WORKERS', '0')),
+                  max(1, (os.cpu_count() or 1) // REPORT_WORKERS))
+# Tareas por bloque
+PDF_CHUNK_TASKS = int(os.environ.get('TASKFLOW_PDF_CHUNK_TASKS', '50'))
+
+_pdf_pool = None
+
+def _import_pypdf():
+    """pypdf es opcional: sin él los informes por tareas se generan en serie"""
+    try:
+        import pypdf
+    except ImportError:
+        return None
+    return pypdf
+
+def get_pdf_pool():
+    """Pool de procesos del proceso actual para los bloques (spawn, como el de informes)"""
+    global _pdf_pool
+    if _pdf_pool is None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing.util import Finalize
+
+        _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        # Dentro de un proceso de informes, al salir multiprocessing espera a sus
+        # hijos antes que a los hooks de atexit: el pool se cierra antes, y antes
+        # también que sus colas (prioridad 10) para que les lleguen los avisos
+        Finalize(None, _pdf_pool.shutdown, exitpriority=100)
+    return _pdf_pool
+
+def task_chunks(groups, size):
+    """Listas de hasta `size` pares (tarea, registros)"""
+    while True:
+        chunk = list(itertools.islice(groups, size))
+        if not chunk:
+            return
+        yield chunk
+
+def render_task_chunk(report, database, chunk):
+    """En un proceso del pool: PDF parcial con los bloques de `chunk`
+
+    Devuelve su ruta, su número de páginas y la página (desde 1) en la que
+    empieza cada tarea.
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate
+
+    class ChunkDocTemplate(SimpleDocTemplate):
+        def afterFlowable(self, flowable):
+            if hasattr(flowable, 'task_number'):
+                task_pages.append(self.page)
+
+    task_pages = []
+    story = []
+    for task, times in chunk:
+        story.extend(cached_task_story(report, database, task, times))
+
+    path = temp_path('.pdf')
+    doc = ChunkDocTemplate(path, pagesize=letter)
+    try:
+        doc.build(story)
+    except BaseException:
+        remove_file(path)
+        raise
+    return path, doc.page, task_pages
+
+def _index_pdf(dataset, titles, pages, path):
+    """Título del informe e índice de tareas con su página; devuelve sus páginas"""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+    styles = _pdf_styles()
+    story = [Paragraph(dataset.spec.title, styles['title'])]
+    if dataset.subtitle:
+        story.append(Paragraph(dataset.subtitle, styles['normal']))
+    story.append(Spacer(1, 0.3*inch))
+    story.append(Paragraph('Índice', styles['heading']))
+
+    table = Table([[title[:90], str(page)] for title, page in zip(titles, pages)],
+                  colWidths=[6*inch, 0.5*inch])
+    table.setStyle(TableStyle([
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('LINEBELOW', (0, 0), (-1, -1), 0.25, colors.lightgrey),
+    ]))
+    story.append(table)
+
+    doc = SimpleDocTemplate(path, pagesize=letter)
+    doc.build(story)
+    return doc.page
+
+def _page_numbers_pdf(total, path):
+    """PDF de `total` páginas vacías con «Página N de total» al pie, para superponer"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    c = canvas.Canvas(path, pagesize=letter)
+    for number in range(1, total + 1):
+        c.setFont('Helvetica', 8)
+        c.setFillColor(_pdf_colors()['note'])
+        c.drawCentredString(letter[0] / 2, PDF_MARGIN / 2, f'Página {number} de {total}')
+        c.showPage()
+    c.save()
+
+def tasks_parallel_pdf(dataset, path, chunks, pypdf):
+    """Bloques de tareas generados en paralelo y unidos en orden
+
+    Cada bloque es un PDF parcial generado en get_pdf_pool(); como mucho hay
+    dos bloques por proceso en vuelo, así que la memoria no crece con el
+    informe. Al unirlos se antepone el título con un índice de tareas, se
+    numeran las páginas y se añade un marcador por tarea.
+    """
+    global _pdf_pool
+
+    pool = get_pdf_pool()
+    futures = []
+    titles = []
+    temporary = []
+    try:
+        waited = 0
+        for chunk in chunks:
+            titles.extend(f"Tarea #{task['task_number']}: {task['name']}" for task, _ in chunk)
+            futures.append(pool.submit(render_task_chunk, dataset.report, dataset.database, chunk))
+            if len(futures) - waited >= 2 * PDF_WORKERS:
+                futures[waited].result()
+                waited += 1
+        parts = [future.result() for future in futures]
+
+        # Página de cada tarea contando desde el principio de las partes
+        task_pages = []
+        offset = 0
+        for _, pages, starts in parts:
+            task_pages.extend(offset + page for page in starts)
+            offset += pages
+
+        # El índice se genera dos veces: la primera solo para saber cuántas páginas ocupa
+        index_path = temp_path('.pdf')
+        temporary.append(index_path)
+        index_pages = _index_pdf(dataset, titles, task_pages, index_path)
+        task_pages = [index_pages + page for page in task_pages]
+        _index_pdf(dataset, titles, task_pages, index_path)
+
+        writer = pypdf.PdfWriter()
+        writer.append(index_path)
+        for part_path, _, _ in parts:
+            writer.append(part_path)
+
+        numbers_path = temp_path('.pdf')
+        temporary.append(numbers_path)
+        _page_numbers_pdf(len(writer.pages), numbers_path)
+        for page, numbers in zip(writer.pages, pypdf.PdfReader(numbers_path).pages):
+            page.merge_page(numbers)
+        for title, page in zip(titles, task_pages):
+            writer.add_outline_item(title, page - 1)
+
+        with metrics.phase('save'):
+            with open(path, 'wb') as f:
+                writer.write(f)
+    except BrokenProcessPool:
+        # Un proceso murió: se descarta el pool para recrearlo en el siguiente informe
+        _pdf_pool = None
+        raise
+    finally:
+        for future in futures:
+            if future.cancel():
+                continue
+            try:
+                temporary.append(future.result()[0])
+            except Exception:
+                pass
+        for temporary_path in temporary:
+            remove_file(temporary_path)
+
+# ==================== PDF RÁPIDO ====================
+
+# Filas a partir de las que el listado en PDF se dibuja directamente en el canvas
+PDF_FAST_ROWS = int(os.environ.get('TASKFLOW_PDF_FAST_ROWS', '2000'))
+
+# Márgenes de SimpleDocTemplate y relleno de las celdas de Table (puntos)
+PDF_MARGIN = 72
+CELL_PADDING = 3
+HEADER_BOTTOM_PADDING = 12
+
+@functools.lru_cache(maxsize=None)
+def _pdf_colors():
+    """Colores de la tabla, creados una vez por proceso"""
+    from reportlab.lib import colors
+
+    return {
+        'title': colors.HexColor('#EF8354'),
+        'header': colors.HexColor('#4F5D75'),
+        'header_text': colors.whitesmoke,
+        'row': colors.beige,
+        'grid': colors.grey,
+        'total': colors.HexColor('#FFD166'),
+        'open': colors.red,
+        'open_text': colors.white,
+        'text': colors.black,
+        'note': colors.grey,
+    }
+
+# Cadenas PDF: bytes no ASCII como escapes octales, paréntesis y barras
+# escapados y saltos de línea y demás caracteres de control como espacios
+_PDF_ESCAPES = {
+    **{i: ' ' for i in range(32)},
+    **{i: f'\\{i:03o}' for i in range(128, 256)},
+    ord('\\'): '\\\\', ord('('): '\\(', ord(')'): '\\)',
+}
+
+@functools.lru_cache(maxsize=None)
+def _font_widths(font):
+    """Anchura de cada byte de la fuente (WinAnsi) en milésimas del tamaño"""
+    from reportlab.pdfbase.pdfmetrics import getFont
+
+    return tuple(getFont(font).widths)
+
+@functools.lru_cache(maxsize=8192)
+def _fit(text, font, size, width):
+    """Cadena PDF con el texto recortado al ancho de la celda y su anchura
+
+    La anchura se suma con las métricas de la fuente en lugar de medirla con
+    reportlab, y se devuelve para centrar el texto sin medirlo otra vez.
+    """
+    widths = _font_widths(font)
+    data = text.encode('cp1252', 'replace')
+    limit = width * 1000 / size
+    total = 0
+    for index, byte in enumerate(data):
+        total += widths[byte]
+        if total > limit:
+            total -= widths[byte]
+            data = data[:index]
+            break
+    return data.decode('latin-1').translate(_PDF_ESCAPES), total * size / 1000
+
+def _pdf_font_name(canvas, font):
+    """Nombre de la fuente en el documento ('/F1') para los operadores Tf escritos a mano
+
+    Se toma del código de un objeto de texto del canvas, que la registra en el
+    documento igual que setFont; dibujar cada celda con textOut cuesta más del
+    triple en los listados grandes.
+    """
+    text_object = canvas.beginText()
+    text_object.setFont(font, 1)
+    code = text_object.getCode().split()
+    return code[code.index('Tf') - 2]
+
+class CanvasTable:
+    """Tabla de columnas fijas dibujada fila a fila sobre el canvas
+
+    Sin platypus: cada fila se escribe directamente como operadores PDF con
+    posiciones, fuentes y colores calculados de antemano, y de cada página
+    solo queda su flujo de contenido. Las páginas repiten la cabecera de la
+    tabla y llevan su número.
+    """
+
+    def __init__(self, path, layout, pagesize):
+        from reportlab.lib.units import inch
+        from reportlab.pdfgen.canvas import Canvas
+
+        self.canvas = Canvas(path, pagesize=pagesize, pageCompression=1)
+        self.width, self.height = pagesize
+        self.colors = _pdf_colors()
+        # Operadores de color de relleno ya formateados
+        self.fills = {name: '%.4f %.4f %.4f rg' % color.rgb() for name, color in self.colors.items()}
+        self.fonts = {font: _pdf_font_name(self.canvas, font) for font in ('Helvetica', 'Helvetica-Bold')}
+
+        widths = [column.pdf_width * inch for column in layout.columns]
+        self.edges = list(itertools.accumulate(widths, initial=(self.width - sum(widths)) / 2))
+        self.centers = [(left + right) / 2 for left, right in zip(self.edges, self.edges[1:])]
+        self.text_widths = [width - 2 * CELL_PADDING for width in widths]
+        self.headers = [column.pdf_header for column in layout.columns]
+        self.open_index = next(i for i, column in enumerate(layout.columns) if column.open_end)
+        self.open_font = 'Helvetica-Bold' if layout.pdf_open_bold else 'Helvetica'
+
+        header_size, body_size, total_size = layout.pdf_font_sizes
+        self.header_size = header_size
+        self.body_size = body_size
+        self.total_size = total_size or body_size
+        self.row_height = body_size * 1.2 + 2 * CELL_PADDING
+
+        self.page = 1
+        self.y = self.height - PDF_MARGIN
+        self.table_top = None
+        self.lines = []
+
+    def _cells(self, baseline, texts, font, size, fill, skip=None):
+        """Operadores de los textos centrados en cada columna"""
+        ops = ['BT', f'{self.fonts[font]} {size} Tf', self.fills[fill]]
+        for index, text in enumerate(texts):
+            if index == skip or not text:
+                continue
+            text, width = _fit(text, font, size, self.text_widths[index])
+            ops.append(f'1 0 0 1 {self.centers[index] - width / 2:.2f} {baseline:.2f} Tm ({text}) Tj')
+        ops.append('ET')
+        return ops
+
+    def _rect(self, left, right, height, fill):
+        return f'{self.fills[fill]} {left:.2f} {self.y - height:.2f} {right - left:.2f} {height:.2f} re f'
+
+    def _draw_row(self, height, size, texts, font, fill, text_fill, open_row=False, bottom_padding=CELL_PADDING):
+        left, right = self.edges[0], self.edges[-1]
+        baseline = self.y - height + bottom_padding + size * 0.2
+        ops = [self._rect(left, right, height, fill)]
+        if open_row:
+            index = self.open_index
+            ops.append(self._rect(self.edges[index], self.edges[index + 1], height, 'open'))
+            ops += self._cells(baseline, [text if i == index else '' for i, text in enumerate(texts)],
+                               self.open_font, size, 'open_text')
+        ops += self._cells(baseline, texts, font, size, text_fill, self.open_index if open_row else None)
+        self.canvas.addLiteral('\n'.join(ops))
+        self.y -= height
+        self.lines.append(self.y)
+
+    def paragraph(self, text, font, size, color, center=False, space_after=0):
+        """Línea de texto fuera de la tabla (título, subtítulo o nota)"""
+        self.y -= size * 1.2
+        self.canvas.setFont(font, size)
+        self.canvas.setFillColor(self.colors[color])
+        if center:
+            self.canvas.drawCentredString(self.width / 2, self.y + size * 0.2, text)
+        else:
+            self.canvas.drawString(PDF_MARGIN, self.y + size * 0.2, text)
+        self.y -= space_after
+
+    def title(self, title, subtitle):
+        from reportlab.lib.units import inch
+
+        self.paragraph(title, 'Helvetica-Bold', 18, 'title', center=True, space_after=12)
+        self.paragraph(subtitle, 'Helvetica', 10, 'text', space_after=0.3 * inch)
+
+    def _header(self):
+        self.table_top = self.y
+        self.lines = [self.y]
+        height = self.header_size * 1.2 + CELL_PADDING + HEADER_BOTTOM_PADDING
+        self._draw_row(height, self.header_size, self.headers, 'Helvetica-Bold', 'header', 'header_text',
+                       bottom_padding=HEADER_BOTTOM_PADDING)
+
+    def _close_page(self):
+        """Rejilla de la tabla y número de página"""
+        canvas = self.canvas
+        if self.table_top is not None:
+            left, right = self.edges[0], self.edges[-1]
+            ops = ['%.4f %.4f %.4f RG 1 w' % self.colors['grid'].rgb()]
+            ops += [f'{left:.2f} {y:.2f} m {right:.2f} {y:.2f} l' for y in self.lines]
+            ops += [f'{x:.2f} {self.table_top:.2f} m {x:.2f} {self.lines[-1]:.2f} l' for x in self.edges]
+            ops.append('S')
+            canvas.addLiteral('\n'.join(ops))
+        canvas.setFont('Helvetica', 8)
+        canvas.setFillColor(self.colors['note'])
+        canvas.drawCentredString(self.width / 2, PDF_MARGIN / 2, f'Página {self.page}')
+        canvas.showPage()
+        self.page += 1
+        self.y = self.height - PDF_MARGIN
+        self.table_top = None
+
+    def _ensure_space(self, height, header=True):
+        if self.y - height < PDF_MARGIN:
+            self._close_page()
+        if header and self.table_top is None:
+            self._header()
+
+    def row(self, texts, open_row=False):
+        self._ensure_space(self.row_height)
+        self._draw_row(self.row_height, self.body_size, texts, 'Helvetica', 'row', 'text', open_row)
+
+    def total(self, texts):
+        height = self.total_size * 1.2 + 2 * CELL_PADDING
+        self._ensure_space(height)
+        self._draw_row(height, self.total_size, texts, 'Helvetica-Bold', 'total', 'text')
+
+    def note(self, text, size):
+        from reportlab.lib.units import inch
+
+        self._ensure_space(0.2 * inch + size * 1.2, header=False)
+        self.y -= 0.2 * inch
+        self.paragraph(text, 'Helvetica', size, 'note')
+
+    def save(self):
+        from reportlab import rl_config
+
+        self._close_page()
+        # Flujos binarios comprimidos, sin la capa ASCII85: menos tiempo y tamaño
+        use_a85 = rl_config.useA85
+        rl_config.useA85 = 0
+        try:
+            self.canvas.save()
+        finally:
+            rl_config.useA85 = use_a85
+
+def entries_canvas_pdf(dataset, path):
+    """El listado de entries_table_pdf dibujado con CanvasTable, para miles de filas"""
+    from reportlab.lib.pagesizes import letter, landscape
+
+    layout = dataset.spec.layout
+    columns = layout.columns
+    table = CanvasTable(path, layout, landscape(letter))
+    table.title(dataset.spec.title, dataset.subtitle)
+
+    total_minutes = 0
+    for row in dataset.rows:
+        if row.duration:
+            total_minutes += row.duration
+        table.row([column.pdf_value(row) for column in columns], row.open)
+
+    total_index = next(i for i, column in enumerate(columns) if column.total_format)
+    total_row = [''] * len(columns)
+    total_row[total_index - 1] = 'TOTAL:'
+    total_row[total_index] = columns[total_index].total_format.format(total_minutes)
+    table.total(total_row)
+    table.note(layout.note, layout.note_size)
+    table.save()
+
+# ==================== CSV Y JSON ====================
+
+TASK_CSV_HEADERS = ['Tarea', 'Nombre', 'Usuario', 'Estado', 'Inicio', 'Fin', 'Duración (minutos)', 'Comentario']
+
+def tasks_csv(dataset, path):
+    """Una fila por registro con los datos de su tarea (las tareas sin registros, una fila)"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(TASK_CSV_HEADERS)
+        for task, times in dataset.groups:
+            prefix = [task['task_number'], task['name'], task['user_name'], task['status']]
+            for time_dict in times or [None]:
+                if time_dict is None:
+                    writer.writerow(prefix + [''] * 4)
+                    continue
+                writer.writerow(prefix + [
+                    time_dict['start_time'], time_dict['end_time'],
+                    time_dict['duration_minutes'], time_dict['comment'],
+                ])
+
+def entries_csv(dataset, path):
+    """Las columnas del Excel, sin título ni total"""
+    columns = dataset.spec.layout.columns
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow([column.header for column in columns])
+        for row in dataset.rows:
+            writer.writerow([column.value(row) for column in columns])
+
+def _write_json(path, dataset, key, items):
+    """Cabecera del informe y la lista `key` escrita elemento a elemento
+
+    Devuelve el total de minutos que acumula `items` (pares (elemento, minutos)).
+    """
+    total_minutes = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        filters = {name: value for name, value in dataset.filters.items() if value not in (None, '')}
+        header = {'title': dataset.spec.title, 'subtitle': dataset.subtitle, 'filters': filters}
+        # La cabecera sin la llave de cierre: la lista se añade a continuación
+        f.write(json.dumps(header, ensure_ascii=False, default=str)[:-1] + f', "{key}": [')
+        for index, (item, minutes) in enumerate(items):
+            total_minutes += minutes
+            f.write((',\n' if index else '\n') + json.dumps(item, ensure_ascii=False, default=str))
+        f.write(f'\n], "total_minutes": {total_minutes}}}\n')
+
+def tasks_json(dataset, path):
+    """Tareas con sus registros y su total"""
+    def items():
+        for task, times in dataset.groups:
+            total = sum(time_dict['duration_minutes'] or 0 for time_dict in times)
+            yield dict(task, entries=times, total_minutes=total), total
+
+    _write_json(path, dataset, 'tasks', items())
+
+def entries_json(dataset, path):
+    """Registros tal como los devuelve el listado; el total cuenta los abiertos hasta las 20:00"""
+    _write_json(path, dataset, 'entries', ((row.entry, row.duration or 0) for row in dataset.rows))
+
+# ==================== RENDERIZADORES ====================
+
+@dataclass(frozen=True)
+class Renderer:
+    """Formato de salida: una función por forma de dataset, `(dataset, path)`
+
+    `options` da, por forma, los parámetros propios del formato y sus valores.
+    """
+    extension: str
+    media_type: str
+    tasks: Callable
+    entries: Callable
+    options: dict = dataclass_field(default_factory=dict)
+
+RENDERERS = {
+    'excel': Renderer('.xlsx', XLSX_MEDIA_TYPE, tasks_excel, entries_excel,
+                      {'tasks': {'layout': ('sheets', 'flat')}}),
+    'pdf': Renderer('.pdf', PDF_MEDIA_TYPE, tasks_pdf, entries_pdf,
+                    {'tasks': {'pdf_mode': ('parallel', 'serial')}, 'entries': {'pdf_mode': ('fast', 'table')}}),
+    'csv': Renderer('.csv', CSV_MEDIA_TYPE, tasks_csv, entries_csv),
+    'json': Renderer('.json', JSON_MEDIA_TYPE, tasks_json, entries_json),
+}
+
+def parse_name(name):
+    """`{informe}_{formato}` -> (informe, formato); ReportParamsError si no existe"""
+    report, _, format = name.rpartition('_')
+    if report not in SPECS or format not in RENDERERS:
+        raise ReportParamsError(f"Informe no válido: {name}")
+    return report, format
+
+def report_params(name):
+    """Parámetros del informe `name`, opciones del formato incluidas: {nombre: obligatorio}"""
+    report, format = parse_name(name)
+    spec = SPECS[report]
+    optional = spec.optional + tuple(report_options(report, format))
+    return {**{param: True for param in spec.required}, **{param: False for param in optional}}
+
+def run_report(conn, name, **filters):
+    """Generar el informe `name` ({informe}_{formato}) con la conexión dada"""
+    report, format = parse_name(name)
+    validate_filters(report, format, filters)
+    renderer = RENDERERS[format]
+
+    dataset = load_dataset(conn, report, filters)
+    path = temp_path(renderer.extension)
+    try:
+        getattr(renderer, dataset.shape)(dataset, path)
+    except BaseException:
+        remove_file(path)
+        raise
+    return ReportFile(path, dataset.filename + renderer.extension, renderer.media_type)
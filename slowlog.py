@@ -0,0 +1,169 @@
+"""
+Registro de consultas lentas
+Cada consulta que supera el umbral se guarda en un fichero JSONL rotativo con
+su SQL, parámetros, duración, filas devueltas y el EXPLAIN QUERY PLAN. Está
+desactivado si no se configura el umbral, y de los parámetros solo se guarda
+su tipo salvo que se pidan los valores (pueden contener datos de usuarios).
+"""
+
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+
+# Milisegundos a partir de los que una consulta es lenta (negativo: desactivado, por defecto)
+SLOW_QUERY_MS = float(os.environ.get('TASKFLOW_SLOW_QUERY_MS', '-1'))
+SLOW_QUERY_LOG = os.environ.get('TASKFLOW_SLOW_QUERY_LOG',
+                                os.path.join(tempfile.gettempdir(), 'taskflow_slow_queries.jsonl'))
+# Guardar los valores de los parámetros y no solo su tipo
+SLOW_QUERY_PARAMS = os.environ.get('TASKFLOW_SLOW_QUERY_PARAMS', '').lower() in ('1', 'true', 'yes')
+
+# Tamaño de cada fichero antes de rotar y ficheros antiguos que se conservan
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 3
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACES = re.compile(r'\s+')
+
+def normalize(sql):
+    """Forma de la consulta: literales como ?, listas IN (?, ?, ...) como (?...)
+    y espacios colapsados, para agrupar las que solo cambian de valores"""
+    shape = _STRING.sub('?', sql)
+    shape = _NUMBER.sub('?', shape)
+    shape = _SPACES.sub(' ', shape).strip()
+    return _IN_LIST.sub('(?...)', shape)
+
+def _redact(params):
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in params.items()}
+    return [type(value).__name__ for value in params]
+
+def _plan(conn, sql, params):
+    """EXPLAIN QUERY PLAN con sangría por nivel (None si no se puede obtener)"""
+    try:
+        rows = conn.cursor(sqlite3.Cursor).execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+    except sqlite3.Error:
+        return None
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node_id] + detail)
+    return lines
+
+class SlowQueryLog:
+    """Umbral, fichero de registro y resumen por forma de consulta
+
+    El proceso principal rota el fichero; los procesos de informes escriben en
+    el mismo y lo reabren cuando ha rotado.
+    """
+
+    def __init__(self, path=SLOW_QUERY_LOG, threshold_ms=SLOW_QUERY_MS, redact=not SLOW_QUERY_PARAMS,
+                 max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS):
+        self.path = path
+        self.threshold_ms = threshold_ms
+        self.redact = redact
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._handler = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.threshold_ms >= 0
+
+    def check(self, conn, sql, params, seconds, rows):
+        """Registrar la consulta si ha tardado `threshold_ms` o más
+
+        Las sentencias de executemany llegan con params None: se registran
+        con la duración de todas sus filas, sin parámetros ni plan.
+        """
+        duration_ms = seconds * 1000
+        if not self.enabled or duration_ms < self.threshold_ms:
+            return
+        record = {
+            'time': datetime.now().isoformat(timespec='milliseconds'),
+            'duration_ms': round(duration_ms, 3),
+            'rows': rows,
+            'shape': normalize(sql),
+            'sql': sql.strip(),
+            'params': None if params is None else (_redact(params) if self.redact else params),
+            'plan': None if params is None else _plan(conn, sql, params),
+            'pid': os.getpid(),
+        }
+        self._write(json.dumps(record, ensure_ascii=False, default=str))
+
+    def _write(self, line):
+        with self._lock:
+            if self._handler is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                if multiprocessing.parent_process() is None:
+                    handler = logging.handlers.RotatingFileHandler(
+                        self.path, maxBytes=self.max_bytes, backupCount=self.backups, encoding='utf-8')
+                else:
+                    handler = logging.handlers.WatchedFileHandler(self.path, encoding='utf-8')
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                self._handler = handler
+        self._handler.handle(logging.makeLogRecord({'msg': line}))
+
+    def records(self):
+        """Registros de los ficheros rotados y del actual, del más antiguo al más reciente"""
+        paths = [f'{self.path}.{n}' for n in range(self.backups, 0, -1)] + [self.path]
+        for path in paths:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            yield json.loads(line)
+                        except ValueError:
+                            continue
+            except FileNotFoundError:
+                continue
+
+    def summary(self, limit=20):
+        """Consultas lentas agrupadas por forma, de más a menos tiempo total"""
+        groups = {}
+        total = 0
+        for record in self.records():
+            total += 1
+            group = groups.get(record['shape'])
+            if group is None:
+                group = groups[record['shape']] = {
+                    'shape': record['shape'], 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                    'rows_max': 0, 'last_seen': None, 'slowest': None,
+                }
+            group['count'] += 1
+            group['total_ms'] += record['duration_ms']
+            group['rows_max'] = max(group['rows_max'], record['rows'])
+            group['last_seen'] = record['time']
+            if record['duration_ms'] >= group['max_ms']:
+                group['max_ms'] = record['duration_ms']
+                group['slowest'] = {key: record[key] for key in ('time', 'sql', 'params', 'rows', 'plan')}
+
+        queries = sorted(groups.values(), key=lambda g: g['total_ms'], reverse=True)[:limit]
+        for group in queries:
+            group['total_ms'] = round(group['total_ms'], 3)
+            group['avg_ms'] = round(group['total_ms'] / group['count'], 3)
+        return {
+            'threshold_ms': self.threshold_ms if self.enabled else None,
+            'log': self.path,
+            'records': total,
+            'shapes': len(groups),
+            'queries': queries,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._handler is not None:
+                self._handler.close()
+                self._handler = None
+
+slow_queries = SlowQueryLog()
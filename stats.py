@@ -0,0 +1,57 @@
+"""
+Estadísticas de tiempo a partir del resumen diario (time_rollup_daily)
+"""
+
+from database import date_range
+
+# Expresión del periodo a partir del día (YYYY-MM-DD) del resumen
+PERIODS = {
+    'day': 'r.day',
+    # Lunes de la semana ISO
+    'week': "date(r.day, 'weekday 0', '-6 days')",
+    'month': "substr(r.day, 1, 7)",
+}
+
+def summary(conn, period='week', from_date=None, to_date=None, user_id=None):
+    """Minutos por usuario y periodo (día, semana o mes)
+
+    Solo lee el resumen diario: el coste depende del número de días y tareas
+    del rango, no del número de registros de tiempo.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Periodo no válido: {period} (opciones: {', '.join(PERIODS)})")
+
+    conditions = []
+    params = []
+    if from_date or to_date:
+        if not (from_date and to_date):
+            raise ValueError('Indica from_date y to_date')
+        conditions.append('r.day >= ? AND r.day < ?')
+        params.extend(date_range(from_date, to_date))
+    if user_id:
+        conditions.append('t.user_id = ?')
+        params.append(user_id)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    rows = conn.execute(f'''
+        SELECT
+            t.user_id,
+            u.name AS user_name,
+            {PERIODS[period]} AS period,
+            SUM(r.minutes) AS minutes,
+            SUM(r.entries) AS entries,
+            SUM(r.open_entries) AS open_entries
+        FROM time_rollup_daily r
+        JOIN tasks t ON r.task_id = t.id
+        LEFT JOIN users u ON t.user_id = u.id
+        {where}
+        GROUP BY t.user_id, period
+        ORDER BY period, t.user_id
+    ''', params).fetchall()
+
+    result = []
+    for row in rows:
+        item = dict(row)
+        item['hours'] = round(item['minutes'] / 60, 2)
+        result.append(item)
+    return result
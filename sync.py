@@ -0,0 +1,67 @@
+"""
+Sincronización incremental: filas cambiadas y borradas desde una versión
+Los triggers de la migración 8 mantienen sync_version, updated_at y las lápidas
+"""
+
+from migrations import VERSIONED_TABLES
+
+# Cambios por respuesta (por defecto y como máximo)
+SYNC_LIMIT = 1000
+MAX_SYNC_LIMIT = 10000
+
+def current_version(conn):
+    return conn.execute('SELECT version FROM sync_clock WHERE id = 1').fetchone()[0]
+
+def _cutoff(conn, since, limit):
+    """Versión del cambio número `limit` tras `since` (None si hay menos)"""
+    sources = [f'SELECT sync_version FROM {table} WHERE sync_version > ?' for table in VERSIONED_TABLES]
+    sources.append('SELECT sync_version FROM tombstones WHERE sync_version > ?')
+    row = conn.execute(
+        f"SELECT sync_version FROM ({' UNION ALL '.join(sources)}) ORDER BY sync_version LIMIT 1 OFFSET ?",
+        [since] * len(sources) + [limit - 1]
+    ).fetchone()
+    return row[0] if row else None
+
+def changes_since(conn, since=0, limit=SYNC_LIMIT):
+    """Filas modificadas y ids borrados con since < sync_version <= version
+
+    Cada cambio tiene su propia versión, así que si hay más de `limit` se
+    corta exactamente ahí: has_more indica que hay que volver a pedir con
+    since = version. since=0 devuelve todos los datos.
+    """
+    if since < 0:
+        raise ValueError('since no puede ser negativo')
+    if limit < 1 or limit > MAX_SYNC_LIMIT:
+        raise ValueError(f'limit debe estar entre 1 y {MAX_SYNC_LIMIT}')
+
+    # Todas las consultas sobre la misma instantánea de la base de datos
+    conn.execute('BEGIN')
+    try:
+        latest = current_version(conn)
+        if since > latest:
+            raise ValueError('since es posterior a la versión actual: sincroniza de nuevo desde 0')
+
+        version = _cutoff(conn, since, limit) or latest
+        changes = {
+            table: [dict(row) for row in conn.execute(
+                f'SELECT * FROM {table} WHERE sync_version > ? AND sync_version <= ? ORDER BY sync_version',
+                (since, version)
+            )]
+            for table in VERSIONED_TABLES
+        }
+        deleted = {table: [] for table in VERSIONED_TABLES}
+        for table_name, row_id in conn.execute(
+            'SELECT table_name, row_id FROM tombstones WHERE sync_version > ? AND sync_version <= ? ORDER BY sync_version',
+            (since, version)
+        ):
+            deleted[table_name].append(row_id)
+    finally:
+        conn.rollback()
+
+    return {
+        'since': since,
+        'version': version,
+        'has_more': version < latest,
+        'changes': changes,
+        'deleted': deleted,
+    }
@@ -0,0 +1,35 @@
+"""
+Pruebas de los ETag y la caché de respuestas
+"""
+
+import http_cache
+
+def test_etag_depends_only_on_route_tables():
+    tables = http_cache.route_tables('/api/tasks/3/annotations')
+    assert tables == ('annotations',)
+
+    versions = {'users': 1, 'tasks': 5, 'annotations': 2, 'time_entries': 9}
+    etag = http_cache.make_etag('/api/tasks/3/annotations', '', tables, versions)
+    assert etag == http_cache.make_etag('/api/tasks/3/annotations', '', tables, {**versions, 'tasks': 6})
+    assert etag != http_cache.make_etag('/api/tasks/3/annotations', '', tables, {**versions, 'annotations': 3})
+    assert etag != http_cache.make_etag('/api/tasks/4/annotations', '', tables, versions)
+
+    assert http_cache.route_tables('/api/reports/excel') is None
+
+def test_if_none_match():
+    assert http_cache.etag_matches('"a", "b"', '"b"')
+    assert http_cache.etag_matches('W/"b"', '"b"')
+    assert http_cache.etag_matches('*', '"b"')
+    assert not http_cache.etag_matches(None, '"b"')
+    assert not http_cache.etag_matches('"a"', '"b"')
+
+def test_response_cache_lru():
+    cache = http_cache.ResponseCache(size=2)
+    cache.put(('/a', ''), '"1"', [], b'a')
+    cache.put(('/b', ''), '"1"', [], b'b')
+    assert cache.get(('/a', ''), '"1"')[2] == b'a'
+    cache.put(('/c', ''), '"1"', [], b'c')
+
+    assert cache.get(('/b', ''), '"1"') is None
+    assert cache.get(('/a', ''), '"2"') is None
+    assert cache.stats()['entries'] == 2
@@ -0,0 +1,72 @@
+"""
+Pruebas del bus de cambios en tiempo real
+"""
+
+import asyncio
+import threading
+
+from changes import ChangeBus, parse_since
+
+def test_resume_from_sequence_and_reset():
+    bus = ChangeBus(size=3)
+    start = bus.seq
+    events = [bus.publish('task', 'update', n, {'name': f'Tarea {n}'}) for n in range(1, 6)]
+    assert [e['seq'] for e in events] == list(range(start + 1, start + 6))
+
+    # Solo quedan los 3 últimos en el búfer
+    changes, reset = bus.since(start + 2)
+    assert not reset and [e['id'] for e in changes] == [3, 4, 5]
+    assert bus.since(start + 5) == ([], False)
+    assert bus.since(start + 1)[1]
+    # Secuencia de otro arranque (posterior a la actual)
+    assert bus.since(start + 100)[1]
+
+def test_listen_receives_changes_from_other_threads():
+    bus = ChangeBus()
+
+    async def consume():
+        messages = []
+        listener = bus.listen(keepalive=5)
+        messages += await listener.__anext__()
+        threading.Thread(target=lambda: [bus.publish('time_entry', 'create', n, {'task_id': 1}) for n in (1, 2)]).start()
+        while sum(m['type'] == 'change' for m in messages) < 2:
+            messages += await asyncio.wait_for(listener.__anext__(), 5)
+        await listener.aclose()
+        return messages
+
+    messages = asyncio.run(consume())
+    assert messages[0]['type'] == 'hello'
+    assert [m['id'] for m in messages if m['type'] == 'change'] == [1, 2]
+    assert bus.stats()['subscribers'] == 0
+
+def test_slow_listener_gets_reset():
+    bus = ChangeBus(size=2)
+
+    async def consume():
+        listener = bus.listen(since=bus.seq)
+        await listener.__anext__()
+        for n in range(5):
+            bus.publish('task', 'delete', n)
+        message = await listener.__anext__()
+        await listener.aclose()
+        return message
+
+    assert asyncio.run(consume()) == [{'type': 'reset', 'seq': bus.seq}]
+    assert parse_since('abc') is None and parse_since('12') == 12
+
+def test_writes_from_other_processes_reset_listeners():
+    bus = ChangeBus()
+    start = bus.seq
+    bus.observe(10)
+    # Lotes propios: el reloj avanza por ellos
+    bus.wrote(10, 12)
+    bus.observe(12)
+    assert bus.since(start) == ([], False)
+
+    # Otro proceso escribió: al vigilar el reloj y al empezar un lote propio
+    bus.observe(13)
+    bus.wrote(15, 16)
+    bus.observe(16)
+    events, reset = bus.since(start)
+    assert not reset and [e['type'] for e in events] == ['reset', 'reset']
+    assert bus.stats()['external'] == 2
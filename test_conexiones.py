@@ -0,0 +1,87 @@
+"""
+Pruebas del pool de conexiones: límite, espera, reutilización y comprobaciones
+"""
+
+import sqlite3
+import threading
+
+import pytest
+
+import database
+from database import ConnectionPool, PoolTimeout, connect
+
+@pytest.fixture
+def pool(tmp_path):
+    path = str(tmp_path / 'test.db')
+    conn = connect(path)
+    conn.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)')
+    conn.commit()
+    conn.close()
+
+    pool = ConnectionPool(path, size=2, timeout=0.05)
+    yield pool
+    pool.close()
+
+def test_bounded_checkout_waits_and_times_out(pool):
+    a = pool.acquire()
+    b = pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert pool.stats()['timeouts'] == 1 and pool.stats()['created'] == 2
+
+    # Con el pool agotado se espera a que otra petición devuelva su conexión
+    pool.timeout = 5
+    threading.Timer(0.05, pool.release, (a,)).start()
+    assert pool.acquire() is a
+    assert pool.stats()['waits'] == 1
+    pool.release(a)
+    pool.release(b)
+
+def test_last_released_connection_is_reused_first(pool):
+    a = pool.acquire()
+    b = pool.acquire()
+    pool.release(a)
+    pool.release(b)
+    assert pool.acquire() is b
+    assert pool.acquire() is a
+
+def test_idle_connections_checked_after_interval(pool, monkeypatch):
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.close()
+
+    # Dentro del intervalo no se comprueba: se entrega tal cual
+    monkeypatch.setattr(database, 'HEALTH_CHECK_INTERVAL', 3600)
+    assert pool.acquire() is conn
+    pool.release(conn)
+
+    # Pasado el intervalo la conexión rota se sustituye por una nueva
+    monkeypatch.setattr(database, 'HEALTH_CHECK_INTERVAL', 0)
+    replacement = pool.acquire()
+    assert replacement is not conn
+    assert replacement.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 0
+    assert pool.stats()['replaced'] == 1
+    pool.release(replacement)
+
+def test_writer_rolls_back_what_was_not_committed(pool):
+    with pytest.raises(RuntimeError):
+        with pool.writer() as conn:
+            conn.execute("INSERT INTO t (name) VALUES ('a')")
+            raise RuntimeError('fallo a mitad de la escritura')
+    with pool.writer() as conn:
+        assert not conn.in_transaction
+        conn.execute("INSERT INTO t (name) VALUES ('b')")
+        conn.commit()
+
+    with pool.connection() as conn:
+        assert [row[0] for row in conn.execute('SELECT name FROM t')] == ['b']
+
+def test_read_connections_are_query_only(pool):
+    with pool.connection() as conn:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO t (name) VALUES ('a')")
+        # La escritura rechazada deja abierta la transacción implícita
+        assert conn.in_transaction
+    # La transacción abierta se deshace al devolverla
+    with pool.connection() as again:
+        assert again is conn and not again.in_transaction
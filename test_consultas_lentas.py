@@ -0,0 +1,47 @@
+"""
+Pruebas del registro de consultas lentas
+"""
+
+import json
+
+import pytest
+
+import database
+from database import connect
+from slowlog import SlowQueryLog, normalize
+
+@pytest.fixture
+def log(tmp_path, monkeypatch):
+    log = SlowQueryLog(str(tmp_path / 'slow.jsonl'), threshold_ms=0, redact=True)
+    monkeypatch.setattr(database, 'slow_queries', log)
+    yield log
+    log.close()
+
+def test_normalize_groups_by_shape():
+    assert normalize("SELECT * FROM t\n  WHERE a = 5 AND b = 'x''y' AND c IN (?, ?, ?)") == \
+        'SELECT * FROM t WHERE a = ? AND b = ? AND c IN (?...)'
+    assert normalize('SELECT * FROM t1 WHERE id IN (?,?)') == 'SELECT * FROM t1 WHERE id IN (?...)'
+
+def test_logs_rows_plan_and_redacted_params(log, tmp_path):
+    conn = connect(str(tmp_path / 'test.db'))
+    conn.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)')
+    conn.executemany('INSERT INTO t (name) VALUES (?)', [('a',), ('b',), ('c',)])
+    for name in ('a', 'b'):
+        conn.execute('SELECT * FROM t WHERE name = ?', (name,)).fetchall()
+    # Consulta sin agotar: se registra al liberar el cursor
+    assert conn.execute('SELECT * FROM t WHERE id > ?', (1,)).fetchone()[0] == 2
+    conn.close()
+
+    records = [json.loads(line) for line in open(log.path, encoding='utf-8')]
+    select = [r for r in records if r['shape'] == 'SELECT * FROM t WHERE name = ?']
+    assert [(r['rows'], r['params']) for r in select] == [(1, ['str']), (1, ['str'])]
+    assert 'SCAN t' in select[0]['plan'][0]
+    # executemany: todas las filas en un registro, sin parámetros ni plan
+    insert = next(r for r in records if r['shape'].startswith('INSERT'))
+    assert (insert['rows'], insert['params'], insert['plan']) == (3, None, None)
+    assert next(r for r in records if 'id >' in r['shape'])['rows'] == 1
+
+    summary = log.summary()
+    group = next(g for g in summary['queries'] if g['shape'] == 'SELECT * FROM t WHERE name = ?')
+    assert group['count'] == 2 and group['slowest']['plan'] == select[0]['plan']
+    assert summary['records'] == len(records)
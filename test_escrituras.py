@@ -0,0 +1,84 @@
+"""
+Pruebas de la cola de escrituras con commit agrupado
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+from database import connect
+from migrations import apply_migrations
+from writequeue import WriteQueue, WriteQueueClosed
+
+@pytest.fixture
+def writer(tmp_path):
+    path = str(tmp_path / 'test.db')
+    conn = connect(path)
+    apply_migrations(conn)
+    conn.close()
+
+    conn = connect(path)
+    lock = threading.Lock()
+
+    @contextmanager
+    def writer():
+        with lock:
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+
+    writer.conn = conn
+    yield writer
+    conn.close()
+
+def insert_user(conn, name):
+    if name == 'Error':
+        raise ValueError('Nombre no válido')
+    return conn.execute('INSERT INTO users (name) VALUES (?) RETURNING id', (name,)).fetchone()[0]
+
+def test_operations_share_commits_and_failures_are_isolated(writer):
+    writes = WriteQueue(batch_wait_ms=50, writer=writer)
+    futures = [writes.submit(insert_user, name) for name in ('Ana', 'Error', 'Luis')]
+
+    assert futures[0].result(5) and futures[2].result(5)
+    with pytest.raises(ValueError):
+        futures[1].result(5)
+    names = [row[0] for row in writer.conn.execute('SELECT name FROM users ORDER BY id')]
+    assert names == ['Ana', 'Luis']
+
+    stats = writes.stats()
+    assert stats['batches'] == 1 and stats['committed'] == 2 and stats['failed'] == 1
+    writes.close()
+    with pytest.raises(WriteQueueClosed):
+        writes.submit(insert_user, 'Tarde')
+
+class FailingCommit:
+    """Conexión cuyo COMMIT falla (p. ej. disco lleno)"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def commit(self):
+        raise sqlite3.OperationalError('disk I/O error')
+
+def test_failed_commit_fails_the_whole_batch(writer):
+    @contextmanager
+    def failing_writer():
+        with writer() as conn:
+            yield FailingCommit(conn)
+
+    writes = WriteQueue(batch_wait_ms=50, writer=failing_writer)
+    futures = [writes.submit(insert_user, name) for name in ('Ana', 'Luis')]
+    for future in futures:
+        with pytest.raises(sqlite3.OperationalError):
+            future.result(5)
+    writes.close()
+    assert writer.conn.execute('SELECT COUNT(*) FROM users').fetchone()[0] == 0
+    assert writes.stats()['failed'] == 2
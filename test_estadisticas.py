@@ -0,0 +1,73 @@
+"""
+Pruebas del resumen diario de tiempos y las estadísticas
+"""
+
+import pytest
+
+import stats
+from database import connect
+from migrations import apply_migrations
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = connect(str(tmp_path / 'test.db'))
+    apply_migrations(conn)
+    conn.executemany("INSERT INTO users (name) VALUES (?)", [('Ana',), ('Luis',)])
+    conn.executemany('INSERT INTO tasks (task_number, name, user_id) VALUES (?, ?, ?)',
+                     [(1, 'Uno', 1), (2, 'Dos', 2), (3, 'Tres', 1)])
+    conn.commit()
+    yield conn
+    conn.close()
+
+def rollup_from_entries(conn):
+    """Resumen recalculado desde cero, para comparar con el mantenido por triggers"""
+    return conn.execute('''
+        SELECT task_id, substr(start_time, 1, 10), COALESCE(SUM(duration_minutes), 0), COUNT(*),
+               SUM(end_time IS NULL)
+        FROM time_entries GROUP BY 1, 2 ORDER BY 1, 2
+    ''').fetchall()
+
+def rollup(conn):
+    return conn.execute('SELECT task_id, day, minutes, entries, open_entries FROM time_rollup_daily '
+                        'ORDER BY 1, 2').fetchall()
+
+def test_rollup_follows_inserts_updates_and_deletes(conn):
+    insert = 'INSERT INTO time_entries (task_id, start_time, end_time, duration_minutes) VALUES (?, ?, ?, ?)'
+    conn.execute(insert, (1, '2026-03-02T09:00', '2026-03-02T10:30', 90))
+    conn.execute(insert, (1, '2026-03-02T11:00', None, None))
+    conn.execute(insert, (2, '2026-03-03T08:00', '2026-03-03T09:00', 60))
+    conn.execute(insert, (3, '2026-03-10T08:00', '2026-03-10T08:45', 45))
+    assert [tuple(r) for r in rollup(conn)] == [tuple(r) for r in rollup_from_entries(conn)]
+
+    # Cerrar el registro abierto, moverlo de tarea y de día
+    conn.execute("UPDATE time_entries SET end_time = '2026-03-02T12:00', duration_minutes = 60 WHERE id = 2")
+    conn.execute("UPDATE time_entries SET task_id = 3, start_time = '2026-03-04T09:00' WHERE id = 1")
+    conn.execute("UPDATE time_entries SET comment = 'sin efecto en el resumen' WHERE id = 3")
+    conn.execute('DELETE FROM time_entries WHERE id = 4')
+    assert [tuple(r) for r in rollup(conn)] == [tuple(r) for r in rollup_from_entries(conn)]
+
+    conn.execute('DELETE FROM time_entries')
+    assert rollup(conn) == []
+
+def test_summary_hours_per_user_per_week(conn):
+    insert = 'INSERT INTO time_entries (task_id, start_time, end_time, duration_minutes) VALUES (?, ?, ?, ?)'
+    conn.executemany(insert, [
+        (1, '2026-03-02T09:00', '2026-03-02T10:00', 60),   # lunes
+        (3, '2026-03-08T09:00', '2026-03-08T09:30', 30),   # domingo, misma semana
+        (1, '2026-03-09T09:00', None, None),               # lunes siguiente, abierto
+        (2, '2026-03-04T09:00', '2026-03-04T11:00', 120),
+    ])
+
+    result = stats.summary(conn, 'week')
+    assert [(r['user_name'], r['period'], r['minutes'], r['open_entries']) for r in result] == [
+        ('Ana', '2026-03-02', 90, 0),
+        ('Luis', '2026-03-02', 120, 0),
+        ('Ana', '2026-03-09', 0, 1),
+    ]
+    assert result[0]['hours'] == 1.5
+
+    filtered = stats.summary(conn, 'month', '2026-03-01', '2026-03-08', user_id=1)
+    assert [(r['period'], r['minutes'], r['entries']) for r in filtered] == [('2026-03', 90, 2)]
+
+    with pytest.raises(ValueError):
+        stats.summary(conn, 'year')
@@ -0,0 +1,117 @@
+"""
+Pruebas de la importación de registros de tiempo desde XLSX y CSV
+"""
+
+import io
+from contextlib import nullcontext
+
+import pytest
+
+import importer
+import reports
+import sync
+from changes import ChangeBus
+from database import connect
+from migrations import apply_migrations
+from writequeue import WriteQueue
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = connect(str(tmp_path / 'test.db'))
+    apply_migrations(conn)
+    conn.execute("INSERT INTO users (name) VALUES ('Ana')")
+    conn.execute("INSERT INTO tasks (task_number, name, user_id) VALUES (1, 'Soporte', 1)")
+    conn.commit()
+    yield conn
+    conn.close()
+
+def run_import(conn, data, filename, queue=None, **options):
+    own = queue is None
+    queue = queue or WriteQueue(writer=lambda: nullcontext(conn))
+    try:
+        events = list(importer.import_file(io.BytesIO(data), filename, queue=queue, **options))
+    finally:
+        if own:
+            queue.close()
+    rejected = [(e['row'], e['error']) for e in events if e['event'] == 'rejected']
+    return events, rejected
+
+CSV = '''Inicio;Fin;Tarea;Usuario;Comentario
+2026-03-02T09:00;2026-03-02T10:30;#1: Soporte;Ana;Llamadas
+2026-03-02T11:00;2026-03-02T10:00;#1: Soporte;Ana;-
+2026-03-03T09:00;;Formación;Ana;-
+2026-03-03T09:00;;Otra;Nadie;
+;;;;
+'''
+
+def test_csv_import_in_chunks(conn):
+    events, rejected = run_import(conn, CSV.encode(), 'registros.csv', chunk_size=2)
+
+    assert rejected == [(3, 'La fecha de fin debe ser posterior a la de inicio'), (5, 'No existe el usuario Nadie')]
+    assert [e['rows'] for e in events if e['event'] == 'progress'] == [2, 4]
+    assert events[-1] == {'event': 'done', 'dry_run': False, 'rows': 4, 'imported': 2,
+                          'rejected': 2, 'tasks_created': 1}
+
+    rows = conn.execute('''
+        SELECT t.name, te.duration_minutes, te.comment FROM time_entries te
+        JOIN tasks t ON t.id = te.task_id ORDER BY te.id
+    ''').fetchall()
+    assert [tuple(row) for row in rows] == [('Soporte', 90, 'Llamadas'), ('Formación', None, None)]
+
+def test_dry_run_writes_nothing(conn):
+    events, _ = run_import(conn, CSV.encode(), 'registros.csv', dry_run=True)
+    assert events[-1]['imported'] == 2
+    assert conn.execute('SELECT COUNT(*) FROM time_entries').fetchone()[0] == 0
+    assert conn.execute('SELECT COUNT(*) FROM tasks').fetchone()[0] == 1
+
+def test_dry_run_counts_new_tasks_once_across_chunks(conn):
+    data = 'Inicio;Fin;Tarea;Usuario\n' + ''.join(
+        f'2026-03-0{day}T09:00;2026-03-0{day}T10:00;Nueva;Ana\n' for day in range(1, 7))
+
+    simulated, _ = run_import(conn, data.encode(), 'registros.csv', chunk_size=2, dry_run=True)
+    assert simulated[-1]['tasks_created'] == 1 and simulated[-1]['imported'] == 6
+    assert not [e for e in simulated if e['event'] == 'task_created']
+
+    events, _ = run_import(conn, data.encode(), 'registros.csv', chunk_size=2)
+    assert events[-1]['tasks_created'] == simulated[-1]['tasks_created']
+    created = [e for e in events if e['event'] == 'task_created']
+    assert [(e['name'], e['task_number'], e['user_id']) for e in created] == [('Nueva', 2, 1)]
+
+def test_exported_excel_round_trip(conn, tmp_path):
+    conn.executemany(
+        'INSERT INTO time_entries (task_id, start_time, end_time, duration_minutes, comment) VALUES (1, ?, ?, ?, ?)',
+        [('2026-03-02T09:00', '2026-03-02T09:45', 45, 'Uno'), ('2026-03-02T16:00', None, None, None)]
+    )
+    conn.commit()
+    report = reports.run_report(conn, 'export_excel', from_date='2026-03-01', to_date='2026-03-31')
+    try:
+        with open(report.path, 'rb') as f:
+            events, rejected = run_import(conn, f.read(), report.filename)
+    finally:
+        reports.remove_file(report.path)
+
+    assert rejected == []
+    assert events[-1]['imported'] == 2
+    rows = conn.execute('SELECT start_time, end_time, duration_minutes, comment FROM time_entries ORDER BY id').fetchall()
+    assert sorted(tuple(row) for row in rows[2:]) == sorted(tuple(row) for row in rows[:2])
+
+def test_import_is_not_an_external_write(conn):
+    bus = ChangeBus()
+    queue = WriteQueue(writer=lambda: nullcontext(conn), clock=sync.current_version, on_commit=bus.wrote)
+    bus.observe(sync.current_version(conn))
+
+    def rename(conn, name):
+        conn.execute('UPDATE tasks SET name = ? WHERE id = 1', (name,))
+
+    try:
+        queue.submit(rename, 'Soporte').result()
+        run_import(conn, CSV.encode(), 'registros.csv', queue=queue, chunk_size=2)
+        queue.submit(rename, 'Soporte técnico').result()
+    finally:
+        queue.close()
+    bus.observe(sync.current_version(conn))
+    assert bus.stats()['external'] == 0
+
+def test_missing_header_is_rejected():
+    with pytest.raises(importer.ImportFileError):
+        list(importer.parse_rows([('a', 'b'), (1, 2)]))
@@ -0,0 +1,102 @@
+"""
+Pruebas de migraciones e índices: los filtros de informes deben usar índices
+"""
+
+import sqlite3
+
+import pytest
+
+from database import connect, date_range
+from listings import TASK_SORTS
+from migrations import apply_migrations, current_version, latest_version
+from reports import time_entries_query
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = connect(str(tmp_path / 'test.db'))
+    apply_migrations(conn)
+    conn.execute("INSERT INTO users (name) VALUES ('Ana')")
+    conn.execute("INSERT INTO tasks (task_number, name, user_id, status) VALUES (1, 'Tarea', 1, 'En proceso')")
+    conn.executemany(
+        'INSERT INTO time_entries (task_id, start_time, end_time) VALUES (1, ?, ?)',
+        [
+            ('2026-01-31T23:59', '2026-02-01T00:30'),
+            ('2026-02-01T00:00', '2026-02-01T08:00'),
+            ('2026-02-03T17:12', None),
+            ('2026-02-04T00:00', None),
+        ]
+    )
+    conn.commit()
+    yield conn
+    conn.close()
+
+def plan(conn, query, params):
+    rows = conn.execute('EXPLAIN QUERY PLAN ' + query, params).fetchall()
+    return ' | '.join(row[3] for row in rows)
+
+def test_migrations_reach_latest_version(conn):
+    assert current_version(conn) == latest_version()
+    assert apply_migrations(conn) == []
+
+def test_legacy_database_is_migrated(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'legacy.db'))
+    conn.execute('CREATE TABLE tasks (id INTEGER PRIMARY KEY AUTOINCREMENT, task_number INTEGER UNIQUE NOT NULL, '
+                 'name TEXT NOT NULL, description TEXT, user_id INTEGER NOT NULL, max_time_minutes INTEGER DEFAULT 0, '
+                 'max_date DATE, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)')
+    conn.execute('CREATE TABLE time_entries (id INTEGER PRIMARY KEY AUTOINCREMENT, task_id INTEGER NOT NULL, '
+                 'start_time TIMESTAMP NOT NULL, end_time TIMESTAMP, duration_minutes INTEGER, '
+                 'created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)')
+    conn.execute("INSERT INTO tasks (task_number, name, user_id) VALUES (1, 'Antigua', 1)")
+    conn.commit()
+
+    apply_migrations(conn)
+
+    assert conn.execute('SELECT status FROM tasks').fetchone()[0] == 'Pendiente'
+    conn.execute('SELECT comment FROM time_entries').fetchall()
+    assert current_version(conn) == latest_version()
+
+def test_date_range_matches_date_function(conn):
+    start, end = date_range('2026-02-01', '2026-02-03')
+    assert (start, end) == ('2026-02-01', '2026-02-04')
+
+    by_range = conn.execute('SELECT id FROM time_entries WHERE start_time >= ? AND start_time < ? ORDER BY id',
+                            (start, end)).fetchall()
+    by_date = conn.execute('SELECT id FROM time_entries WHERE DATE(start_time) BETWEEN ? AND ? ORDER BY id',
+                           ('2026-02-01', '2026-02-03')).fetchall()
+    assert [r[0] for r in by_range] == [r[0] for r in by_date] == [2, 3]
+
+def test_time_entries_range_uses_start_index(conn):
+    query, params = time_entries_query('2026-02-01', '2026-02-28')
+    assert 'idx_time_entries_start' in plan(conn, query, params)
+
+def test_open_entries_use_partial_index(conn):
+    query = 'SELECT task_id FROM time_entries WHERE task_id = ? AND end_time IS NULL'
+    assert 'idx_time_entries_open' in plan(conn, query, (1,))
+
+def test_task_entries_use_composite_index(conn):
+    query = 'SELECT * FROM time_entries WHERE task_id = ? ORDER BY start_time'
+    result = plan(conn, query, (1,))
+    assert 'idx_time_entries_task_start' in result
+    assert 'TEMP B-TREE' not in result
+
+def test_tasks_by_user_and_status_use_index(conn):
+    query = 'SELECT * FROM tasks WHERE user_id = ? AND status = ?'
+    assert 'idx_tasks_user_status' in plan(conn, query, (1, 'En proceso'))
+
+def test_tasks_by_creation_date_use_index(conn):
+    query = 'SELECT * FROM tasks WHERE created_at >= ? AND created_at < ?'
+    assert 'idx_tasks_created_at' in plan(conn, query, date_range('2026-01-01', '2026-01-31'))
+
+def test_task_listing_sorts_use_indexes(conn):
+    for sort, index in (('name', 'idx_tasks_name'), ('date', 'idx_tasks_due')):
+        keys = [(expr, False) for expr, _ in TASK_SORTS[sort]]
+        order_by = ', '.join(f'{expr} ASC' for expr, _ in keys)
+        result = plan(conn, f'SELECT t.id FROM tasks t ORDER BY {order_by}', ())
+        assert index in result
+        assert 'TEMP B-TREE' not in result
+
+def test_time_entries_cursor_uses_start_index(conn):
+    query, params = time_entries_query('2026-02-01', '2026-02-28', after=['2026-02-03T17:12', 3])
+    result = plan(conn, query, params)
+    assert 'idx_time_entries_start' in result
+    assert 'TEMP B-TREE' not in result
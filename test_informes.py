@@ -0,0 +1,239 @@
+"""
+Pruebas de la carga de datos y generación de informes
+"""
+
+import os
+
+import pytest
+
+import reports
+from database import connect
+from migrations import apply_migrations
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = connect(str(tmp_path / 'test.db'))
+    apply_migrations(conn)
+    conn.execute("INSERT INTO users (name) VALUES ('Ana')")
+    conn.executemany(
+        "INSERT INTO tasks (task_number, name, user_id, status) VALUES (?, ?, 1, ?)",
+        [(n, f'Tarea {n}', 'Terminado' if n % 3 == 0 else 'Pendiente') for n in range(1, 13)]
+    )
+    conn.executemany(
+        'INSERT INTO time_entries (task_id, start_time, end_time, duration_minutes, comment) VALUES (?, ?, ?, ?, ?)',
+        [(task_id, f'2026-02-{day:02d}T09:00', f'2026-02-{day:02d}T10:00', 60, None)
+         for task_id in range(1, 13) for day in range(task_id % 4 + 1, 0, -1)]
+    )
+    conn.commit()
+    yield conn
+    conn.close()
+
+def test_entries_loaded_in_batches(conn, monkeypatch):
+    monkeypatch.setattr(reports, 'IN_BATCH_SIZE', 5)
+    statements = []
+    conn.set_trace_callback(statements.append)
+
+    query, params = reports.tasks_query('t.task_number BETWEEN ? AND ?', [1, 12])
+    tasks = reports.load_tasks_with_entries(conn, query, params)
+
+    conn.set_trace_callback(None)
+    # 1 consulta de tareas + 3 lotes de registros (5 + 5 + 2 tareas)
+    assert len(statements) == 4
+    assert [task['task_number'] for task, _ in tasks] == list(range(1, 13))
+    for task, entries in tasks:
+        assert len(entries) == task['id'] % 4 + 1
+        assert all(entry['task_id'] == task['id'] for entry in entries)
+        assert [e['start_time'] for e in entries] == sorted(e['start_time'] for e in entries)
+
+def test_pending_report_excludes_finished(conn):
+    query, params = reports.tasks_query("t.status != 'Terminado'", [])
+    tasks = reports.load_tasks_with_entries(conn, query, params)
+    assert tasks and all(task['status'] != 'Terminado' for task, _ in tasks)
+
+def test_excel_written_to_unique_temp_files(conn, tmp_path, monkeypatch):
+    from openpyxl import load_workbook
+
+    monkeypatch.chdir(tmp_path)
+    first = reports.run_report(conn, 'export_excel', from_date='2026-02-01', to_date='2026-02-28')
+    second = reports.run_report(conn, 'export_excel', from_date='2026-02-01', to_date='2026-02-28')
+    try:
+        assert first.filename == second.filename
+        assert first.path != second.path
+        assert not (tmp_path / first.filename).exists()
+
+        ws = load_workbook(first.path).active
+        assert ws['A4'].value == 'ID'
+        assert ws['A4'].font.bold
+        # 4 filas de cabecera + 1 fila por registro
+        assert ws.max_row >= 4 + sum(task_id % 4 + 1 for task_id in range(1, 13))
+    finally:
+        reports.remove_file(first.path)
+        reports.remove_file(second.path)
+
+def test_same_dataset_in_every_format(conn):
+    import csv
+    import json
+
+    filters = {'from_date': '2026-02-01', 'to_date': '2026-02-28'}
+    files = {format: reports.run_report(conn, f'export_{format}', **filters) for format in ('csv', 'json')}
+    try:
+        with open(files['csv'].path, encoding='utf-8', newline='') as f:
+            rows = list(csv.reader(f))
+        with open(files['json'].path, encoding='utf-8') as f:
+            data = json.load(f)
+    finally:
+        for report in files.values():
+            reports.remove_file(report.path)
+
+    total = sum(task_id % 4 + 1 for task_id in range(1, 13))
+    assert files['csv'].filename == 'registros_2026-02-01_a_2026-02-28.csv'
+    assert rows[0] == ['ID', 'Inicio', 'Fin', 'Duración', 'Tarea', 'Estado', 'Usuario', 'Comentario']
+    assert len(rows) == 1 + total
+    assert len(data['entries']) == total
+    assert data['total_minutes'] == 60 * total
+    assert data['filters'] == filters
+
+    with pytest.raises(ValueError):
+        reports.run_report(conn, 'export_csv', from_date='2026-02-01')
+    with pytest.raises(ValueError):
+        reports.run_report(conn, 'export_xml', **filters)
+
+def test_flat_excel_layout(conn):
+    from openpyxl import load_workbook
+
+    report = reports.run_report(conn, 'pending_excel', layout='flat')
+    try:
+        wb = load_workbook(report.path)
+    finally:
+        reports.remove_file(report.path)
+
+    pending = [n for n in range(1, 13) if n % 3]
+    summary, sheet = wb['Resumen'], wb['Tareas']
+    assert wb.sheetnames == ['Resumen', 'Tareas']
+    assert [(row[0], row[4], row[5]) for row in summary.iter_rows(min_row=2, max_row=1 + len(pending), values_only=True)] \
+        == [(f'#{n}', n % 4 + 1, 60 * (n % 4 + 1)) for n in pending]
+
+    rows = 1 + sum(1 + n % 4 + 1 for n in pending)
+    assert sheet.max_row == rows
+    assert sheet.freeze_panes == 'A2' and sheet.auto_filter.ref == f'A1:I{rows}'
+    # Fila de la tarea con su total y sus registros agrupados debajo
+    assert [cell.value for cell in sheet[2]][:5] == ['#1', 'Tarea 1', 'Ana', 'Pendiente', 120]
+    assert [sheet.row_dimensions[row].outlineLevel for row in range(2, 6)] == [0, 1, 1, 0]
+
+    with pytest.raises(ValueError):
+        reports.run_report(conn, 'pending_excel', layout='hojas')
+
+def test_task_blocks_reused_until_task_changes(conn, monkeypatch, tmp_path):
+    from fragment_cache import FragmentCache
+
+    cache = FragmentCache(str(tmp_path / 'fragmentos'), max_bytes=10 * 1024 * 1024)
+    monkeypatch.setattr(reports, 'fragment_cache', cache)
+
+    def render():
+        report = reports.run_report(conn, 'tasks_pdf', from_task=1, to_task=12)
+        with open(report.path, 'rb') as f:
+            content = f.read()
+        reports.remove_file(report.path)
+        return content
+
+    first = render()
+    assert (cache.hits, cache.misses, cache.stats()['entries']) == (0, 12, 12)
+
+    # Otro proceso (otra instancia sobre el mismo directorio) aprovecha los bloques
+    other = FragmentCache(cache.directory, max_bytes=cache.max_bytes)
+    monkeypatch.setattr(reports, 'fragment_cache', other)
+    assert render()[:4] == first[:4] == b'%PDF'
+    assert (other.hits, other.misses) == (12, 0)
+
+    # Editar un registro y renombrar otra tarea solo rehace sus bloques
+    conn.execute('UPDATE time_entries SET comment = ? WHERE id = (SELECT MIN(id) FROM time_entries WHERE task_id = 3)',
+                 ('Revisado',))
+    conn.execute("UPDATE tasks SET name = 'Tarea 5 bis' WHERE id = 5")
+    conn.commit()
+    render()
+    assert (other.hits, other.misses, other.stats()['entries']) == (22, 2, 12)
+
+    # El espacio máximo expulsa los bloques usados hace más tiempo
+    small = FragmentCache(str(tmp_path / 'pequeña'), max_bytes=3 * 1024)
+    for task_id in range(4):
+        small.put((task_id, 'tasks_pdf'), 1, 'x' * 1000)
+        os.utime(small._path((task_id, 'tasks_pdf')), (task_id, task_id))
+    small.prune()
+    assert small.get((0, 'tasks_pdf'), 1) is None
+    assert small.get((3, 'tasks_pdf'), 1) == 'x' * 1000
+    assert small.get((3, 'tasks_pdf'), 2) is None
+    assert small.stats()['evictions'] == 1
+
+def test_params_validated_before_querying(conn):
+    statements = []
+    conn.set_trace_callback(statements.append)
+    invalid = [
+        ('tasks_csv', {'from_task': 1, 'to_task': 12, 'layout': 'flat'}),
+        ('tasks_excel', {'from_task': 1, 'to_task': 12, 'layout': 'hojas'}),
+        ('tasks_pdf', {'from_task': 1, 'to_task': 12, 'pdf_mode': 'fast'}),
+        ('export_excel', {'from_date': '2026-02-01', 'to_date': '2026-02-28', 'pdf_mode': 'fast'}),
+        ('date_pdf', {'from_date': '01/02/2026', 'to_date': '2026-02-28'}),
+    ]
+    for name, filters in invalid:
+        with pytest.raises(reports.ReportParamsError):
+            reports.run_report(conn, name, **filters)
+    conn.set_trace_callback(None)
+    assert statements == []
+
+    # Los vacíos cuentan como no indicados, como los envían los endpoints
+    report = reports.run_report(conn, 'tasks_csv', from_task=1, to_task=12, layout=None, pdf_mode='')
+    reports.remove_file(report.path)
+
+def test_sheet_titles_without_invalid_characters(conn):
+    from openpyxl import load_workbook
+
+    conn.execute("UPDATE tasks SET name = 'Cliente [A/B]: ¿*?' WHERE id = 1")
+    conn.commit()
+    report = reports.run_report(conn, 'tasks_excel', from_task=1, to_task=1)
+    try:
+        assert load_workbook(report.path).sheetnames == ['1 - Cliente  A B   ¿  ']
+    finally:
+        reports.remove_file(report.path)
+
+def test_large_listings_drawn_on_canvas(conn, monkeypatch):
+    monkeypatch.setattr(reports, 'PDF_FAST_ROWS', 5)
+    drawn = []
+    canvas_pdf = reports.entries_canvas_pdf
+    monkeypatch.setattr(reports, 'entries_canvas_pdf', lambda dataset, path: drawn.append(path) or canvas_pdf(dataset, path))
+
+    report = reports.run_report(conn, 'timeentries_pdf', from_date='2026-02-01', to_date='2026-02-28')
+    try:
+        with open(report.path, 'rb') as f:
+            content = f.read()
+    finally:
+        reports.remove_file(report.path)
+    assert drawn == [report.path]
+    assert content.startswith(b'%PDF') and content.count(b'/Type /Page\n') >= 2
+
+    with pytest.raises(ValueError):
+        reports.run_report(conn, 'export_pdf', from_date='2026-02-01', to_date='2026-02-28', pdf_mode='rapido')
+
+def test_tasks_pdf_in_parallel_chunks(conn, monkeypatch):
+    pypdf = pytest.importorskip('pypdf')
+    monkeypatch.setattr(reports, 'PDF_CHUNK_TASKS', 5)
+    monkeypatch.setattr(reports, 'PDF_WORKERS', 2)
+    monkeypatch.setattr(reports, '_pdf_pool', None)
+
+    try:
+        report = reports.run_report(conn, 'tasks_pdf', from_task=1, to_task=12)
+    finally:
+        if reports._pdf_pool is not None:
+            reports._pdf_pool.shutdown()
+    try:
+        reader = pypdf.PdfReader(report.path)
+        first = reader.pages[0].extract_text()
+        last = reader.pages[-1].extract_text()
+        outline = [(item.title, reader.get_destination_page_number(item)) for item in reader.outline]
+    finally:
+        reports.remove_file(report.path)
+
+    assert 'Índice' in first and 'Tarea #12: Tarea 12' in first
+    assert f'Página {len(reader.pages)} de {len(reader.pages)}' in last
+    assert [title for title, _ in outline] == [f'Tarea #{n}: Tarea {n}' for n in range(1, 13)]
+    # Cada marcador lleva a la página en la que empieza su tarea
+    assert all(title in reader.pages[page].extract_text() for title, page in outline)
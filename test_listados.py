@@ -0,0 +1,135 @@
+"""
+Pruebas de los listados paginados de la API
+"""
+
+import contextlib
+import json
+
+import pytest
+
+import listings
+from database import connect
+from migrations import apply_migrations
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = connect(str(tmp_path / 'test.db'))
+    apply_migrations(conn)
+    conn.executemany("INSERT INTO users (name) VALUES (?)", [('Ana',), ('Luis',)])
+    conn.executemany(
+        'INSERT INTO tasks (task_number, name, user_id, max_date, status) VALUES (?, ?, ?, ?, ?)',
+        [(n, f"{'abc'[n % 3]}-tarea {n}", n % 2 + 1, f'2026-03-{n % 5 + 1:02d}' if n % 4 else None,
+          'Terminado' if n % 3 == 0 else 'Pendiente') for n in range(1, 24)]
+    )
+    conn.executemany(
+        'INSERT INTO time_entries (task_id, start_time, end_time, duration_minutes) VALUES (?, ?, ?, 30)',
+        # Varios registros con el mismo inicio: el id desempata el orden
+        [(n % 23 + 1, f'2026-03-{n % 9 + 1:02d}T09:00', f'2026-03-{n % 9 + 1:02d}T09:30') for n in range(40)]
+    )
+    conn.commit()
+    yield conn
+    conn.close()
+
+def all_pages(conn, limit, **filters):
+    items, cursor, total = listings.list_tasks(conn, limit=limit, **filters)
+    pages = 1
+    while cursor:
+        page, cursor, _ = listings.list_tasks(conn, limit=limit, cursor=cursor, **filters)
+        items += page
+        pages += 1
+    return items, pages, total
+
+@pytest.mark.parametrize('sort', sorted(listings.TASK_SORTS))
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+def test_pages_match_full_listing(conn, sort, order):
+    full, _, total = listings.list_tasks(conn, sort=sort, order=order)
+    paged, pages, _ = all_pages(conn, 4, sort=sort, order=order)
+
+    assert total == len(full) == 23
+    assert pages == 6
+    assert [t['id'] for t in paged] == [t['id'] for t in full]
+
+def test_date_sort_puts_tasks_without_date_last(conn):
+    for order in ('asc', 'desc'):
+        tasks, _, _ = listings.list_tasks(conn, sort='date', order=order, fields='max_date')
+        dates = [t['max_date'] for t in tasks]
+        assert dates[-5:] == [None] * 5
+        assert dates[:-5] == sorted(dates[:-5], reverse=order == 'desc')
+
+def test_filters_and_fields(conn):
+    tasks, _, total = all_pages(conn, 2, user_id=1, status=['Pendiente'], fields='task_number,user_name')
+    assert total == len(tasks)
+    assert tasks and all(set(t) == {'task_number', 'user_name'} and t['user_name'] == 'Ana' for t in tasks)
+
+def test_invalid_arguments(conn):
+    with pytest.raises(ValueError):
+        listings.list_tasks(conn, fields='id,password')
+    with pytest.raises(ValueError):
+        listings.list_tasks(conn, sort='number', cursor=listings.encode_cursor('tasks:name:asc', ['a', 1]))
+    with pytest.raises(ValueError):
+        listings.list_tasks(conn, cursor='no-es-un-cursor')
+
+def test_time_entries_pages_match_full_listing(conn):
+    full, cursor = listings.list_time_entries(conn, '2026-03-01', '2026-03-31')
+    assert cursor is None and len(full) == 40
+
+    paged = []
+    while True:
+        page, cursor = listings.list_time_entries(conn, '2026-03-01', '2026-03-31', limit=7, cursor=cursor)
+        paged += page
+        if not cursor:
+            break
+    assert [e['id'] for e in paged] == [e['id'] for e in full]
+    assert full == sorted(full, key=lambda e: (e['start_time'], e['id']), reverse=True)
+
+def test_time_entries_ndjson_stream(conn):
+    borrowed = []
+
+    @contextlib.contextmanager
+    def connection():
+        borrowed.append(True)
+        yield conn
+        borrowed[-1] = False
+
+    lines = []
+    for chunk in listings.ndjson_pages(connection, '2026-03-01', '2026-03-31', limit=10, page_size=4):
+        # La conexión de cada página ya se ha devuelto al enviarla
+        assert not any(borrowed)
+        lines += [json.loads(line) for line in chunk.decode().splitlines()]
+
+    assert len(lines) == 11 and len(borrowed) == 3
+    page, cursor = listings.list_time_entries(conn, '2026-03-01', '2026-03-31', limit=10)
+    assert lines[:10] == page
+    assert lines[10] == {'next_cursor': cursor}
+
+    full, _ = listings.list_time_entries(conn, '2026-03-01', '2026-03-31')
+    lines = [json.loads(line) for chunk in listings.ndjson_pages(connection, '2026-03-01', '2026-03-31', page_size=7)
+             for line in chunk.decode().splitlines()]
+    assert lines == full
+
+def test_task_totals_and_detail(conn):
+    conn.execute("INSERT INTO time_entries (task_id, start_time) VALUES (2, '2026-03-20T08:00')")
+    conn.executemany("INSERT INTO annotations (task_id, text) VALUES (?, ?)", [(2, 'a'), (2, 'b'), (3, 'c')])
+    conn.commit()
+
+    statements = []
+    conn.set_trace_callback(statements.append)
+    tasks, _, _ = listings.list_tasks(conn, include='totals')
+    conn.set_trace_callback(None)
+    # El total y la página: los totales no añaden consultas por tarea
+    assert len(statements) == 2
+
+    by_id = {task['id']: task for task in tasks}
+    expected_minutes = conn.execute('SELECT COALESCE(SUM(duration_minutes), 0) FROM time_entries WHERE task_id = 2').fetchone()[0]
+    assert by_id[2]['total_minutes'] == expected_minutes
+    assert by_id[2]['has_open_timer'] is True and by_id[3]['has_open_timer'] is False
+    assert (by_id[2]['annotation_count'], by_id[3]['annotation_count'], by_id[4]['annotation_count']) == (2, 1, 0)
+
+    task = listings.task_detail(conn, 2, 'annotations,times,totals')
+    assert task['user_name'] == 'Ana'
+    assert len(task['annotations']) == 2
+    assert len(task['times']) == task['time_entry_count'] == by_id[2]['time_entry_count']
+    assert 'times' not in listings.task_detail(conn, 2)
+    assert listings.task_detail(conn, 999) is None
+    with pytest.raises(ValueError):
+        listings.task_detail(conn, 2, 'comments')
@@ -0,0 +1,151 @@
+"""
+Pruebas de las operaciones de escritura por lotes
+"""
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import operations
+from database import connect
+from migrations import apply_migrations
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = connect(str(tmp_path / 'test.db'))
+    apply_migrations(conn)
+    conn.execute("INSERT INTO users (name) VALUES ('Ana')")
+    conn.executemany(
+        "INSERT INTO tasks (task_number, name, user_id, status) VALUES (?, ?, 1, 'Pendiente')",
+        [(n, f'Tarea {n}') for n in range(1, 4)]
+    )
+    conn.commit()
+    yield conn
+    conn.close()
+
+def task(name):
+    return SimpleNamespace(name=name, description=None, user_id=1, max_time_minutes=0,
+                           max_date=None, status='En proceso')
+
+def entry(start, end=None):
+    return SimpleNamespace(start_time=start, end_time=end, comment=None)
+
+class RecordingConnection:
+    """Conexión que anota las llamadas a executemany"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.executemany_calls = []
+
+    @property
+    def in_transaction(self):
+        return self.conn.in_transaction
+
+    def execute(self, sql, params=()):
+        return self.conn.execute(sql, params)
+
+    def executemany(self, sql, rows):
+        rows = list(rows)
+        self.executemany_calls.append((sql.split()[0], len(rows)))
+        return self.conn.executemany(sql, rows)
+
+def test_batch_results_in_order(conn):
+    recorder = RecordingConnection(conn)
+    results = operations.run_batch(recorder, [
+        operations.BatchItem('task', 'create', data=task('Nueva')),
+        operations.BatchItem('task', 'update', 1, task('Uno')),
+        operations.BatchItem('task', 'update', 2, task('Dos')),
+        operations.BatchItem('time_entry', 'create', 1, entry('2026-02-01T09:00', '2026-02-01T10:30')),
+        operations.BatchItem('annotation', 'create', 2, SimpleNamespace(text='Nota')),
+        operations.BatchItem('task', 'delete', 3),
+    ])
+    conn.commit()
+
+    assert results[0]['task_number'] == 4
+    assert [r['message'] for r in results[1:3]] == ['Tarea actualizada'] * 2
+    assert results[3]['duration_minutes'] == 90
+    assert results[5] == {'message': 'Tarea eliminada'}
+    # Las dos actualizaciones consecutivas van en un solo executemany
+    assert recorder.executemany_calls == [('UPDATE', 2), ('DELETE', 1)]
+    names = [row[0] for row in conn.execute('SELECT name FROM tasks ORDER BY task_number')]
+    assert names == ['Uno', 'Dos', 'Nueva']
+
+def test_missing_rows_are_not_marked_as_changed(conn):
+    items = [
+        operations.BatchItem('task', 'update', 1, task('Uno')),
+        operations.BatchItem('task', 'update', 99, task('No existe')),
+        operations.BatchItem('task', 'delete', 2),
+        operations.BatchItem('task', 'delete', 2),
+    ]
+    operations.run_batch(conn, items)
+    assert [item.changed for item in items] == [True, False, True, False]
+
+def test_failed_batch_is_rolled_back(conn):
+    with pytest.raises(operations.BatchError) as error:
+        operations.run_batch(conn, [
+            operations.BatchItem('task', 'update', 1, task('Cambiada')),
+            operations.BatchItem('time_entry', 'create', 1, entry('2026-02-01T09:00')),
+            operations.BatchItem('time_entry', 'update', 1, entry('2026-02-01T09:00', '2026-02-01T08:00')),
+        ])
+    conn.rollback()
+
+    assert error.value.index == 2
+    assert conn.execute('SELECT name FROM tasks WHERE id = 1').fetchone()[0] == 'Tarea 1'
+    assert conn.execute('SELECT COUNT(*) FROM time_entries').fetchone()[0] == 0
+
+def test_failed_group_reports_the_failing_operation(conn):
+    conn.execute("""
+        CREATE TEMP TRIGGER forbidden_name BEFORE UPDATE ON tasks WHEN NEW.name = 'Prohibida'
+        BEGIN SELECT RAISE(ABORT, 'nombre no permitido'); END
+    """)
+    recorder = RecordingConnection(conn)
+    with pytest.raises(operations.BatchError) as error:
+        operations.run_batch(recorder, [
+            operations.BatchItem('task', 'delete', 3),
+            operations.BatchItem('task', 'update', 1, task('Uno')),
+            operations.BatchItem('task', 'update', 2, task('Prohibida')),
+        ])
+    conn.rollback()
+
+    # El grupo falla en un solo executemany; el índice es el de la operación, no el del grupo
+    assert recorder.executemany_calls == [('DELETE', 1), ('UPDATE', 2)]
+    assert error.value.index == 2
+    assert 'nombre no permitido' in str(error.value)
+    names = [row[0] for row in conn.execute('SELECT name FROM tasks ORDER BY task_number')]
+    assert names == ['Tarea 1', 'Tarea 2', 'Tarea 3']
+
+def test_concurrent_task_creation_gets_unique_numbers(conn):
+    path = conn.execute('PRAGMA database_list').fetchone()[2]
+    errors = []
+
+    def create(worker):
+        # Una conexión por hilo, como varios procesos de uvicorn
+        own = connect(path)
+        try:
+            for n in range(20):
+                operations.create_task(own, task(f'Hilo {worker}-{n}'))
+                own.commit()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            own.close()
+
+    threads = [threading.Thread(target=create, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    numbers = [row[0] for row in conn.execute('SELECT task_number FROM tasks ORDER BY task_number')]
+    assert numbers == list(range(1, 84))
+
+def test_batch_reserves_one_block_and_numbers_are_not_reused(conn):
+    created = operations.create_task(conn, task('Última'))
+    operations.delete_task(conn, created['id'])
+    results = operations.run_batch(conn, [operations.BatchItem('task', 'create', data=task(f'T{n}')) for n in range(3)])
+    conn.commit()
+    assert created['task_number'] == 4
+    assert [r['task_number'] for r in results] == [5, 6, 7]
+    assert conn.execute('SELECT next_number FROM task_sequence').fetchone()[0] == 8
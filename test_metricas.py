@@ -0,0 +1,34 @@
+"""
+Pruebas de las métricas de rendimiento
+"""
+
+from database import connect
+from metrics import Histogram, Timings, route_label, server_timing, track
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram('latency_seconds', 'Latencia', (0.1, 1), ('route',))
+    for value in (0.05, 0.5, 3):
+        histogram.observe(value, '/api/tasks/{task_id}')
+
+    assert histogram.render()[2:] == [
+        'latency_seconds_bucket{route="/api/tasks/{task_id}",le="0.1"} 1',
+        'latency_seconds_bucket{route="/api/tasks/{task_id}",le="1.0"} 2',
+        'latency_seconds_bucket{route="/api/tasks/{task_id}",le="+Inf"} 3',
+        'latency_seconds_sum{route="/api/tasks/{task_id}"} 3.55',
+        'latency_seconds_count{route="/api/tasks/{task_id}"} 3',
+    ]
+    assert route_label({}) == 'unmatched'
+
+def test_connection_counts_queries_inside_track(tmp_path):
+    conn = connect(str(tmp_path / 'test.db'))
+    conn.execute('CREATE TABLE t (x INTEGER)')
+    with track() as timings:
+        conn.executemany('INSERT INTO t VALUES (?)', [(n,) for n in range(10)])
+        assert [row[0] for row in conn.execute('SELECT x FROM t ORDER BY x')] == list(range(10))
+        assert conn.cursor().execute('SELECT COUNT(*) FROM t').fetchone()[0] == 10
+    conn.execute('SELECT 1')
+    conn.close()
+
+    assert timings.queries == 3
+    assert timings.sql_seconds > 0
+    assert server_timing(Timings(), 0.0123) == 'app;dur=12.3, sql;dur=0.0;desc="0 consultas"'
@@ -0,0 +1,43 @@
+"""
+Pruebas del generador de datos y de la comparación de resultados de rendimiento
+"""
+
+from bench import datagen
+from bench.results import compare, latency_summary
+from database import connect
+
+def snapshot(path):
+    conn = connect(path)
+    try:
+        return [
+            [tuple(row) for row in conn.execute('SELECT id, name, user_id, status, max_date FROM tasks ORDER BY id')],
+            [tuple(row) for row in conn.execute(
+                'SELECT task_id, start_time, end_time, duration_minutes, comment FROM time_entries ORDER BY id')],
+        ]
+    finally:
+        conn.close()
+
+def test_generator_is_reproducible(tmp_path):
+    for name in ('a.db', 'b.db'):
+        summary = datagen.generate(str(tmp_path / name), users=3, tasks=20, entries=300, seed=7)
+    assert summary['time_entries'] == 300
+    first, second = snapshot(str(tmp_path / 'a.db')), snapshot(str(tmp_path / 'b.db'))
+    assert first == second and len(first[0]) == 20
+
+    datagen.generate(str(tmp_path / 'c.db'), users=3, tasks=20, entries=300, seed=8)
+    assert snapshot(str(tmp_path / 'c.db')) != first
+
+def test_compare_flags_regressions_beyond_tolerance():
+    baseline = {'results': {
+        'listado': {**latency_summary([0.010] * 10), 'peak_memory_bytes': 1000},
+        'total': {'throughput_rps': 100.0, 'error_rate': 0.0},
+        'informe': latency_summary([0.001]),
+    }}
+    current = {'results': {
+        'listado': {**latency_summary([0.011] * 10), 'peak_memory_bytes': 1500},
+        'total': {'throughput_rps': 70.0, 'error_rate': 0.05},
+    }}
+
+    found = {(r['name'], r['metric']) for r in compare(baseline, current)}
+    assert found == {('listado', 'peak_memory_bytes'), ('total', 'throughput_rps'),
+                     ('total', 'error_rate'), ('informe', None)}
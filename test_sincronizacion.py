@@ -0,0 +1,60 @@
+"""
+Pruebas de la sincronización incremental (updated_at, sync_version y lápidas)
+"""
+
+import pytest
+
+import sync
+from database import connect
+from migrations import apply_migrations
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = connect(str(tmp_path / 'test.db'))
+    apply_migrations(conn)
+    conn.execute("INSERT INTO users (name) VALUES ('Ana')")
+    conn.executemany(
+        "INSERT INTO tasks (task_number, name, user_id) VALUES (?, ?, 1)",
+        [(n, f'Tarea {n}') for n in range(1, 4)]
+    )
+    conn.commit()
+    yield conn
+    conn.close()
+
+def test_only_changes_since_version(conn):
+    full = sync.changes_since(conn, 0)
+    assert [t['name'] for t in full['changes']['tasks']] == ['Tarea 1', 'Tarea 2', 'Tarea 3']
+    assert not full['has_more']
+
+    conn.execute("UPDATE tasks SET name = 'Cambiada' WHERE id = 2")
+    conn.execute('DELETE FROM tasks WHERE id = 3')
+    conn.execute("INSERT INTO annotations (task_id, text) VALUES (1, 'Nota')")
+    conn.commit()
+
+    delta = sync.changes_since(conn, full['version'])
+    assert [(t['id'], t['name']) for t in delta['changes']['tasks']] == [(2, 'Cambiada')]
+    assert delta['changes']['tasks'][0]['updated_at'] is not None
+    assert [a['text'] for a in delta['changes']['annotations']] == ['Nota']
+    assert delta['changes']['users'] == [] and delta['changes']['time_entries'] == []
+    assert delta['deleted'] == {'users': [], 'tasks': [3], 'annotations': [], 'time_entries': []}
+
+    assert sync.changes_since(conn, delta['version'])['changes']['tasks'] == []
+
+def test_paging_cuts_at_limit(conn):
+    conn.execute("UPDATE tasks SET status = 'Terminado'")
+    conn.commit()
+    since, pages = 0, []
+    while True:
+        page = sync.changes_since(conn, since, limit=2)
+        pages.append(sum(len(rows) for rows in page['changes'].values()))
+        since = page['version']
+        if not page['has_more']:
+            break
+    # 1 usuario + 3 tareas, de dos en dos
+    assert pages == [2, 2]
+
+def test_invalid_since(conn):
+    with pytest.raises(ValueError):
+        sync.changes_since(conn, 10 ** 9)
+    with pytest.raises(ValueError):
+        sync.changes_since(conn, 0, limit=0)
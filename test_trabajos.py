@@ -0,0 +1,82 @@
+"""
+Pruebas de los trabajos de informes: parámetros normalizados y versión de datos
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import executor
+import jobs
+from database import connect, data_versions
+from migrations import apply_migrations
+
+def test_equivalent_params_share_cache_key():
+    a = jobs.normalize_params('tasks_excel', {'from_task': '1', 'to_task': 5, 'user_id': '', 'status': None})
+    b = jobs.normalize_params('tasks_excel', {'to_task': '5', 'from_task': 1})
+    assert a == b == {'from_task': 1, 'to_task': 5}
+
+    versions = {'tasks': 3, 'time_entries': 7}
+    assert jobs.cache_key('tasks_excel', a, versions) == jobs.cache_key('tasks_excel', b, dict(versions))
+    assert jobs.cache_key('tasks_excel', a, versions) != jobs.cache_key('tasks_pdf', a, versions)
+    assert jobs.cache_key('tasks_excel', a, versions) != jobs.cache_key('tasks_excel', a, {**versions, 'tasks': 4})
+
+@pytest.mark.parametrize('report, params', [
+    ('tasks_docx', {'from_task': 1, 'to_task': 2}),
+    ('tasks_excel', {'from_task': 1}),
+    ('tasks_excel', {'from_task': 1, 'to_task': 2, 'color': 'rojo'}),
+    ('tasks_excel', {'from_task': 'uno', 'to_task': 2}),
+])
+def test_invalid_params_rejected(report, params):
+    with pytest.raises(ValueError):
+        jobs.normalize_params(report, params)
+
+def test_writes_bump_data_versions(tmp_path):
+    conn = connect(str(tmp_path / 'test.db'))
+    apply_migrations(conn)
+    before = data_versions(conn)
+
+    conn.execute("INSERT INTO users (name) VALUES ('Ana')")
+    conn.execute("INSERT INTO tasks (task_number, name, user_id) VALUES (1, 'Uno', 1)")
+    conn.execute("UPDATE tasks SET name = 'Uno bis' WHERE id = 1")
+    conn.execute("INSERT INTO time_entries (task_id, start_time) VALUES (1, '2026-03-02T09:00')")
+    conn.commit()
+    after = data_versions(conn)
+    conn.close()
+
+    assert after['users'] == before['users'] + 1
+    assert after['tasks'] == before['tasks'] + 2
+    assert after['time_entries'] == before['time_entries'] + 1
+    assert after['annotations'] == before['annotations']
+
+def test_cancelled_request_keeps_its_slot_until_the_worker_finishes(monkeypatch):
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(executor, 'get_executor', lambda: pool)
+    monkeypatch.setattr(executor, '_slots', None)
+    release = threading.Event()
+    started = threading.Event()
+
+    def report():
+        started.set()
+        release.wait(5)
+
+    async def scenario():
+        request = asyncio.create_task(executor.run_in_process(report))
+        await asyncio.to_thread(started.wait, 5)
+        # El cliente se desconecta: el trabajo sigue en marcha y conserva su turno
+        request.cancel()
+        await asyncio.gather(request, return_exceptions=True)
+        running = executor.stats()['running']
+        release.set()
+        for _ in range(100):
+            if executor.stats()['running'] == 0:
+                break
+            await asyncio.sleep(0.01)
+        return running, executor.stats()['running']
+
+    try:
+        assert asyncio.run(scenario()) == (1, 0)
+    finally:
+        pool.shutdown()
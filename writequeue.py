@@ -0,0 +1,172 @@
+"""
+Cola de escrituras con commit agrupado
+Los handlers encolan operaciones y un único hilo escritor las ejecuta en lotes
+cortos, cada una en su SAVEPOINT, con un solo COMMIT por lote.
+"""
+
+import asyncio
+import contextvars
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from database import get_pool
+
+# Operaciones por lote como máximo y espera para juntar más tras la primera
+WRITE_BATCH_SIZE = int(os.environ.get('TASKFLOW_WRITE_BATCH_SIZE', '100'))
+WRITE_BATCH_WAIT_MS = float(os.environ.get('TASKFLOW_WRITE_BATCH_MS', '2'))
+
+class WriteQueueClosed(Exception):
+    """La aplicación se está deteniendo y ya no acepta escrituras"""
+
+class WriteQueue:
+    """Un hilo escritor por proceso que vacía la cola en lotes
+
+    Cada operación es `func(conn, *args)`: se ejecuta dentro de la transacción
+    del lote (no debe hacer commit) y su resultado o su excepción llegan a
+    quien la encoló cuando el lote se confirma. Si una operación falla solo se
+    deshace su SAVEPOINT; si falla el COMMIT, fallan todas las del lote.
+
+    Con `clock(conn)` se lee un valor al empezar y al terminar cada lote, ya
+    con el bloqueo de escritura, y tras el COMMIT se llama a
+    `on_commit(antes, después)` (así el bus de cambios distingue las
+    escrituras propias de las de otros procesos).
+    """
+
+    def __init__(self, batch_size=WRITE_BATCH_SIZE, batch_wait_ms=WRITE_BATCH_WAIT_MS, writer=None,
+                 clock=None, on_commit=None):
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000
+        self._writer = writer or (lambda: get_pool().writer())
+        self.clock = clock
+        self.on_commit = on_commit
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # Métricas
+        self.submitted = 0
+        self.committed = 0
+        self.failed = 0
+        self.batches = 0
+        self.max_batch = 0
+        self.commit_seconds = 0.0
+
+    def submit(self, func, *args):
+        """Encolar la operación; el Future se resuelve tras el COMMIT de su lote"""
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise WriteQueueClosed('La aplicación se está deteniendo')
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._loop, name='taskflow-writer', daemon=True)
+                self._thread.start()
+            self.submitted += 1
+            # El contexto viaja con la operación: su SQL cuenta en las métricas de la petición
+            self._queue.put((contextvars.copy_context(), func, args, future))
+        return future
+
+    async def run(self, func, *args):
+        """Versión para handlers asíncronos: espera sin ocupar un hilo"""
+        return await asyncio.wrap_future(self.submit(func, *args))
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.batch_wait
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._run_batch(batch)
+            if stop:
+                return
+
+    def _run_batch(self, batch):
+        done = []
+        try:
+            with self._writer() as conn:
+                # IMMEDIATE: el bloqueo de escritura se toma al empezar (espera
+                # con busy_timeout si otro proceso escribe) y no a mitad del lote
+                conn.execute('BEGIN IMMEDIATE')
+                before = self.clock(conn) if self.clock else None
+                for context, func, args, future in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    conn.execute('SAVEPOINT operation')
+                    try:
+                        result = context.run(func, conn, *args)
+                    except Exception as e:
+                        conn.execute('ROLLBACK TO operation')
+                        conn.execute('RELEASE operation')
+                        future.set_exception(e)
+                    else:
+                        conn.execute('RELEASE operation')
+                        done.append((future, result))
+                after = self.clock(conn) if self.clock else None
+                start = time.perf_counter()
+                conn.commit()
+                commit_seconds = time.perf_counter() - start
+        except Exception as e:
+            print(f"❌ Error en el lote de escrituras: {e}")
+            # Las que ya tenían resultado también se han deshecho
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            with self._lock:
+                self.batches += 1
+                self.failed += len(batch)
+            return
+
+        if self.on_commit is not None:
+            try:
+                self.on_commit(before, after)
+            except Exception as e:
+                print(f"⚠️ Error tras el lote de escrituras: {e}")
+        for future, result in done:
+            future.set_result(result)
+        with self._lock:
+            self.batches += 1
+            self.committed += len(done)
+            self.failed += len(batch) - len(done)
+            self.max_batch = max(self.max_batch, len(batch))
+            self.commit_seconds += commit_seconds
+
+    def close(self, timeout=10):
+        """Terminar las escrituras pendientes y detener el hilo escritor"""
+        with self._lock:
+            self._closed = True
+            thread = self._thread if self._pid == os.getpid() else None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'submitted': self.submitted,
+                'committed': self.committed,
+                'failed': self.failed,
+                'batches': self.batches,
+                'avg_batch': round((self.committed + self.failed) / self.batches, 2) if self.batches else 0.0,
+                'max_batch': self.max_batch,
+                'commit_total_ms': round(self.commit_seconds * 1000, 3),
+            }
+
+write_queue = WriteQueue()